@@ -1,304 +1,271 @@
+import os
+from functools import wraps
 import streamlit as st
-import pandas as pd
-import numpy as np
-import data_loader as dl
-import plotly.express as px
-import plotly.graph_objects as go
-import statsmodels as sm
-import matplotlib.pyplot as plt
+import instrumentation
 
-tab1, tab2, tab3 = st.tabs(["Geral", "Tabela SH4 Description", "Estatísticas"])
+instrumentation.configure_logging()
+instrumentation.start_rerun() # Quebra de tempo deste rerun (ver painel "Desempenho do rerun" e DASH_METRICS_FILE)
 
-file_path = "data/exportacoes_franca.csv"
+# Módulos do dashboard: só custam na primeira execução do processo (partida a frio), depois vêm de sys.modules.
+# Bibliotecas pesadas que só alguns caminhos usam (plotly.express, duckdb) são importadas dentro desses caminhos.
+with instrumentation.span('imports'):
+    import data_loader as dl
+    import data_processor as data_proc
+    import query
+    import figures
+    import report
+    import downsampling
+    import memo
+    import parallel
+    import timeseries
 
-dataset = dl.load_dataset(file_path)
+# Só a visão escolhida é calculada a cada rerun (com st.tabs, as três rodavam sempre, mesmo com uma só visível)
+VISOES = ["Geral", "Tabela SH4 Description", "Estatísticas", "Séries temporais"]
+visao_ativa = st.radio("Visão", VISOES, horizontal=True, key="visao", label_visibility="collapsed")
+
+# Usa o repositório particionado por mês (data/store, ver data_store) quando existir; senão, o CSV
+file_path = "data/store" if os.path.isdir("data/store") else "data/exportacoes_franca.csv"
+versao = dl.dataset_version(file_path)
+# DASH_SHARED_DATASET=1: os processos do Streamlit mapeiam o mesmo arquivo Arrow em memória (ver dl.load_shared_dataset)
+compartilhado = os.environ.get("DASH_SHARED_DATASET") == "1"
+# DASH_SQL_ENGINE=duckdb|sqlite|auto: filtros e agregações rodam em um banco embarcado (ver sql_backend), sem o dataset em memória
+motor_sql = os.environ.get("DASH_SQL_ENGINE") or None
+
+
+
+@st.cache_resource(max_entries=1) # Uma única fonte por processo, compartilhada entre as sessões (a da versão anterior é liberada)
+def fonte_dados(caminho_arquivo, versao=None, compartilhado=False, motor=None):
+    return query.open_source(caminho_arquivo, motor, compartilhado)
+
+
+try:
+    fonte = fonte_dados(file_path, versao, compartilhado, motor_sql)
+except FileNotFoundError:
+    st.error(f"Erro: Arquivo '{file_path}' não encontrado. Verifique o caminho.")
+    st.stop()
+except Exception as e:
+    st.error(f"Erro ao carregar dados: {e}")
+    st.stop()
 
 
 with st.sidebar:
     st.title("DashOrange 🍊")
     cidades_selecionadas = st.multiselect(
         "Faça uma Análise por Cidade:",
-        dl.data_proc.list_options_by_dataframe(dataset,'City_State'),
+        fonte.options('City_State'),
         placeholder='Cidade',
         help="Selecione as cidade corretamente. Caso selecione uma cidade e queira também selecionar um Estado e forem de locais distintos, o filtro não funcionará",
         default=['Águas Mornas - SC','Alfenas - MG']
     )
     estados_selecionados = st.multiselect(
         "Faça uma Análise por Estado:",
-        dl.data_proc.list_options_by_dataframe(dataset,'State'),
+        fonte.options('State'),
         help="Caso você tenha selecionado um Estado que não condiz com a cidade selecionada (caso queira analisar por cidade também), os gráficos não serão gerados",
         placeholder="UF",
     )
     anos_selecionados = st.multiselect(
         "Faça uma Análise por Ano:",
-        dl.data_proc.list_options_by_dataframe(dataset,'Year'),
+        fonte.options('Year'),
         placeholder='Ano',
         help="Selecione um ou mais anos para filtrar os dados. Se nenhum ano for selecionado, todos os anos serão exibidos.",
-        default=list(dl.data_proc.list_options_by_dataframe(dataset,'Year'))
+        default=list(fonte.options('Year'))
     )
-
-
-df_filtrado = dl.data_proc.columns_selected_by_options(
-    dataset,
-    cidades_selecionadas,
-    estados_selecionados,
-    anos_selecionados
+    top_n = st.number_input(
+        "Itens por gráfico de ranking:",
+        min_value=1,
+        max_value=500,
+        value=data_proc.TOP_N_DEFAULT,
+        help="Quantidade máxima de barras (cidades/estados) e de linhas/colunas do heatmap. O restante é somado em 'Outros'.",
     )
 
 
-with tab1:
-    st.title("Dashboard de Exportação para a França 🎲")
-    st.write("Na Barra ao lado, selecione as opções e comece a manipular os gráficos")
-    # --- Geração do Gráfico ---
-    if not df_filtrado.empty:
-        exportacoes_ano = df_filtrado.groupby('Year')["US$ FOB"].sum().reset_index() # Reset index para ter 'Year' como coluna
-
-        # Verifica se há dados para plotar após o groupby
-        if not exportacoes_ano.empty:
-            fig = px.bar(exportacoes_ano,
-                         x='Year', # Usar o nome da coluna 'Year'
-                         y='US$ FOB', # Usar o nome da coluna 'US$ FOB'
-                         title='Exportações realizadas para França em US$ ao longo dos anos',
-                         opacity=0.65,
-                         text_auto=False) # Desabilitar text_auto para formatar manualmente
-
-            # --- Customizações para um visual mais profissional ---
-            fig.update_traces(
-                marker_color='#1f77b4', # Cor das barras (um azul padrão do Plotly)
-                marker_line_color='rgba(0,0,0,0)', # Remover borda das barras
-            )
-             # Calcular a média para anotação
-            mean_us_fob = exportacoes_ano['US$ FOB'].mean()
-
-            fig.update_layout(
-                # template="plotly_dark", # Manter o tema escuro se o Streamlit estiver em modo escuro
-                title_font_size=20, # Tamanho da fonte do título
-                title_x=0.05, # Alinhar o título à esquerda
-                xaxis_title="Ano", # Título do eixo X
-                yaxis_title="Valor Exportado (US$)", # Título do eixo Y
-                hovermode="x unified", # Melhor experiência de hover
-                plot_bgcolor='rgba(0,0,0,0)', # Fundo do gráfico transparente
-                paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel transparente
-                font=dict(color="white"), # Cor da fonte para todo o gráfico (útil para modo escuro)
-                xaxis=dict(
-                    showgrid=False, # Remover grade do eixo X
-                    tickmode='array', # Garantir que todos os anos apareçam
-                    tickvals=exportacoes_ano['Year'],
-                    ticktext=[str(year) for year in exportacoes_ano['Year']]
-                ),
-                yaxis=dict(
-                    showgrid=True, # Manter grade do eixo Y
-                    gridcolor='#333333', # Cor da grade para modo escuro
-                    tickformat='$.2s' # Formato dos ticks do eixo Y (ex: $1B, $2B)
-                ),
-                # Adicionar anotações para os valores exatos no topo das barras
-                annotations=[
-                    go.layout.Annotation(
-                        x=row['Year'],
-                        y=row['US$ FOB'],
-                        text=dl.data_proc.format_value_dynamic(row['US$ FOB']),
-                        showarrow=False,
-                        yshift=10, # Ajuste vertical do texto
-                        font=dict(color='#1f77b4',size=18,weight='bold'),
-                    ) for index, row in exportacoes_ano.iterrows()
-                ]
-            )
-            
-            
-            
-            # Remover o text_auto do px.bar e adicionar anotações manualmente para maior controle
-            fig.update_traces(text=None)
+@st.cache_resource # Um único cache de figuras por processo, compartilhado entre as sessões
+def caches_memo():
+    return memo.LRUCache(memo.FIGURE_CACHE_SIZE)
 
-            st.plotly_chart(fig, use_container_width=True) # Use st.plotly_chart para exibir no Streamlit
-        else:
-            st.warning("Não há dados para exibir os gráficos com os filtros selecionados.")
-
-        # --- Novo Gráfico: Exportações por State ---
-        # Agrupa por 'State' e soma 'US$ FOB', depois ordena
-        exportacoes_estado = df_filtrado.groupby(['State'])["US$ FOB"].sum().sort_values(ascending=False).reset_index()
-
-        if not exportacoes_estado.empty:
-            fig_estado = px.bar(exportacoes_estado, # Renomeei a variável para evitar conflito
-                                x='State',
-                                y='US$ FOB',
-                                title='Total em US$ de Exportações por Estado para França',
-                                opacity=0.65,
-                                text_auto=False) # Desabilitar text_auto para formatar manualmente
-
-            fig_estado.update_traces(
-                marker_color='#374b4a', # Uma cor diferente para este gráfico
-                marker_line_color='rgba(0,0,0,0)',
-                marker_line_width=0,
-                textposition='outside'
-            )
 
-            fig_estado.update_layout(
-                title_font_size=20,
-                title_x=0.05,
-                xaxis_title="Estado",
-                yaxis_title="Valor Exportado (US$)",
-                hovermode="x unified",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color="white"),
-                xaxis=dict(
-                    showgrid=False,
-                    tickangle=-45 # Rotacionar rótulos do eixo X para melhor leitura
-                ),
-                yaxis=dict(
-                    showgrid=True,
-                    gridcolor='#333333',
-                    tickformat='$.2s'
-                ),
-                annotations=[
-                    go.layout.Annotation(
-                        x=row['State'],
-                        y=row['US$ FOB'],
-                        text=dl.data_proc.format_value_dynamic(row['US$ FOB']),
-                        showarrow=False,
-                        yshift=10,
-                        font=dict(color='#374b4a', size=14, weight='bold')
-                    ) for index, row in exportacoes_estado.iterrows()
-                ]
-            )
-            fig_estado.update_traces(text=None) # Remove text_auto from px.bar
+cache_figuras = caches_memo()
+filtros = (cidades_selecionadas, estados_selecionados, anos_selecionados)
+# Chave da seleção atual: fonte de dados + filtros normalizados (a ordem da seleção não importa)
+chave_filtros = (file_path, versao, compartilhado) + memo.filter_key(*filtros)
 
-            st.plotly_chart(fig_estado, use_container_width=True)
-        else:
-            st.warning("Não há dados para exibir os gráficos com os filtros selecionados.")
-
-        # --- Novo Gráfico: Exportações por City ---
-        # Agrupa por 'City' e soma 'US$ FOB', depois ordena
-        exportacoes_cidade = df_filtrado.groupby(['City'])["US$ FOB"].sum().sort_values(ascending=False).reset_index()
-
-        if not exportacoes_cidade.empty:
-            fig_cidade_plot = px.bar(exportacoes_cidade, # Renomeei a variável para evitar conflito
-                                     x='City',
-                                     y='US$ FOB',
-                                     title='Total em US$ para França',
-                                     opacity=0.65,
-                                     text_auto=False) # Desabilitar text_auto para formatar manualmente
-
-            fig_cidade_plot.update_traces(
-                marker_color='#09bc8a', # Uma cor diferente para este gráfico
-                marker_line_color='rgba(0,0,0,0)',
-                marker_line_width=0,
-                textposition='outside'
-            )
 
-            fig_cidade_plot.update_layout(
-                title_font_size=20,
-                title_x=0.05,
-                xaxis_title="Cidade", # Alterei de "Estado" para "Cidade" aqui
-                yaxis_title="Valor Exportado (US$)",
-                hovermode="x unified",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color="white"),
-                xaxis=dict(
-                    showgrid=False,
-                    tickangle=-45 # Rotacionar rótulos do eixo X para melhor leitura
-                ),
-                yaxis=dict(
-                    showgrid=True,
-                    gridcolor='#333333',
-                    tickformat='$.2s'
-                ),
-                annotations=[
-                    go.layout.Annotation(
-                        x=row['City'],
-                        y=row['US$ FOB'],
-                        text=dl.data_proc.format_value_dynamic(row['US$ FOB']),
-                        showarrow=False,
-                        yshift=10,
-                        font=dict(color='#09bc8a', size=14, weight='bold')
-                    ) for index, row in exportacoes_cidade.iterrows()
-                ]
-            )
-            fig_cidade_plot.update_traces(text=None) # Remove text_auto from px.bar
+@st.cache_resource(max_entries=1) # Relido só quando o manifesto muda (nova exportação) ou a versão dos dados muda
+def relatorio_exportado(pasta, versao, data_manifesto):
+    return report.load_manifest(pasta, versao)
 
-            st.plotly_chart(fig_cidade_plot, use_container_width=True)
-        else:
-            st.warning("Não há dados para exibir os gráficos com os filtros selecionados.")
-
-
-        cidade_itens_por_valor = df_filtrado.groupby(['City', 'SH2 Description'])['US$ FOB'].sum().sort_values(ascending=False).reset_index()
-
-
-        if not cidade_itens_por_valor.empty:
-            fig_heatmap = px.density_heatmap(cidade_itens_por_valor,
-                                             x='City',
-                                             y='SH2 Description',
-                                             z='US$ FOB',
-                                             title='US$ FOB por Cidade e Descrição SH2 Description',
-                                             color_continuous_scale='Plasma') # Outras opções: 'Viridis', 'Inferno', 'Magma', 'Cividis'
-
-            # Atualiza o layout do gráfico para melhorar a estética e legibilidade.
-            fig_heatmap.update_layout(
-                title_font_size=20, # Tamanho da fonte do título
-                title_x=0.05,       # Posição horizontal do título (0.5 é centralizado)
-                xaxis_title="Cidade", # Título do eixo X
-                yaxis_title="Descrição", # Título do eixo Y
-                hovermode="closest", # Define o modo de exibição do tooltip ao passar o mouse
-                plot_bgcolor='rgba(0,0,0,0)', # Fundo do gráfico transparente
-                paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel (área ao redor do gráfico) transparente
-                xaxis=dict(
-                    showgrid=False,     # Não mostra as linhas de grade no eixo X
-                    tickangle=-45       # Rotaciona os rótulos do eixo X em -45 graus para evitar sobreposição
-                ),
-                yaxis=dict(
-                    showgrid=True,      # Mostra as linhas de grade no eixo Y
-                    tickformat='$.2s'   # Formato dos ticks do eixo Y como moeda simplificada (ex: $100k, $1M)
-                )
-            )
 
-            st.plotly_chart(fig_heatmap, use_container_width=True)
-        else:
-            st.warning("Não há dados para exibir os gráficos com os filtros selecionados.")
+# Relatório estático exportado com report.py (DASH_REPORT_DIR, padrão data/relatorio): quando a seleção atual
+# foi exportada, figuras e tabelas são lidas do disco em vez de recalculadas
+pasta_relatorio = os.environ.get("DASH_REPORT_DIR", report.REPORT_DIR_DEFAULT)
+caminho_manifesto = os.path.join(pasta_relatorio, report.MANIFEST_FILE)
+manifesto_relatorio = relatorio_exportado(
+    pasta_relatorio, versao, os.path.getmtime(caminho_manifesto) if os.path.exists(caminho_manifesto) else None)
+chave_relatorio = report.canonical_filters(filtros, report.filter_options(fonte))
 
-        net_weight_by_dolar = df_filtrado.groupby(['City','State','SH4 Description'])[['US$ FOB','Net Weight']].sum().reset_index()
+with st.sidebar:
+    with st.expander("Cache"):
+        for nome, cache_lru in (("Consultas", fonte.resultados), ("Linhas", fonte.linhas), ("Figuras", cache_figuras)):
+            estatisticas = cache_lru.stats()
+            st.caption(f"{nome}: {estatisticas['hits']} hits, {estatisticas['misses']} misses, "
+                       f"{estatisticas['itens']}/{estatisticas['limite']} itens, {estatisticas['descartes']} descartes")
+    # Painel de depuração com os tempos do rerun (também ligado por DASH_DEBUG_PANEL=1 ou ?debug=1 na URL)
+    painel_desempenho = st.checkbox(
+        "Painel de desempenho",
+        value=os.environ.get("DASH_DEBUG_PANEL") == "1" or st.query_params.get("debug") == "1",
+    )
 
-        if not net_weight_by_dolar.empty:
-            
-            try:
-                fig_net_dolar = px.scatter(
-                    net_weight_by_dolar,
-                    x="Net Weight",
-                    y="US$ FOB",
-                    log_x=True,
-                    log_y=True,
-                    title="Dispersão: Peso Líquido vs. Valor US$ FOB (Escala Log.)",
-                    color="Net Weight",
-                    )
-                fig_net_dolar.update_traces(
-                    mode='markers'
-                )
-                
-
-                st.plotly_chart(fig_net_dolar, use_container_width=True)
-            except Exception:
-                st.warning("Deu problema!")
 
+def figura(nome, construir, *parametros):
+    """
+    Figura memorizada (como dict, pronto para o st.plotly_chart) para a seleção atual e os parâmetros do gráfico.
+    construir() retorna um go.Figure() ou None quando não há dados; não é chamado se a figura estiver no relatório
+    exportado (ver report.py). O tamanho do JSON da figura é medido uma vez
+    (quando ela é construída) e registrado a cada exibição.
+    """
+    def calcular():
+        with instrumentation.span(f"relatorio.{nome}"):
+            exportada = report.load_figure(pasta_relatorio, manifesto_relatorio, chave_relatorio, nome, *parametros)
+        if exportada is not None:
+            return exportada
+        with instrumentation.span(f"grafico.{nome}"):
+            fig = construir()
+        if fig is None:
+            return None, 0
+        return fig.to_dict(), len(fig.to_json())
+    fig, tamanho = cache_figuras.get_or_compute(chave_filtros + (nome,) + parametros, calcular)
+    if fig is not None:
+        instrumentation.record_payload(nome, tamanho)
+    return fig
+
+
+def exibir_grafico(nome, fig):
+    """
+    st.plotly_chart medido (inclui a serialização da figura pelo Streamlit).
+    """
+    with instrumentation.span(f"plotly_chart.{nome}"):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+# Seleção exportada: o manifesto já diz se há dados (só seleções com linhas têm figuras); senão, filtra as linhas
+selecao_exportada = report.selection_entry(manifesto_relatorio, chave_relatorio)
+if selecao_exportada is not None:
+    tem_dados = bool(selecao_exportada['figuras'])
+else:
+    tem_dados = query.row_count(fonte, filtros) > 0
+
+
+def tabela_exportada(nome):
+    """
+    Tabela do relatório exportado para a seleção atual ('sh4' ou 'resumo'), ou None.
+    """
+    return report.load_table(pasta_relatorio, manifesto_relatorio, chave_relatorio, nome)
+
+
+def top_sh4(qtd_itens):
+    # Seleção parcial dos qtd_itens maiores (memorizada na camada de consultas) e formatação só das linhas exibidas;
+    # o ranking exportado já está em ordem, basta pegar o começo
+    ranking_exportado = tabela_exportada('sh4')
+    if ranking_exportado is not None:
+        top_produtos = ranking_exportado.head(qtd_itens).copy()
+    else:
+        top_produtos = query.top_sh4(fonte, filtros, qtd_itens).copy()
+    top_produtos['US$ FOB'] = data_proc.format_brl_currency(top_produtos['US$ FOB'])
+    return top_produtos
+
+
+def visao(funcao):
+    """
+    Transforma o corpo de uma visão em um st.fragment: um widget dentro dela (ex.: o slider do ranking) reroda só
+    a visão, e não o script inteiro. Um rerun só do fragmento é medido à parte (log/métricas; o painel da barra
+    lateral só é atualizado no rerun completo).
+    """
+    @st.fragment
+    @wraps(funcao)
+    def executar():
+        parcial = not instrumentation.rerun_active()
+        if parcial:
+            instrumentation.start_rerun()
+        funcao()
+        if parcial:
+            instrumentation.finish_rerun()
+    return executar
+
+
+@visao
+def visao_geral():
+    st.title("Dashboard de Exportação para a França 🎲")
+    st.write("Na Barra ao lado, selecione as opções e comece a manipular os gráficos")
+    # --- Geração do Gráfico ---
+    if tem_dados:
+        graficos = (('ano', figures.year_chart), ('estado', figures.state_chart), ('cidade', figures.city_chart), ('heatmap', figures.heatmap))
+        # Um espaço por gráfico, na ordem da página: as figuras são calculadas em paralelo e exibidas depois
+        espacos = {nome: st.container() for nome, _ in graficos}
+
+        modo_dispersao = st.radio(
+            "Modo do gráfico de dispersão:",
+            list(figures.SCATTER_MODES),
+            horizontal=True,
+            help="'Pontos exatos' envia no máximo o orçamento de pontos (amostra estratificada que preserva extremos); 'Densidade agregada' mostra a contagem de pontos por região do gráfico.",
+        )
+        orcamento_pontos = st.number_input(
+            "Máximo de pontos no gráfico de dispersão:",
+            min_value=100,
+            max_value=200000,
+            value=downsampling.POINT_BUDGET_DEFAULT,
+            step=1000,
+        )
+
+        # Tarefas sem chamadas ao Streamlit (rodam nas threads do pool de parallel.py)
+        tarefas = {}
+        for nome, construir in graficos:
+            parametros = () if nome == 'ano' else (top_n,) # Só os gráficos de ranking dependem do top N
+            tarefas[nome] = lambda nome=nome, construir=construir, parametros=parametros: figura(
+                nome, lambda: construir(fonte, filtros, *parametros), *parametros)
+
+        def dispersao():
+            try:
+                return figura('dispersao', lambda: figures.scatter_chart(fonte, filtros, modo_dispersao, orcamento_pontos), modo_dispersao, orcamento_pontos)
+            except Exception as e:
+                return e
+        tarefas['dispersao'] = dispersao
+
+        with instrumentation.span('graficos_paralelos'):
+            figuras = parallel.run_all(tarefas)
+
+        for nome, _ in graficos:
+            with espacos[nome]:
+                if figuras[nome] is not None:
+                    exibir_grafico(nome, figuras[nome]) # Usa st.plotly_chart para exibir no Streamlit
+                else:
+                    st.warning("Não há dados para exibir os gráficos com os filtros selecionados.")
+
+        fig_net_dolar = figuras['dispersao']
+        if isinstance(fig_net_dolar, Exception):
+            st.warning("Deu problema!")
+        elif fig_net_dolar is not None:
+            exibir_grafico('dispersao', fig_net_dolar)
         else:
             st.warning("Não há dados para exibir a tabela com os filtros selecionados.")
     else:
         st.warning("Nenhum dado disponível após a aplicação dos filtros. Tente ajustar suas seleções.")
 
-with tab2:
-    if not df_filtrado.empty:
-            top_produtos_list = df_filtrado.groupby(['City','State','SH4 Description'])['US$ FOB'].sum().sort_values(ascending=False).reset_index()
-            top_produtos_list = top_produtos_list.groupby('SH4 Description')['US$ FOB'].sum().sort_values(ascending=False).reset_index()
-            top_produtos_list = top_produtos_list[['SH4 Description','US$ FOB']]
-            top_produtos_list['US$ FOB'] = top_produtos_list['US$ FOB'].apply(lambda x: f"US$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+@visao
+def visao_ranking_sh4():
+    if tem_dados:
+            # Agregado uma vez por seleção (ou lido do relatório exportado); o slider não reagrupa
+            top_produtos_list = tabela_exportada('sh4')
+            if top_produtos_list is None:
+                top_produtos_list = query.sh4_ranking(fonte, filtros)
 
 
             if not top_produtos_list.empty:
 
                 st.title("SH4 Description Ranking Maiores US$ FOB 🔥")
                 qtd_itens = st.slider(
-                "Quantidade de Produtos para visualizar:",0,len(top_produtos_list['SH4 Description']))
+                "Quantidade de Produtos para visualizar:",0,len(top_produtos_list))
                 st.subheader(f"Top {qtd_itens} itens")
-                st.dataframe(top_produtos_list.head(qtd_itens), use_container_width=True) # Adicionado use_container_width aqui
+                st.dataframe(top_sh4(qtd_itens), use_container_width=True) # Adicionado use_container_width aqui
 
 
             else:
@@ -306,125 +273,68 @@ with tab2:
     else:
                 st.warning("Não há dados para exibir a tabela com os filtros selecionados.")
 
-with tab3:
+@visao
+def visao_estatisticas():
     st.title("Resumo Estatístico do DataFrame 🧠")
-    if not df_filtrado.empty:
+    if tem_dados:
         try:
             st.text('Os dados estatísticos do Dataset aparecem de acordo com os filtros aplicados. Para ver a análise geral, remova os filtros.')
-            st.dataframe(df_filtrado.describe())
-            
-            # Criar o histograma com Plotly Express
-            fig_histogram = px.histogram(
-                df_filtrado,
-                x='US$ FOB',
-                nbins=30, # Número de bins, similar ao 'bins' do seaborn
-                title='Distribuição US$ FOB',
-                labels={'US$ FOB': 'US$', 'sum': 'Frequência'}, # Rótulos dos eixos
-                color_discrete_sequence=['teal'], # Cor das barras
-                opacity=0.7 # Opacidade das barras
-            )
-            
-            # Aplicando escala logarítmica ao eixo Y
-            fig_histogram.update_layout(
-                yaxis_type="log",
-                yaxis_title="Contagem (Escala Logarítmica)"
+            aproximado = st.checkbox(
+                "Estatísticas aproximadas (sketch)",
+                help="Calcula o resumo, o histograma e o boxplot de US$ FOB e Net Weight a partir de sketches e momentos pré-calculados por estado/ano, sem ler as linhas filtradas. "
+                     "Contagem, média, desvio, mínimo e máximo são exatos; os quartis ficam a até 1% do valor exato e as faixas do histograma/boxplot são aproximadas. "
+                     "Com filtro de cidade, o cálculo é exato.",
             )
 
-            # Customizações de layout
-            fig_histogram.update_layout(
-                xaxis_title='US$ FOB',
-                yaxis_title='Frequência',
-                title_font_size=18, # Tamanho da fonte do título
-                title_x=0.5, # Centraliza o título
-                plot_bgcolor='rgba(0,0,0,0)', # Fundo do gráfico transparente
-                paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel transparente
-                xaxis=dict(
-                    showgrid=True, # Mostrar grade no eixo X
-                    gridcolor='rgba(200,200,200,0.2)' # Cor da grade
-                ),
-                yaxis=dict(
-                    showgrid=True, # Mostrar grade no eixo Y
-                    gridcolor='rgba(200,200,200,0.2)' # Cor da grade
-                ),
-                bargap=0.05 # Espaçamento entre as barras
-            )
+            resumo = tabela_exportada('resumo') if not aproximado else None
+            if resumo is None:
+                resumo = query.summary(fonte, filtros, aproximado)
+            st.dataframe(resumo)
 
-            # Adicionar a linha vertical para a média
-            fig_histogram.add_vline(
-                x=df_filtrado['US$ FOB'].mean(),
-                line_color='firebrick',
-                line_dash='dash',
-                line_width=2,
-                annotation_text=f'Média: R${df_filtrado['US$ FOB'].mean():,.2f}', # Texto da anotação
-                annotation_position="top right", # Posição do texto (ex: "top right", "top left")
-                annotation_font_color="firebrick",
-                annotation_font_size=12,
-                annotation_bgcolor="rgba(255,255,255,0.8)",
-                annotation_bordercolor="firebrick",
-                annotation_borderwidth=1,
-                annotation_borderpad=2
-            )
-            
-                        # Adicionar a linha vertical para a média
-            fig_histogram.add_vline(
-                x=df_filtrado['US$ FOB'].median(),
-                line_color='firebrick',
-                line_dash='dash',
-                line_width=2,
-                annotation_text=f'Média: R${df_filtrado['US$ FOB'].median():,.2f}', # Texto da anotação
-                annotation_position="top left", # Posição do texto (ex: "top right", "top left")
-                annotation_font_color="firebrick",
-                annotation_font_size=12,
-                annotation_bgcolor="rgba(255,255,255,0.8)",
-                annotation_bordercolor="firebrick",
-                annotation_borderwidth=1,
-                annotation_borderpad=2
-            )
-            
-            # Se estiver usando Streamlit, você usaria:
-            st.plotly_chart(fig_histogram, use_container_width=True)
-            
-            
-            
-            Q1 = df_filtrado['Net Weight'].quantile(0.25)
-            Q3 = df_filtrado['Net Weight'].quantile(0.75)
-            IQR = Q3 - Q1
-
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-
-            df_filtrado_para_boxplot = df_filtrado[(df_filtrado['Net Weight'] >= lower_bound) & (df_filtrado['Net Weight'] <= upper_bound)].copy()
-
-            # Criando o boxplot
-            fig_boxplot = go.Figure()
-
-            fig_boxplot.add_trace(go.Box(
-                y=df_filtrado_para_boxplot['Net Weight'],
-                name='Peso Líquido',
-                boxpoints=False # Não mostrar pontos individuais (outliers já removidos)
-            ))
-
-            # Aplicando escala logarítmica ao eixo Y
-            fig_boxplot.update_layout(
-                title='Boxplot do Peso Líquido (Net Weight) (Outliers Removidos, Escala Logarítmica)',
-                yaxis_title='Peso Líquido (Net Weight)',
-                yaxis_type='log', # Aplicando escala logarítmica
-                yaxis=dict(
-                    tickmode='auto', # Permite que Plotly escolha os ticks automaticamente
-                    ticks='outside', # Ticks do lado de fora
-                    tickfont=dict(size=10) # Tamanho da fonte dos ticks
-                ),
-                showlegend=False # Não mostrar a legenda
-            )
+            exibir_grafico('histograma', figura('histograma', lambda: figures.histogram(fonte, filtros, aproximado), aproximado))
 
-            st.plotly_chart(fig_boxplot, use_container_width=True)            
-    
-    
+            fig_boxplot = figura('boxplot', lambda: figures.boxplot(fonte, filtros, aproximado), aproximado)
+            if fig_boxplot is not None:
+                exibir_grafico('boxplot', fig_boxplot)
+            else:
+                st.warning("Não há dados para exibir o boxplot com os filtros selecionados.")
         except Exception:
             st.warning("Não há dados para exibir a tabela com os filtros selecionados.")        
     else:
          st.warning("Não há dados para exibir a tabela com os filtros selecionados.")
 
 
+@visao
+def visao_series():
+    st.title("Séries Temporais Mensais 📈")
+    if tem_dados:
+        st.text('Os filtros de cidade e estado restringem os dados; o de ano restringe os períodos exibidos (o acumulado e a variação anual usam o histórico anterior).')
+        coluna_dimensao, coluna_metrica, coluna_granularidade = st.columns(3)
+        dimensao = coluna_dimensao.selectbox(
+            "Abrir por:",
+            list(figures.SERIES_DIMENSION_LABELS),
+            format_func=figures.SERIES_DIMENSION_LABELS.get,
+        )
+        metrica = coluna_metrica.radio("Métrica:", list(timeseries.METRICS))
+        granularidade = coluna_granularidade.radio("Granularidade:", list(timeseries.GRANULARITIES))
+        qtd_series = st.slider("Quantidade de séries (maiores totais no período):", 1, 30, timeseries.SERIES_N_DEFAULT)
+
+        parametros = (dimensao, metrica, granularidade, qtd_series)
+        fig_serie = figura('serie', lambda: figures.time_series_chart(fonte, filtros, *parametros), *parametros)
+        if fig_serie is not None:
+            exibir_grafico('serie', fig_serie)
+        else:
+            st.warning("Não há dados para exibir a série com os filtros selecionados.")
+    else:
+        st.warning("Nenhum dado disponível após a aplicação dos filtros. Tente ajustar suas seleções.")
+
+
+{"Geral": visao_geral, "Tabela SH4 Description": visao_ranking_sh4, "Estatísticas": visao_estatisticas,
+ "Séries temporais": visao_series}[visao_ativa]()
+
 st.markdown("---")
-st.caption("Desenvolvido com Streamlit. Discente: Matheus Naranjo Corrêa")
\ No newline at end of file
+st.caption("Desenvolvido com Streamlit. Discente: Matheus Naranjo Corrêa")
+
+resumo_rerun = instrumentation.finish_rerun()
+if painel_desempenho:
+    instrumentation.render_panel(resumo_rerun)
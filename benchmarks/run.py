@@ -0,0 +1,311 @@
+"""
+Benchmarks do pipeline do dashboard: carga, filtro, rollups (em série e em paralelo), cada consulta e figura
+do app (as mesmas funções de query.py e figures.py) e serialização, sobre CSVs sintéticos (ver benchmarks.synthetic)
+em uma ou mais escalas. Acima de --max-linhas-memoria, só as etapas em blocos rodam.
+Os resultados são gravados em JSON e podem ser comparados com uma execução anterior para detectar regressões.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.run --linhas 100k 1M --saida benchmarks/results/atual.json
+    python -m benchmarks.run --linhas 100k --comparar benchmarks/results/base.json
+
+Também mede a importação dos módulos na partida a frio (cada medida em um interpretador novo) e falha se os
+módulos do app.py passarem de IMPORT_BUDGET_SECONDS.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_loader as dl
+import data_processor as data_proc
+import downsampling
+import figures
+import parallel
+import query
+import stats
+import timeseries
+from benchmarks import synthetic
+
+DATA_DIR_DEFAULT = os.path.join('benchmarks', 'data') # CSVs sintéticos gerados (reaproveitados entre execuções)
+RESULTS_DIR_DEFAULT = os.path.join('benchmarks', 'results')
+REPEAT_DEFAULT = 5
+REGRESSION_TOLERANCE = 0.10 # Mais de 10% acima da mediana anterior conta como regressão
+REGRESSION_MIN_SECONDS = 0.002 # ...desde que a diferença passe de 2 ms (abaixo disso é ruído de medição)
+# Módulos importados pelo app.py (o streamlit já está carregado quando o script roda) e o orçamento de tempo
+# para importá-los na partida a frio de uma réplica
+APP_MODULES = ('instrumentation', 'data_loader', 'data_processor', 'query', 'figures', 'report', 'downsampling', 'memo', 'parallel', 'timeseries')
+IMPORT_BUDGET_SECONDS = 1.0
+# Bibliotecas medidas isoladamente, para mostrar de onde vem o custo
+IMPORT_LIBRARIES = ('streamlit', 'pandas', 'pyarrow', 'plotly.graph_objects', 'plotly.express')
+# Acima disso o CSV inteiro não é carregado em memória: só a carga em blocos e os rollups do cubo são medidos
+IN_MEMORY_MAX_ROWS = 10_000_000
+# Rollup da dispersão (o maior dos gráficos), medido em série e em paralelo sobre o cubo inteiro
+ROLLUP_KEYS = ['City', 'State', 'SH4 Description']
+ROLLUP_MEASURES = ['US$ FOB', 'Net Weight']
+PANEL_CHARTS = ('ano', 'estado', 'cidade', 'heatmap', 'dispersao') # Gráficos do painel principal do app.py
+
+
+def measure(funcao, repeticoes: int = REPEAT_DEFAULT):
+    """
+    Executa funcao() 'repeticoes' vezes. Retorna (dict com mediana/mínimo/máximo em segundos, último resultado).
+    """
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        'mediana_s': statistics.median(tempos),
+        'min_s': min(tempos),
+        'max_s': max(tempos),
+        'repeticoes': repeticoes,
+    }, resultado
+
+
+def measure_import(modulos, preimportados=(), repeticoes: int = REPEAT_DEFAULT):
+    """
+    Mede a importação de 'modulos' em um interpretador novo a cada repetição (partida a frio, sem sys.modules
+    nem caches em memória). Os 'preimportados' são carregados antes e ficam fora da medida.
+    Retorna um dict com mediana/mínimo/máximo em segundos, como measure().
+    """
+    codigo = "\n".join([
+        "import time",
+        *(f"import {modulo}" for modulo in preimportados),
+        "inicio = time.perf_counter()",
+        *(f"import {modulo}" for modulo in modulos),
+        "print(time.perf_counter() - inicio)",
+    ])
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], cwd=raiz, capture_output=True, text=True, check=True)
+        tempos.append(float(saida.stdout.strip().splitlines()[-1]))
+    return {
+        'mediana_s': statistics.median(tempos),
+        'min_s': min(tempos),
+        'max_s': max(tempos),
+        'repeticoes': repeticoes,
+    }
+
+
+def run_imports(repeticoes: int = REPEAT_DEFAULT):
+    """
+    Tempo de importação dos módulos do app.py (com o streamlit já carregado) e de cada biblioteca pesada.
+    Retorna um dict {nome do benchmark: medidas}; 'import.app' inclui o orçamento.
+    """
+    resultados = {'import.app': measure_import(APP_MODULES, ('streamlit',), repeticoes)}
+    resultados['import.app']['orcamento_s'] = IMPORT_BUDGET_SECONDS
+    for biblioteca in IMPORT_LIBRARIES:
+        resultados[f'import.{biblioteca}'] = measure_import([biblioteca], (), repeticoes)
+    for nome, medida in resultados.items():
+        print(f"  {nome:<32} {medida['mediana_s'] * 1000:>10.1f} ms")
+    return resultados
+
+
+def _selection(df: pd.DataFrame):
+    """
+    Seleção típica da barra lateral: as duas cidades com mais linhas, o estado com mais linhas e os últimos três anos.
+    """
+    cidades = df['City_State'].value_counts().index[:2].tolist()
+    estados = df['State'].value_counts().index[:1].tolist()
+    anos = sorted(df['Year'].unique().tolist())[-3:]
+    return cidades, estados, anos
+
+
+def _cold(fonte: query.DataSource, funcao):
+    """
+    funcao() com os caches da fonte vazios, como na primeira visita a uma seleção.
+    """
+    def executar():
+        fonte.clear()
+        return funcao()
+    return executar
+
+
+def _figures(fonte: query.DataSource, filtros, top_n: int):
+    """
+    As figuras do app.py, montadas pelas mesmas funções (figures.py sobre query.py), uma por gráfico.
+    """
+    return {
+        'ano': lambda: figures.year_chart(fonte, filtros),
+        'estado': lambda: figures.state_chart(fonte, filtros, top_n),
+        'cidade': lambda: figures.city_chart(fonte, filtros, top_n),
+        'heatmap': lambda: figures.heatmap(fonte, filtros, top_n),
+        'dispersao': lambda: figures.scatter_chart(fonte, filtros, figures.SCATTER_MODES[0], downsampling.POINT_BUDGET_DEFAULT),
+        'densidade': lambda: figures.scatter_chart(fonte, filtros, figures.SCATTER_MODES[1], downsampling.POINT_BUDGET_DEFAULT),
+        'histograma': lambda: figures.histogram(fonte, filtros),
+        'histograma_aproximado': lambda: figures.histogram(fonte, filtros, aproximado=True),
+        'boxplot': lambda: figures.boxplot(fonte, filtros),
+        'boxplot_aproximado': lambda: figures.boxplot(fonte, filtros, aproximado=True),
+        'serie': lambda: figures.time_series_chart(fonte, filtros, 'State', timeseries.METRICS[1], timeseries.GRANULARITIES[0],
+                                                   timeseries.SERIES_N_DEFAULT),
+    }
+
+
+def run_scale(caminho_csv: str, repeticoes: int = REPEAT_DEFAULT, top_n: int = data_proc.TOP_N_DEFAULT,
+              max_linhas_memoria: int = IN_MEMORY_MAX_ROWS):
+    """
+    Roda todos os benchmarks sobre um CSV. Retorna um dict {nome do benchmark: medidas}.
+    A carga em blocos e os rollups do cubo rodam em qualquer escala; as etapas que precisam do dataset
+    inteiro em memória (CSV completo, cache Parquet, consultas e figuras) só até max_linhas_memoria linhas.
+    """
+    resultados = {}
+
+    def registrar(nome, funcao, vezes=repeticoes):
+        resultados[nome], valor = measure(funcao, vezes)
+        print(f"  {nome:<32} {resultados[nome]['mediana_s'] * 1000:>10.1f} ms")
+        return valor
+
+    # Carga em blocos (pico de memória de um bloco) e cubo montado bloco a bloco
+    linhas = registrar('load.iter_chunks', lambda: sum(len(bloco) for bloco in dl.iter_dataset_chunks(caminho_csv)), 1)
+    resultados['load.iter_chunks']['linhas'] = linhas
+    cubo = registrar('load.cube_chunked', lambda: dl.build_cube_chunked(caminho_csv), 1)
+    resultados['load.cube_chunked']['linhas_cubo'] = len(cubo)
+
+    # Rollup do maior gráfico (dispersão) sobre o cubo inteiro: em série e dividido por ano (ver parallel.rollup)
+    registrar('rollup.serial', lambda: cube.rollup(cubo, ROLLUP_KEYS, ROLLUP_MEASURES))
+    registrar('rollup.parallel', lambda: parallel.rollup(cubo, ROLLUP_KEYS, ROLLUP_MEASURES, min_linhas=0))
+    resultados['rollup.parallel']['workers'] = parallel.workers()
+    del cubo
+    if linhas > max_linhas_memoria:
+        print(f"  Acima de {max_linhas_memoria} linhas: etapas com o dataset inteiro em memória puladas")
+        return resultados
+
+    # Carga do CSV inteiro: CSV bruto, tratamento e cache Parquet (gravado na primeira leitura com usar_cache=True)
+    bruto = registrar('load.read_csv', lambda: pd.read_csv(caminho_csv), 1)
+    registrar('load.clean_dataset', lambda: data_proc.clean_dataset(bruto))
+    registrar('load.prepare_dataset', lambda: data_proc.prepare_dataset(bruto.copy()), 1)
+    del bruto
+    registrar('load.csv_to_dataset', lambda: dl._carregar(caminho_csv, usar_cache=False), 1)
+    dl._carregar(caminho_csv, usar_cache=True)
+    registrar('load.parquet_cache', lambda: dl._carregar(caminho_csv, usar_cache=True))
+    fonte = registrar('load.data_source', lambda: query.DataSource(caminho_csv), 1)
+    df = fonte.dataset
+    resultados['load.data_source']['memoria_mb'] = df.memory_usage(deep=True).sum() / 1024**2
+
+    # Estruturas construídas uma vez por carga (as da fonte são montadas aqui, fora das medidas seguintes)
+    indice = registrar('build.filter_index', lambda: data_proc.build_filter_index(df))
+    registrar('build.cube', lambda: cube.build_cube(df))
+    registrar('build.sketch_table', lambda: stats.build_sketch_table(df, 'US$ FOB'))
+    registrar('build.moments_table', lambda: stats.build_moments_table(df, 'US$ FOB'))
+    registrar('build.timeseries_index', lambda: timeseries.TimeSeriesIndex(fonte.monthly_totals()))
+    fonte.cubo, fonte.indice, fonte.series_index
+    for coluna in query.SKETCH_COLUMNS:
+        fonte.sketch_table(coluna), fonte.moments_table(coluna)
+
+    # Filtros da barra lateral (máscara booleana vs. índice invertido)
+    cidades, estados, anos = _selection(df)
+    registrar('filter.mask', lambda: data_proc.columns_selected_by_options(df, cidades, [], anos))
+    registrar('filter.index', lambda: data_proc.columns_selected_by_options(df, cidades, [], anos, indice=indice))
+    registrar('filter.state_index', lambda: data_proc.columns_selected_by_options(df, [], estados, [], indice=indice))
+    registrar('filter.cube', lambda: cube.filter_cube(fonte.cubo, [], estados, anos))
+
+    # Figuras do app com o cache de consultas vazio (filtro, consulta e figura), depois a serialização
+    filtros = ((), tuple(estados), tuple(anos))
+    graficos = _figures(fonte, filtros, top_n)
+    for nome, construir in graficos.items():
+        fig = registrar(f'chart.{nome}', _cold(fonte, construir))
+        payload = registrar(f'serialize.{nome}', fig.to_json)
+        resultados[f'serialize.{nome}']['bytes'] = len(payload)
+    # Painel principal como o app.py monta: os gráficos ao mesmo tempo (ver parallel.run_all)
+    painel = {nome: graficos[nome] for nome in PANEL_CHARTS}
+    registrar('chart.panel_run_all', _cold(fonte, lambda: parallel.run_all(painel)))
+
+    registrar('query.sh4_ranking', _cold(fonte, lambda: query.sh4_ranking(fonte, filtros)))
+    registrar('query.top_sh4', lambda: query.top_sh4(fonte, filtros, 50)) # Ranking já no cache: só o corte
+    registrar('query.summary', _cold(fonte, lambda: query.summary(fonte, filtros)))
+    registrar('query.summary_approx', _cold(fonte, lambda: query.summary(fonte, filtros, aproximado=True)))
+    return resultados
+
+
+def environment():
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def compare(atual: dict, base: dict, tolerancia: float = REGRESSION_TOLERANCE):
+    """
+    Compara as medianas de duas execuções (mesma escala e mesmo benchmark). Imprime a razão atual/base
+    e retorna a lista de (escala, benchmark, razão) que ficaram mais lentos que a tolerância (e mais de REGRESSION_MIN_SECONDS).
+    """
+    regressoes = []
+    for escala, medidas in atual['resultados'].items():
+        medidas_base = base['resultados'].get(escala, {})
+        for nome, medida in medidas.items():
+            if nome not in medidas_base or not medidas_base[nome]['mediana_s']:
+                continue
+            razao = medida['mediana_s'] / medidas_base[nome]['mediana_s']
+            diferenca = medida['mediana_s'] - medidas_base[nome]['mediana_s']
+            marcador = ' <- regressão' if razao > 1 + tolerancia and diferenca > REGRESSION_MIN_SECONDS else ''
+            print(f"  {escala:>10} {nome:<32} {razao:>6.2f}x{marcador}")
+            if marcador:
+                regressoes.append((escala, nome, razao))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline do dashboard sobre dados sintéticos.")
+    parser.add_argument('--linhas', nargs='+', default=['100k'], help="Escalas (ex.: 100k 1M 10M 100M)")
+    parser.add_argument('--repeticoes', type=int, default=REPEAT_DEFAULT)
+    parser.add_argument('--pasta-dados', default=DATA_DIR_DEFAULT, help="Onde os CSVs sintéticos são gerados/reaproveitados")
+    parser.add_argument('--saida', help="JSON de resultados (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior, usado como base de comparação")
+    parser.add_argument('--tolerancia', type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-linhas-memoria', type=int, default=IN_MEMORY_MAX_ROWS,
+                        help="Acima disso, pula as etapas que carregam o dataset inteiro em memória")
+    parser.add_argument('--sem-importacao', action='store_true', help="Não mede o tempo de importação na partida a frio")
+    args = parser.parse_args()
+
+    execucao = {'ambiente': environment(), 'resultados': {}}
+    estourou_orcamento = False
+    if not args.sem_importacao:
+        print("Importação (partida a frio):")
+        importacao = execucao['resultados']['importacao'] = run_imports(args.repeticoes)
+        if importacao['import.app']['mediana_s'] > IMPORT_BUDGET_SECONDS:
+            print(f"  Módulos do app.py acima do orçamento de {IMPORT_BUDGET_SECONDS * 1000:.0f} ms")
+            estourou_orcamento = True
+    for texto in args.linhas:
+        linhas = synthetic.parse_rows(texto)
+        caminho_csv = os.path.join(args.pasta_dados, f"sintetico-{linhas}-s{args.seed}.csv")
+        if not os.path.exists(caminho_csv):
+            print(f"Gerando {caminho_csv}...")
+            synthetic.generate_csv(caminho_csv, linhas, args.seed)
+        print(f"{linhas} linhas:")
+        execucao['resultados'][str(linhas)] = run_scale(caminho_csv, args.repeticoes, max_linhas_memoria=args.max_linhas_memoria)
+
+    saida = args.saida or os.path.join(RESULTS_DIR_DEFAULT, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(execucao, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        print(f"Comparação com {args.comparar}:")
+        if compare(execucao, base, args.tolerancia):
+            sys.exit(1)
+    if estourou_orcamento:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
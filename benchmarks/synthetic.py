@@ -0,0 +1,125 @@
+"""
+Gerador de dados sintéticos no mesmo formato do CSV de exportações (data/exportacoes_franca.csv), para medir
+o desempenho do dashboard sem depender do arquivo real (versionado via Git LFS).
+
+Uso: python -m benchmarks.synthetic --linhas 10M --saida data/sintetico.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+CSV_COLUMNS = ['Year', 'Month', 'Country', 'City', 'SH4 Code', 'SH4 Description', 'SH2 Code', 'SH2 Description',
+               'Economic Block', 'US$ FOB', 'Net Weight']
+CHUNK_ROWS_DEFAULT = 1_000_000 # Linhas geradas/gravadas por vez (a memória não cresce com o tamanho do arquivo)
+STATES = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE',
+          'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+# Cidades usadas como seleção padrão na barra lateral do app.py
+DEFAULT_CITIES = ['Águas Mornas - SC', 'Alfenas - MG']
+N_CITIES = 2000
+N_SH4 = 1200
+YEARS = (1997, 2024)
+EUROPE_SHARE = 0.02 # Parte das linhas com 'Economic Block' == 'Europe' (removidas pelo clean_dataset)
+MISSING_SHARE = 0.001 # Parte das linhas com valor ausente (removidas pelo dropna)
+
+
+def parse_rows(texto):
+    """
+    Converte '100k', '1M', '2.5M' ou '100000' em quantidade de linhas.
+    """
+    texto = str(texto).strip().upper().replace('_', '')
+    multiplicador = {'K': 1_000, 'M': 1_000_000, 'B': 1_000_000_000}.get(texto[-1:], 1)
+    if multiplicador != 1:
+        texto = texto[:-1]
+    return int(float(texto) * multiplicador)
+
+
+def _zipf_weights(n, expoente=1.1):
+    pesos = 1 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+
+def _dimensions(seed):
+    """
+    Tabelas fixas (para a mesma semente) de cidades e produtos SH4, com pesos de Zipf: poucas cidades e produtos
+    concentram a maior parte das linhas, como nos dados reais.
+    """
+    rng = np.random.default_rng(seed)
+    ufs = rng.choice(STATES, N_CITIES - len(DEFAULT_CITIES))
+    cidades = DEFAULT_CITIES + [f"Cidade {i} - {uf}" for i, uf in enumerate(ufs)]
+    codigos_sh4 = np.sort(rng.choice(np.arange(100, 9800), N_SH4, replace=False))
+    return {
+        'cidades': np.array(cidades, dtype=object),
+        'peso_cidades': _zipf_weights(N_CITIES)[rng.permutation(N_CITIES)],
+        'sh4': codigos_sh4,
+        'peso_sh4': _zipf_weights(N_SH4)[rng.permutation(N_SH4)],
+    }
+
+
+def generate_chunk(linhas: int, rng: np.random.Generator, dimensoes: dict):
+    """
+    Gera 'linhas' registros sintéticos com as colunas do CSV original (CSV_COLUMNS). Retorna um pd.DataFrame().
+    """
+    cidade = rng.choice(len(dimensoes['cidades']), linhas, p=dimensoes['peso_cidades'])
+    sh4 = dimensoes['sh4'][rng.choice(len(dimensoes['sh4']), linhas, p=dimensoes['peso_sh4'])]
+    sh2 = sh4 // 100
+    # Peso e valor log-normais e correlacionados (US$/kg variando por produto)
+    peso = np.round(np.exp(rng.normal(6, 2.5, linhas)))
+    preco_kg = np.exp(rng.normal(1 + (sh4 % 7) * 0.3, 1.0, linhas))
+    fob = np.round(peso * preco_kg)
+    bloco = np.where(rng.random(linhas) < EUROPE_SHARE, 'Europe', 'European Union (EU)').astype(object)
+    bloco[rng.random(linhas) < MISSING_SHARE] = None
+
+    return pd.DataFrame({
+        'Year': rng.integers(YEARS[0], YEARS[1] + 1, linhas),
+        'Month': rng.integers(1, 13, linhas),
+        'Country': 'France',
+        'City': dimensoes['cidades'][cidade],
+        'SH4 Code': sh4.astype(np.float64), # No CSV original os códigos aparecem como float (ex.: 5757.0)
+        'SH4 Description': pd.Categorical(sh4).rename_categories(lambda c: f"Produto {c}"),
+        'SH2 Code': sh2.astype(np.float64),
+        'SH2 Description': pd.Categorical(sh2).rename_categories(lambda c: f"Capítulo {c}"),
+        'Economic Block': bloco,
+        'US$ FOB': fob,
+        'Net Weight': peso,
+    }, columns=CSV_COLUMNS)
+
+
+def generate_dataframe(linhas: int, seed: int = 0):
+    """
+    Gera o dataset sintético inteiro em memória (para escalas pequenas). Retorna um pd.DataFrame().
+    """
+    return generate_chunk(linhas, np.random.default_rng(seed + 1), _dimensions(seed))
+
+
+def generate_csv(caminho: str, linhas: int, seed: int = 0, chunk: int = CHUNK_ROWS_DEFAULT):
+    """
+    Grava um CSV sintético com 'linhas' registros, gerado e gravado em blocos de 'chunk' linhas
+    (100M de linhas não precisam caber em memória). A mesma semente gera sempre o mesmo arquivo.
+    """
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    dimensoes = _dimensions(seed)
+    rng = np.random.default_rng(seed + 1)
+    caminho_tmp = f"{caminho}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8', newline='') as arquivo:
+        for inicio in range(0, linhas, chunk):
+            bloco = generate_chunk(min(chunk, linhas - inicio), rng, dimensoes)
+            bloco.to_csv(arquivo, index=False, header=inicio == 0)
+    os.replace(caminho_tmp, caminho)
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um CSV sintético no formato das exportações para a França.")
+    parser.add_argument('--linhas', default='100k', help="Quantidade de linhas (ex.: 100k, 1M, 100M)")
+    parser.add_argument('--saida', required=True, help="Caminho do CSV gerado")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk', type=parse_rows, default=CHUNK_ROWS_DEFAULT, help="Linhas por bloco gravado")
+    args = parser.parse_args()
+    generate_csv(args.saida, parse_rows(args.linhas), args.seed, args.chunk)
+    print(f"{args.saida}: {parse_rows(args.linhas)} linhas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import data_processor as data_proc
+
+# plotly.express é importado só nos gráficos que o usam (dispersão e heatmap): sozinho ele custa mais
+# que o resto dos imports deste módulo na partida a frio, e as figuras lidas do relatório exportado nem o usam
+
+# Acima dessa quantidade de barras os rótulos de valor são omitidos (o valor continua no hover)
+MAX_BAR_LABELS = 60
+
+
+def bar_chart(df: pd.DataFrame, x: str, y: str, titulo: str, cor: str, titulo_x: str,
+              tamanho_rotulo: int = 14, tickangle: int = -45, todos_os_ticks: bool = False,
+              max_rotulos: int = MAX_BAR_LABELS):
+    """
+    Gráfico de barras no visual do dashboard, com os valores formatados (K/M/B) no topo de cada barra.
+    Os rótulos vão no array 'text' do próprio trace (e não como uma anotação por barra) e são omitidos
+    quando o gráfico tem mais de max_rotulos barras. Com todos_os_ticks=True, todos os valores de x aparecem no eixo.
+    Retorna um go.Figure()
+    """
+    mostrar_rotulos = len(df) <= max_rotulos
+    fig = go.Figure(go.Bar(
+        x=df[x],
+        y=df[y],
+        text=data_proc.format_values_dynamic(df[y]) if mostrar_rotulos else None,
+        textposition='outside', # Rótulo acima da barra
+        cliponaxis=False, # Não cortar os rótulos da barra mais alta
+        textfont=dict(color=cor, size=tamanho_rotulo, weight='bold'),
+        marker=dict(color=cor, opacity=0.65, line=dict(color='rgba(0,0,0,0)', width=0)),
+        hovertemplate=f"{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>",
+    ))
+
+    eixo_x = dict(showgrid=False, tickangle=tickangle)
+    if todos_os_ticks:
+        eixo_x = dict(
+            showgrid=False,
+            tickmode='array', # Garantir que todos os valores (ex.: anos) apareçam
+            tickvals=df[x],
+            ticktext=[str(valor) for valor in df[x]]
+        )
+
+    fig.update_layout(
+        title=titulo,
+        title_font_size=20, # Tamanho da fonte do título
+        title_x=0.05, # Alinhar o título à esquerda
+        xaxis_title=titulo_x,
+        yaxis_title="Valor Exportado (US$)",
+        hovermode="x unified", # Melhor experiência de hover
+        plot_bgcolor='rgba(0,0,0,0)', # Fundo do gráfico transparente
+        paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel transparente
+        font=dict(color="white"), # Cor da fonte para todo o gráfico (útil para modo escuro)
+        xaxis=eixo_x,
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='#333333', # Cor da grade para modo escuro
+            tickformat='$.2s' # Formato dos ticks do eixo Y (ex: $1B, $2B)
+        ),
+    )
+    return fig
+
+
+def log_scatter_chart(df: pd.DataFrame, x: str = "Net Weight", y: str = "US$ FOB", subtitulo: str = None):
+    """
+    Dispersão de Peso Líquido vs. Valor US$ FOB com eixos em escala log, colorida pelo peso.
+    O subtítulo opcional pode indicar, por exemplo, que os pontos são uma amostra. Retorna um go.Figure()
+    """
+    import plotly.express as px
+    fig = px.scatter(
+        df,
+        x=x,
+        y=y,
+        log_x=True,
+        log_y=True,
+        title="Dispersão: Peso Líquido vs. Valor US$ FOB (Escala Log.)",
+        color=x,
+    )
+    fig.update_traces(mode='markers')
+    if subtitulo:
+        fig.update_layout(title_subtitle_text=subtitulo)
+    return fig
+
+
+def log_density_chart(grade: pd.DataFrame, x: str = "Net Weight", y: str = "US$ FOB"):
+    """
+    Versão agregada da dispersão: um marcador por célula da grade log (ver downsampling.log_density_grid),
+    colorido pela quantidade de pontos na célula. Retorna um go.Figure()
+    """
+    fig = go.Figure(go.Scattergl(
+        x=grade[x],
+        y=grade[y],
+        mode='markers',
+        marker=dict(
+            color=grade['Quantidade'],
+            colorscale='Plasma',
+            symbol='square',
+            size=8,
+            colorbar=dict(title='Quantidade'),
+        ),
+        hovertemplate=f"{x}≈%{{x:.3s}}<br>{y}≈%{{y:.3s}}<br>Quantidade=%{{marker.color}}<extra></extra>",
+    ))
+    fig.update_layout(
+        title="Densidade: Peso Líquido vs. Valor US$ FOB (Escala Log.)",
+        xaxis=dict(type='log', title=x),
+        yaxis=dict(type='log', title=y),
+    )
+    return fig
+
+
+def heatmap_chart(df: pd.DataFrame, x: str = 'City', y: str = 'SH2 Description', z: str = 'US$ FOB'):
+    """
+    Heatmap de US$ FOB por Cidade e Descrição SH2. Retorna um go.Figure()
+    """
+    import plotly.express as px
+    fig = px.density_heatmap(df,
+                             x=x,
+                             y=y,
+                             z=z,
+                             title='US$ FOB por Cidade e Descrição SH2 Description',
+                             color_continuous_scale='Plasma') # Outras opções: 'Viridis', 'Inferno', 'Magma', 'Cividis'
+
+    # Atualiza o layout do gráfico para melhorar a estética e legibilidade.
+    fig.update_layout(
+        title_font_size=20, # Tamanho da fonte do título
+        title_x=0.05,       # Posição horizontal do título (0.5 é centralizado)
+        xaxis_title="Cidade", # Título do eixo X
+        yaxis_title="Descrição", # Título do eixo Y
+        hovermode="closest", # Define o modo de exibição do tooltip ao passar o mouse
+        plot_bgcolor='rgba(0,0,0,0)', # Fundo do gráfico transparente
+        paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel (área ao redor do gráfico) transparente
+        xaxis=dict(
+            showgrid=False,     # Não mostra as linhas de grade no eixo X
+            tickangle=-45       # Rotaciona os rótulos do eixo X em -45 graus para evitar sobreposição
+        ),
+        yaxis=dict(
+            showgrid=True,      # Mostra as linhas de grade no eixo Y
+            tickformat='$.2s'   # Formato dos ticks do eixo Y como moeda simplificada (ex: $100k, $1M)
+        )
+    )
+    return fig
+
+
+def histogram_chart(contagens, bordas, media: float, mediana: float):
+    """
+    Histograma da distribuição de US$ FOB (eixo Y em escala log), com linhas verticais na média e na mediana.
+    Recebe as contagens e bordas já calculadas no servidor (ver stats.histogram_bins), e não os valores brutos.
+    Retorna um go.Figure()
+    """
+    fig = go.Figure(go.Bar(
+        x=(bordas[:-1] + bordas[1:]) / 2, # Centro de cada faixa
+        y=contagens,
+        width=bordas[1:] - bordas[:-1],
+        marker_color='teal', # Cor das barras
+        opacity=0.7, # Opacidade das barras
+        customdata=np.column_stack([bordas[:-1], bordas[1:]]),
+        hovertemplate="US$ %{customdata[0]:,.0f} a %{customdata[1]:,.0f}<br>Frequência=%{y}<extra></extra>",
+    ))
+
+    # Customizações de layout
+    fig.update_layout(
+        title='Distribuição US$ FOB',
+        xaxis_title='US$ FOB',
+        yaxis_title='Frequência',
+        yaxis_type="log", # Aplicando escala logarítmica ao eixo Y
+        title_font_size=18, # Tamanho da fonte do título
+        title_x=0.5, # Centraliza o título
+        plot_bgcolor='rgba(0,0,0,0)', # Fundo do gráfico transparente
+        paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel transparente
+        xaxis=dict(
+            showgrid=True, # Mostrar grade no eixo X
+            gridcolor='rgba(200,200,200,0.2)' # Cor da grade
+        ),
+        yaxis=dict(
+            showgrid=True, # Mostrar grade no eixo Y
+            gridcolor='rgba(200,200,200,0.2)' # Cor da grade
+        ),
+        bargap=0.05 # Espaçamento entre as barras
+    )
+
+    for valor, rotulo, posicao in ((media, 'Média', "top right"), (mediana, 'Mediana', "top left")):
+        # Linha vertical para a média/mediana
+        fig.add_vline(
+            x=valor,
+            line_color='firebrick',
+            line_dash='dash',
+            line_width=2,
+            annotation_text=f'{rotulo}: R${valor:,.2f}', # Texto da anotação
+            annotation_position=posicao, # Posição do texto (ex: "top right", "top left")
+            annotation_font_color="firebrick",
+            annotation_font_size=12,
+            annotation_bgcolor="rgba(255,255,255,0.8)",
+            annotation_bordercolor="firebrick",
+            annotation_borderwidth=1,
+            annotation_borderpad=2
+        )
+    return fig
+
+
+def boxplot_chart(box: dict):
+    """
+    Boxplot do Peso Líquido (Net Weight) com os outliers removidos e eixo Y em escala log, desenhado a partir
+    das estatísticas já calculadas no servidor (ver stats.box_stats), sem enviar os valores brutos. Retorna um go.Figure()
+    """
+    fig = go.Figure()
+
+    fig.add_trace(go.Box(
+        q1=[box['q1']],
+        median=[box['mediana']],
+        q3=[box['q3']],
+        lowerfence=[box['minimo']],
+        upperfence=[box['maximo']],
+        mean=[box['media']],
+        name='Peso Líquido',
+        boxpoints=False # Não mostrar pontos individuais (outliers já removidos)
+    ))
+
+    # Aplicando escala logarítmica ao eixo Y
+    fig.update_layout(
+        title='Boxplot do Peso Líquido (Net Weight) (Outliers Removidos, Escala Logarítmica)',
+        yaxis_title='Peso Líquido (Net Weight)',
+        yaxis_type='log', # Aplicando escala logarítmica
+        yaxis=dict(
+            tickmode='auto', # Permite que Plotly escolha os ticks automaticamente
+            ticks='outside', # Ticks do lado de fora
+            tickfont=dict(size=10) # Tamanho da fonte dos ticks
+        ),
+        showlegend=False # Não mostrar a legenda
+    )
+    return fig
+
+
+def line_chart(df: pd.DataFrame, x: str, y: str, serie: str, titulo: str, titulo_y: str, percentual: bool = False):
+    """
+    Gráfico de linhas com uma linha por valor de 'serie' (ex.: uma por estado), no visual escuro do dashboard.
+    Com percentual=True o eixo Y é formatado em % (ex.: variação anual). Retorna um go.Figure()
+    """
+    fig = go.Figure()
+    for nome, linhas in df.groupby(serie, sort=False):
+        fig.add_trace(go.Scatter(
+            x=linhas[x],
+            y=linhas[y],
+            mode='lines',
+            name=str(nome),
+            connectgaps=False, # Períodos sem valor (ex.: janela incompleta) ficam em branco
+            hovertemplate=f"{nome}<br>%{{x}}<br>%{{y:{'.1%' if percentual else '$.3s'}}}<extra></extra>",
+        ))
+    fig.update_layout(
+        title=titulo,
+        title_font_size=20,
+        title_x=0.05,
+        xaxis_title="Período",
+        yaxis_title=titulo_y,
+        hovermode="closest",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, gridcolor='#333333', tickformat='.0%' if percentual else '$.2s'),
+    )
+    return fig
@@ -0,0 +1,72 @@
+import pandas as pd
+import data_processor as data_proc
+import instrumentation
+
+# Grão do cubo: uma linha por cidade/UF, ano e produto (SH4)
+CUBE_DIMENSIONS = ['City_State', 'Year', 'SH4 Description']
+# Atributos que dependem das dimensões acima (não aumentam o número de linhas do cubo)
+CUBE_ATTRIBUTES = ['City', 'State', 'SH2 Description']
+CUBE_MEASURES = ['US$ FOB', 'Net Weight']
+
+
+@instrumentation.timed('build_cube')
+def build_cube(df: pd.DataFrame):
+    """
+    Pré-agrega o dataset no grão (City_State, Year, SH4 Description), somando 'US$ FOB' e 'Net Weight'.
+    Os atributos City, State e SH2 Description são mantidos no cubo para permitir filtros e rollups.
+    As linhas saem ordenadas por ano, então cada ano é uma fatia contígua do cubo (ver parallel.rollup). Retorna um pd.DataFrame()
+    """
+    if df.empty:
+        return pd.DataFrame(columns=CUBE_DIMENSIONS + CUBE_ATTRIBUTES + CUBE_MEASURES)
+    chaves = CUBE_DIMENSIONS + [col for col in CUBE_ATTRIBUTES if col in df.columns]
+    return _by_year(df.groupby(chaves, observed=True, sort=False)[CUBE_MEASURES].sum().reset_index())
+
+
+def _by_year(cubo: pd.DataFrame):
+    return cubo.sort_values('Year', kind='stable', ignore_index=True)
+
+
+def merge_cubes(cubos: list):
+    """
+    Junta cubos parciais (ex.: de blocos ou partições diferentes do dataset), somando as medidas das linhas com as mesmas chaves.
+    """
+    cubos = [c for c in cubos if not c.empty]
+    if not cubos:
+        return build_cube(pd.DataFrame())
+    juntos = pd.concat(cubos, ignore_index=True) # Categorias diferentes entre os cubos viram texto aqui
+    chaves = [col for col in CUBE_DIMENSIONS + CUBE_ATTRIBUTES if col in juntos.columns]
+    cubo = juntos.groupby(chaves, observed=True, sort=False)[CUBE_MEASURES].sum().reset_index()
+    return _by_year(data_proc.apply_schema(cubo))
+
+
+def replace_years(cubo: pd.DataFrame, fatias: pd.DataFrame):
+    """
+    Troca as linhas do cubo dos anos presentes em 'fatias' (cubo já agregado só desses anos, ex.: com merge_cubes)
+    pelas de 'fatias'. Os demais anos não são reagregados.
+    """
+    mantidas = cubo[~cubo['Year'].isin(fatias['Year'].unique())]
+    partes = [parte for parte in (mantidas, fatias) if not parte.empty]
+    if not partes:
+        return build_cube(pd.DataFrame())
+    return _by_year(data_proc.apply_schema(pd.concat(partes, ignore_index=True)))
+
+
+def filter_cube(cube: pd.DataFrame, cidades_selecionadas: list, estados_selecionados: list, anos_selecionados: list):
+    """
+    Aplica os mesmos filtros da barra lateral (cidade, estado e ano) sobre o cubo.
+    """
+    return data_proc.columns_selected_by_options(cube, cidades_selecionadas, estados_selecionados, anos_selecionados)
+
+
+def rollup(cube: pd.DataFrame, por, medidas='US$ FOB', ordenar: bool = False):
+    """
+    Agrega o cubo (já filtrado) pelas colunas em 'por', somando as medidas informadas.
+    Com ordenar=True o resultado é ordenado de forma decrescente pela (primeira) medida. Retorna um pd.DataFrame()
+    """
+    resultado = cube.groupby(por, observed=True)[medidas].sum()
+    if ordenar:
+        if isinstance(resultado, pd.Series):
+            resultado = resultado.sort_values(ascending=False)
+        else:
+            resultado = resultado.sort_values(medidas[0], ascending=False)
+    return resultado.reset_index()
@@ -1,25 +1,300 @@
+import hashlib
+import logging
+import os
+
 import pandas as pd
-import streamlit as st
+import pyarrow as pa
+import pyarrow.parquet as pq
 import data_processor as data_proc
+import cube
+import data_store
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = ".cache" # Subpasta (ao lado do CSV) onde ficam os arquivos Parquet/Arrow já tratados
+CACHE_VERSION = 2 # Incrementar sempre que a limpeza/derivação mudar, para invalidar caches antigos
+CHUNK_SIZE_DEFAULT = 500_000 # Linhas lidas por vez na carga em blocos
 
-@st.cache_data # Cache para evitar recarregar dados a cada interação
-def load_dataset(caminho_arquivo):
+_hashes = {} # caminho -> ((mtime_ns, tamanho), hash) do último hash calculado
+
+
+def _hash_arquivo(caminho_arquivo):
     """
-    Carrega os dados de um arquivo CSV e converte a coluna 'Data' para datetime.
+    Calcula o hash (blake2b) do conteúdo do arquivo. Qualquer alteração no CSV gera um hash diferente.
+    O hash é guardado junto com o stat do arquivo (mtime e tamanho) e só é recalculado quando o stat muda.
     """
-    try:
+    estado = os.stat(caminho_arquivo)
+    assinatura = (estado.st_mtime_ns, estado.st_size)
+    guardado = _hashes.get(caminho_arquivo)
+    if guardado is not None and guardado[0] == assinatura:
+        return guardado[1]
+    with open(caminho_arquivo, 'rb') as arquivo:
+        hash_arquivo = hashlib.file_digest(arquivo, 'blake2b').hexdigest()[:16]
+    _hashes[caminho_arquivo] = (assinatura, hash_arquivo)
+    return hash_arquivo
+
+
+def _pasta_cache(caminho_arquivo):
+    return os.path.join(os.path.dirname(caminho_arquivo), CACHE_DIR)
+
+
+def _caminho_cache(caminho_arquivo, hash_arquivo, extensao='parquet'):
+    """
+    Monta o caminho do arquivo de cache a partir do nome do CSV e do hash do seu conteúdo.
+    """
+    nome = os.path.splitext(os.path.basename(caminho_arquivo))[0]
+    return os.path.join(_pasta_cache(caminho_arquivo), f"{nome}-{hash_arquivo}-v{CACHE_VERSION}.{extensao}")
+
+
+def _remover_caches_antigos(caminho_arquivo, manter, extensao):
+    """
+    Remove os arquivos de cache (com a extensão informada) do mesmo CSV que não estão em 'manter'.
+    No Linux, processos que ainda têm um arquivo removido mapeado em memória continuam lendo normalmente.
+    """
+    pasta = _pasta_cache(caminho_arquivo)
+    prefixo = os.path.splitext(os.path.basename(caminho_arquivo))[0] + '-'
+    for antigo in os.listdir(pasta):
+        caminho_antigo = os.path.join(pasta, antigo)
+        if antigo.startswith(prefixo) and antigo.endswith(f".{extensao}") and caminho_antigo not in manter:
+            os.remove(caminho_antigo)
+
+
+def _ler_csv(caminho_arquivo):
+    """
+    Lê o CSV inteiro e prepara o dataset (ver data_processor.prepare_dataset).
+    """
+    with instrumentation.span('read_csv'):
         df = pd.read_csv(caminho_arquivo)
-        if 'Data' in df.columns:
-            df['Data'] = pd.to_datetime(df['Data'], errors='coerce') # 'coerce' para lidar com erros
-        df = data_proc.clean_dataset(df)
-        df['State'] = df['City'].str.split(' - ').str[1]
-        df['City_State'] = df['City'].copy()
-        df['City'] = df['City'].str.split(' - ').str[0]
-        return df
-    except FileNotFoundError:
-        st.error(f"Erro: Arquivo '{caminho_arquivo}' não encontrado. Verifique o caminho.")
-        return pd.DataFrame() # Retorna DataFrame vazio em caso de erro
-    except Exception as e:
-        st.error(f"Erro ao carregar dados: {e}")
+    return data_proc.prepare_dataset(df).reset_index(drop=True)
+
+
+def iter_dataset_chunks(caminho_arquivo, chunksize=CHUNK_SIZE_DEFAULT, paises=None, anos=None, colunas=None):
+    """
+    Lê o CSV em blocos de 'chunksize' linhas e devolve (yield) cada bloco já preparado (ver data_processor.prepare_dataset).
+    Os filtros são aplicados antes da limpeza: 'paises' (coluna 'Country'), 'anos' (coluna 'Year') e 'colunas'
+    (apenas essas colunas são lidas do arquivo, além das necessárias para limpeza e filtros).
+    O pico de memória depende do tamanho do bloco, e não do tamanho do arquivo.
+    """
+    usecols = None
+    if colunas is not None:
+        obrigatorias = ['City', 'Economic Block'] + (['Country'] if paises else []) + (['Year'] if anos else [])
+        usecols = list(dict.fromkeys(list(colunas) + obrigatorias))
+
+    for bloco in pd.read_csv(caminho_arquivo, chunksize=chunksize, usecols=usecols):
+        if paises:
+            bloco = bloco[bloco['Country'].isin(paises)]
+        if anos:
+            bloco = bloco[bloco['Year'].isin(anos)]
+        if bloco.empty:
+            continue
+        bloco = data_proc.prepare_dataset(bloco)
+        if not bloco.empty:
+            yield bloco
+
+
+def load_dataset_chunked(caminho_arquivo, chunksize=CHUNK_SIZE_DEFAULT, paises=None, anos=None, colunas=None):
+    """
+    Carrega apenas as linhas/colunas que passam pelos filtros, lendo o CSV em blocos (ver iter_dataset_chunks).
+    Útil quando o arquivo completo não cabe em memória mas o recorte desejado cabe.
+    """
+    blocos = list(iter_dataset_chunks(caminho_arquivo, chunksize, paises, anos, colunas))
+    if not blocos:
         return pd.DataFrame()
+    # Cada bloco tem as próprias categorias: o esquema é reaplicado depois de juntar os blocos
+    return data_proc.apply_schema(pd.concat(blocos, ignore_index=True))
+
+
+def build_cube_chunked(caminho_arquivo, chunksize=CHUNK_SIZE_DEFAULT, paises=None, anos=None):
+    """
+    Monta o cubo pré-agregado (ver cube.build_cube) lendo o CSV em blocos: cada bloco é agregado
+    e somado ao cubo acumulado, sem nunca materializar o dataset inteiro.
+    """
+    colunas = cube.CUBE_DIMENSIONS + cube.CUBE_ATTRIBUTES + cube.CUBE_MEASURES
+    colunas = [col for col in colunas if col not in ('City_State', 'State')] # Derivadas de 'City'
+    cubo = None
+    for bloco in iter_dataset_chunks(caminho_arquivo, chunksize, paises, anos, colunas):
+        parcial = cube.build_cube(bloco)
+        cubo = parcial if cubo is None else cube.merge_cubes([cubo, parcial])
+    return cubo if cubo is not None else cube.build_cube(pd.DataFrame())
+
+
+@instrumentation.timed('read_parquet_cache')
+def _ler_cache(caminho_cache):
+    """
+    Lê o Parquet de cache com memory-map (sem copiar o arquivo inteiro para um buffer intermediário).
+    """
+    return pq.read_table(caminho_cache, memory_map=True).to_pandas()
+
+
+def _salvar_cache(df, caminho_arquivo, caminho_cache):
+    """
+    Grava o DataFrame tratado em Parquet de forma atômica e remove caches antigos do mesmo CSV.
+    """
+    try:
+        pasta = _pasta_cache(caminho_arquivo)
+        os.makedirs(pasta, exist_ok=True)
+        caminho_tmp = f"{caminho_cache}.{os.getpid()}.tmp" # Um por processo: várias réplicas podem gravar ao mesmo tempo
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), caminho_tmp)
+        os.replace(caminho_tmp, caminho_cache) # Evita que outro processo leia um arquivo pela metade
+        _remover_caches_antigos(caminho_arquivo, {caminho_cache}, 'parquet')
+    except OSError as e:
+        logger.warning("Não foi possível gravar o cache '%s': %s", caminho_cache, e)
+
+
+def _carregar(caminho_arquivo, usar_cache=True):
+    """
+    Carrega o dataset tratado (sem o cache do Streamlit): do repositório particionado, do cache Parquet ou do CSV.
+    """
+    if os.path.isdir(caminho_arquivo):
+        return data_store.load_store(caminho_arquivo)
+    if not usar_cache:
+        return _ler_csv(caminho_arquivo)
 
+    caminho_cache = _caminho_cache(caminho_arquivo, _hash_arquivo(caminho_arquivo))
+    if os.path.exists(caminho_cache):
+        return _ler_cache(caminho_cache)
+    df = _ler_csv(caminho_arquivo)
+    _salvar_cache(df, caminho_arquivo, caminho_cache)
+    return df
+
+
+def _chave_fonte(caminho_arquivo):
+    """
+    Identifica o conteúdo da fonte: hash do CSV ou versão do manifesto do repositório particionado.
+    """
+    if os.path.isdir(caminho_arquivo):
+        return f"m{data_store.store_version(caminho_arquivo)}"
+    return _hash_arquivo(caminho_arquivo)
+
+
+def _gravar_arrow(df, caminho_arrow):
+    """
+    Grava o DataFrame em um arquivo Arrow IPC sem compressão (pode ser mapeado em memória sem decodificação).
+    A gravação é atômica: o arquivo só aparece completo, mesmo com vários processos gravando ao mesmo tempo.
+    """
+    os.makedirs(os.path.dirname(caminho_arrow), exist_ok=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    caminho_tmp = f"{caminho_arrow}.{os.getpid()}.tmp"
+    with pa.OSFile(caminho_tmp, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(caminho_tmp, caminho_arrow)
+
+
+def _anexar_arrow(caminho_arrow):
+    """
+    Mapeia o arquivo Arrow IPC em memória (somente leitura). As colunas numéricas do DataFrame apontam direto
+    para as páginas do arquivo, que o sistema operacional compartilha entre todos os processos que o mapeiam.
+    """
+    tabela = pa.ipc.open_file(pa.memory_map(caminho_arrow, 'r')).read_all()
+    return tabela.to_pandas(split_blocks=True) # split_blocks evita juntar (copiar) as colunas em blocos
+
+
+def iter_source_chunks(caminho_arquivo, chunksize=CHUNK_SIZE_DEFAULT):
+    """
+    Devolve (yield) a fonte já tratada em blocos: as partições de um repositório particionado ou blocos do CSV
+    (ver iter_dataset_chunks). O pico de memória é o de um bloco.
+    """
+    if os.path.isdir(caminho_arquivo):
+        yield from data_store.iter_store(caminho_arquivo)
+    else:
+        yield from iter_dataset_chunks(caminho_arquivo, chunksize)
+
+
+def derived_cache(caminho_arquivo, extensao, gravar):
+    """
+    Arquivo derivado da fonte (pasta .cache, identificado pelo conteúdo atual da fonte, ex.: um banco de dados).
+    Se ainda não existir, é criado com gravar(caminho temporário) e movido de forma atômica; versões antigas
+    do mesmo arquivo são removidas. Retorna o caminho.
+    """
+    caminho = _caminho_cache(caminho_arquivo, _chave_fonte(caminho_arquivo), extensao)
+    if not os.path.exists(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+        gravar(caminho_tmp)
+        os.replace(caminho_tmp, caminho)
+        _remover_caches_antigos(caminho_arquivo, {caminho}, extensao)
+    return caminho
+
+
+def dataset_version(caminho_arquivo):
+    """
+    Identifica a versão atual da fonte de dados: a versão do manifesto para um repositório particionado (data_store)
+    ou o hash do conteúdo de um CSV. Usada como chave dos caches (do Streamlit e da camada de consultas) e do relatório
+    exportado para recarregar após mudanças. Um touch, checkout ou cópia não muda a versão: com o mesmo stat,
+    a verificação é só um os.stat; com o stat diferente, o hash é recalculado e confirma se o conteúdo mudou.
+    """
+    if os.path.isdir(caminho_arquivo):
+        return data_store.store_version(caminho_arquivo)
+    return _hash_arquivo(caminho_arquivo) if os.path.exists(caminho_arquivo) else None
+
+
+@instrumentation.timed('load_dataset')
+def load_dataset(caminho_arquivo, usar_cache=True, net_weight_float32=False):
+    """
+    Carrega os dados de um arquivo CSV e converte a coluna 'Data' para datetime.
+    Se caminho_arquivo for uma pasta, carrega o repositório particionado por mês (ver data_store).
+    Com usar_cache=True, o resultado já tratado é guardado em Parquet (pasta .cache ao lado do CSV), identificado pelo
+    hash do conteúdo do CSV. Enquanto o CSV não mudar, as próximas cargas leem o Parquet direto.
+    Com net_weight_float32=True, a coluna 'Net Weight' é reduzida para float32 após a carga.
+    Erros de leitura (ex.: FileNotFoundError) são registrados no log e repassados a quem chamou.
+    """
+    try:
+        df = _carregar(caminho_arquivo, usar_cache)
+    except Exception:
+        logger.exception("Erro ao carregar dados de '%s'", caminho_arquivo)
+        raise
+    if net_weight_float32:
+        df = data_proc.apply_schema(df, net_weight_float32=True)
+    return df
+
+
+@instrumentation.timed('load_cube')
+def load_cube(caminho_arquivo, dataset: pd.DataFrame = None):
+    """
+    Materializa o cubo pré-agregado (ver cube.build_cube) a partir do dataset já carregado (ou carregando-o).
+    Para um repositório particionado, lê o cubo já mantido pelo append.
+    """
+    if os.path.isdir(caminho_arquivo):
+        return data_store.load_store_cube(caminho_arquivo)
+    return cube.build_cube(load_dataset(caminho_arquivo) if dataset is None else dataset)
+
+
+def load_options(caminho_arquivo, col, dataset: pd.DataFrame = None):
+    """
+    Opções de um filtro da barra lateral. Para um repositório particionado, vêm do manifesto (mantido pelo append).
+    """
+    if os.path.isdir(caminho_arquivo):
+        return data_store.load_store_options(caminho_arquivo, col)
+    return data_proc.list_options_by_dataframe(load_dataset(caminho_arquivo) if dataset is None else dataset, col)
+
+
+@instrumentation.timed('load_shared_dataset')
+def load_shared_dataset(caminho_arquivo):
+    """
+    Modo compartilhado entre processos: o dataset tratado é gravado uma única vez em um arquivo Arrow IPC
+    (pasta .cache, identificado pelo conteúdo da fonte) e cada processo apenas o mapeia em memória.
+    As páginas do arquivo ficam no cache do sistema operacional, uma vez só para todos os processos.
+    O DataFrame retornado é somente leitura.
+    """
+    try:
+        chave = _chave_fonte(caminho_arquivo)
+        caminho_arrow = _caminho_cache(caminho_arquivo, chave, 'arrow')
+        if not os.path.exists(caminho_arrow):
+            _gravar_arrow(_carregar(caminho_arquivo), caminho_arrow)
+            _remover_caches_antigos(caminho_arquivo, {caminho_arrow, _caminho_cache(caminho_arquivo, chave, 'cubo.arrow')}, 'arrow')
+        return _anexar_arrow(caminho_arrow)
+    except Exception:
+        logger.exception("Erro ao carregar dados de '%s'", caminho_arquivo)
+        raise
+
+
+@instrumentation.timed('load_shared_cube')
+def load_shared_cube(caminho_arquivo, dataset: pd.DataFrame = None):
+    """
+    Cubo do modo compartilhado: gravado uma vez em Arrow IPC ao lado do dataset e mapeado em memória pelos processos.
+    """
+    caminho_arrow = _caminho_cache(caminho_arquivo, _chave_fonte(caminho_arquivo), 'cubo.arrow')
+    if not os.path.exists(caminho_arrow):
+        _gravar_arrow(load_cube(caminho_arquivo, dataset), caminho_arrow)
+    return _anexar_arrow(caminho_arrow)
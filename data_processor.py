@@ -1,7 +1,35 @@
+import logging
+
+import numpy as np
 import pandas as pd
-import streamlit as st
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+# Esquema em memória do dataset de exportações: dimensões como categorias e códigos em inteiros pequenos
+DATASET_SCHEMA = {
+    'Year': 'int16',
+    'Month': 'int8',
+    'Country': 'category',
+    'City': 'category',
+    'State': 'category',
+    'City_State': 'category',
+    'SH4 Code': 'int16',
+    'SH4 Description': 'category',
+    'SH2 Code': 'int8',
+    'SH2 Description': 'category',
+    'Economic Block': 'category',
+    'US$ FOB': 'float64',
+    'Net Weight': 'float64',
+}
 
+# Quantidade padrão de itens nos gráficos de ranking (o restante é somado em 'Outros')
+TOP_N_DEFAULT = 30
+OTHERS_LABEL = 'Outros'
 
+
+@instrumentation.timed('clean_dataset')
 def clean_dataset(df: pd.DataFrame):
     """
     Realiza a limpeza dos dados, removendo linhas em branco. Retorna um pd.Dataframe()
@@ -11,11 +39,54 @@ def clean_dataset(df: pd.DataFrame):
             df = df.dropna() #remover linhas em branco
             df = df[df['Economic Block'] !='Europe']
             return df
-    except Exception as e:
-        st.error(f"Erro ao carregar dados: {e}")
+    except Exception:
+        logger.exception("Erro ao carregar dados")
         return pd.DataFrame()
 
 
+def apply_schema(df: pd.DataFrame, net_weight_float32: bool = False):
+    """
+    Converte as colunas do DataFrame para os tipos definidos em DATASET_SCHEMA (apenas as colunas existentes).
+    Com net_weight_float32=True, a coluna 'Net Weight' é guardada em float32. Retorna um novo pd.DataFrame().
+    """
+    schema = {col: dtype for col, dtype in DATASET_SCHEMA.items() if col in df.columns}
+    if net_weight_float32 and 'Net Weight' in schema:
+        schema['Net Weight'] = 'float32'
+    return df.astype(schema)
+
+
+def memory_usage_comparison(df_antes: pd.DataFrame, df_depois: pd.DataFrame):
+    """
+    Compara o uso de memória (em MB) por coluna entre duas versões do mesmo dataset. Retorna um pd.DataFrame()
+    com as colunas 'Antes (MB)', 'Depois (MB)' e 'Redução (x)', incluindo uma linha 'Total'.
+    Colunas que só existem em df_depois (ex.: colunas derivadas) ficam com 'Antes (MB)' vazio.
+    """
+    antes = df_antes.memory_usage(deep=True, index=False) / (1024**2)
+    depois = df_depois.memory_usage(deep=True, index=False) / (1024**2)
+    comparacao = pd.DataFrame({'Antes (MB)': antes, 'Depois (MB)': depois}).reindex(depois.index)
+    comparacao.loc['Total'] = comparacao.sum()
+    comparacao['Redução (x)'] = comparacao['Antes (MB)'] / comparacao['Depois (MB)']
+    return comparacao
+
+
+@instrumentation.timed('prepare_dataset')
+def prepare_dataset(df: pd.DataFrame):
+    """
+    Prepara o dataset bruto (lido do CSV): converte a coluna 'Data', limpa o dataset, deriva as colunas 'State', 'City_State' e 'City'
+    e aplica o esquema tipado (categorias e inteiros pequenos) de DATASET_SCHEMA.
+    """
+    if 'Data' in df.columns:
+        df['Data'] = pd.to_datetime(df['Data'], errors='coerce') # 'coerce' para lidar com erros
+    df = clean_dataset(df)
+    if df.empty: # Ex.: um bloco da carga em blocos só com linhas da Europa
+        return apply_schema(df.assign(State=[], City_State=[]))
+    partes = df['City'].str.split(' - ') # Um único split para 'City' e 'State'
+    df['State'] = partes.str[1] # NaN quando a cidade não tem ' - '
+    df['City_State'] = df['City'].copy()
+    df['City'] = partes.str[0]
+    return apply_schema(df)
+
+
 def format_value_dynamic(value):
     """
     Formata um valor numérico para K (milhares), M (milhões) ou B (bilhões)
@@ -31,6 +102,78 @@ def format_value_dynamic(value):
         return f"${value:.2f}"
 
 
+def format_values_dynamic(valores):
+    """
+    Versão vetorizada de format_value_dynamic: recebe um array/Series de valores e retorna um np.ndarray de strings
+    no formato $1.23K, $4.56M, $7.89B (mesmas faixas e casas decimais).
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    magnitude = np.abs(valores)
+    faixas = [magnitude >= 1e9, magnitude >= 1e6, magnitude >= 1e3]
+    divisor = np.select(faixas, [1e9, 1e6, 1e3], default=1.0)
+    sufixo = np.select(faixas, ['B', 'M', 'K'], default='')
+    return np.char.add(np.char.add('$', np.char.mod('%.2f', valores / divisor)), sufixo)
+
+
+def _top_n_positions(valores: np.ndarray, n: int):
+    """
+    Posições dos n maiores valores, em ordem decrescente. Usa seleção parcial (argpartition) e só ordena os n escolhidos.
+    """
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+    if n >= len(valores):
+        return np.argsort(-valores, kind='stable')
+    top = np.argpartition(-valores, n - 1)[:n]
+    return top[np.argsort(-valores[top], kind='stable')]
+
+
+def top_n_with_others(df: pd.DataFrame, coluna: str, valor: str = 'US$ FOB', n: int = TOP_N_DEFAULT, rotulo_outros: str = OTHERS_LABEL):
+    """
+    Recebe um DataFrame já agregado (uma linha por valor de 'coluna') e mantém só as n linhas de maior 'valor',
+    em ordem decrescente. A soma das demais linhas vira uma última linha com o rótulo 'Outros'. Retorna um pd.DataFrame()
+    """
+    valores = df[valor].to_numpy()
+    top = _top_n_positions(valores, n)
+    resultado = df.iloc[top][[coluna, valor]].reset_index(drop=True)
+    if len(top) < len(df):
+        outros = valores.sum() - valores[top].sum()
+        resultado = pd.concat([resultado.astype({coluna: object}), pd.DataFrame({coluna: [rotulo_outros], valor: [outros]})], ignore_index=True)
+    return resultado
+
+
+def _bucket_others(serie: pd.Series, pesos: pd.Series, n: int, rotulo_outros: str):
+    """
+    Substitui por 'Outros' os valores de 'serie' que não estão entre os n de maior peso total.
+    """
+    totais = pesos.groupby(serie, observed=True).sum()
+    manter = totais.index[_top_n_positions(totais.to_numpy(), n)]
+    return pd.Series(np.where(serie.isin(manter), serie.astype(object), rotulo_outros), index=serie.index)
+
+
+def top_n_grid(df: pd.DataFrame, coluna_x: str, coluna_y: str, valor: str = 'US$ FOB',
+               n_x: int = TOP_N_DEFAULT, n_y: int = TOP_N_DEFAULT, rotulo_outros: str = OTHERS_LABEL):
+    """
+    Reduz uma matriz (ex.: Cidade x SH2) aos n_x valores de coluna_x e n_y valores de coluna_y de maior 'valor' total;
+    os demais são agrupados em 'Outros' em cada eixo. Retorna um pd.DataFrame() ordenado de forma decrescente por 'valor'.
+    """
+    x = _bucket_others(df[coluna_x], df[valor], n_x, rotulo_outros)
+    y = _bucket_others(df[coluna_y], df[valor], n_y, rotulo_outros)
+    resultado = df[valor].groupby([x.rename(coluna_x), y.rename(coluna_y)]).sum()
+    return resultado.sort_values(ascending=False).reset_index()
+
+
+# Troca ',' por '.' e vice-versa em uma única passada (formato brasileiro de milhar/decimal)
+_TROCA_SEPARADORES = str.maketrans({',': '.', '.': ','})
+
+
+def format_brl_currency(valores):
+    """
+    Formata valores como 'US$ 1.234.567,89' (separadores no padrão brasileiro). Use apenas nas linhas exibidas.
+    Retorna uma lista de strings.
+    """
+    return [f"US$ {valor:,.2f}".translate(_TROCA_SEPARADORES) for valor in valores]
+
+
 def list_options_by_dataframe(df:pd.DataFrame,col:str):
     """
     Passe o dataframe e o nome da coluna da qual você deseja que retorne uma tupla de opções. Serve para caixas de seleções
@@ -41,16 +184,17 @@ def list_options_by_dataframe(df:pd.DataFrame,col:str):
                 options = tuple(df[col].unique())
                 return options
             else:
-                print(f"Erro: A coluna '{col}' não existe no DataFrame.")
+                logger.error("A coluna '%s' não existe no DataFrame.", col)
                 return () # Retorna uma tupla vazia se a coluna não for encontrada
-    except Exception as e:
-        st.error(f"Erro ao carregar dados: {e}")
+    except Exception:
+        logger.exception("Erro ao carregar dados")
         return pd.DataFrame()
 
 
-def dataset_report(df: pd.DataFrame):
+def dataset_report(df: pd.DataFrame, df_antes: pd.DataFrame = None):
     """
     Esta função gera um print personalizado que rtorna as principais informações do arquivo usado para análises  
+    Se df_antes for informado (ex.: o dataset antes do apply_schema), mostra também o uso de memória antes/depois.
     """
     print("--- Dataset Report ---")
     print(f"Número de Linhas: {df.shape[0]}")
@@ -87,23 +231,85 @@ def dataset_report(df: pd.DataFrame):
     # Memory Usage
     mem_usage = df.memory_usage(deep=True).sum()
     print(f"Tamanho do Dataset (Uso de Memória): {mem_usage / (1024**2):.2f} MB")
+
+    if df_antes is not None:
+        comparacao = memory_usage_comparison(df_antes, df)
+        print("\nUso de Memória por Coluna (Antes x Depois):")
+        for col, linha in comparacao.iterrows():
+            if pd.isna(linha['Antes (MB)']):
+                print(f"  - {col}: {linha['Depois (MB)']:.2f} MB (coluna nova)")
+                continue
+            print(f"  - {col}: {linha['Antes (MB)']:.2f} MB -> {linha['Depois (MB)']:.2f} MB ({linha['Redução (x)']:.1f}x)")
     print("--------------------")
 
 
-def columns_selected_by_options(df: pd.DataFrame, cidades_selecionadas: list, estados_selecionados: list, anos_selecionados: list):
+# Colunas usadas pelos filtros da barra lateral, na ordem em que são aplicados
+FILTER_COLUMNS = ('City_State', 'State', 'Year')
+
+
+@instrumentation.timed('build_filter_index')
+def build_filter_index(df: pd.DataFrame, colunas=FILTER_COLUMNS):
     """
-    Filtra o DataFrame com base nas seleções de cidade, estado e ano.
-    Se uma lista de seleção estiver vazia, nenhum filtro é aplicado para aquela categoria.
+    Constrói, uma única vez por carga do dataset, um índice invertido {coluna: {valor: posições}} para as colunas de filtro.
+    As posições de cada valor são um np.ndarray ordenado com as linhas (posicionais) em que o valor aparece.
+    """
+    tipo_posicao = np.int32 if len(df) < np.iinfo(np.int32).max else np.int64
+    indice = {}
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        codigos, valores = pd.factorize(df[col])
+        ordem = np.argsort(codigos, kind='stable').astype(tipo_posicao) # 'stable' mantém as posições de cada valor ordenadas
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+        inicio = int((codigos < 0).sum()) # Valores vazios (código -1) ficam no começo e não entram no índice
+        fatias = np.split(ordem[inicio:], np.cumsum(contagens)[:-1])
+        indice[col] = dict(zip(valores.tolist(), fatias))
+    return indice
+
+
+def _positions_for(indice_coluna: dict, selecionados: list):
     """
-    df_filtrado = df.copy()
+    Une as posições de todos os valores selecionados de uma coluna (as listas de cada valor são disjuntas).
+    """
+    partes = [indice_coluna[valor] for valor in selecionados if valor in indice_coluna]
+    if not partes:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate(partes))
 
-    if cidades_selecionadas:
-        df_filtrado = df_filtrado[df_filtrado['City_State'].isin(cidades_selecionadas)]
 
-    if estados_selecionados:
-        df_filtrado = df_filtrado[df_filtrado['State'].isin(estados_selecionados)]
+def selected_positions(indice: dict, cidades_selecionadas: list, estados_selecionados: list, anos_selecionados: list):
+    """
+    Posições (ordenadas) das linhas que atendem às seleções, intersectando as posições de cada coluna no índice
+    de build_filter_index, sem extrair nenhuma linha. Retorna None se nenhuma seleção filtrar (todas as linhas).
+    """
+    posicoes = None
+    for col, selecionados in zip(FILTER_COLUMNS, (cidades_selecionadas, estados_selecionados, anos_selecionados)):
+        if selecionados:
+            posicoes_col = _positions_for(indice[col], selecionados)
+            posicoes = posicoes_col if posicoes is None else np.intersect1d(posicoes, posicoes_col, assume_unique=True)
+    return posicoes
+
+
+@instrumentation.timed('columns_selected_by_options')
+def columns_selected_by_options(df: pd.DataFrame, cidades_selecionadas: list, estados_selecionados: list, anos_selecionados: list, indice: dict = None):
+    """
+    Filtra o DataFrame com base nas seleções de cidade, estado e ano.
+    Se uma lista de seleção estiver vazia, nenhum filtro é aplicado para aquela categoria.
+    Com um índice de build_filter_index, as posições de cada seleção são intersectadas e as linhas extraídas com um único take.
+    O DataFrame original não é copiado: sem nenhum filtro ele próprio é retornado, então trate o resultado como somente leitura.
+    """
+    selecoes = [
+        (col, selecionados)
+        for col, selecionados in zip(FILTER_COLUMNS, (cidades_selecionadas, estados_selecionados, anos_selecionados))
+        if selecionados
+    ]
+    if not selecoes:
+        return df
 
-    if anos_selecionados:
-        df_filtrado = df_filtrado[df_filtrado['Year'].isin(anos_selecionados)]
+    if indice is not None and all(col in indice for col, _ in selecoes):
+        return df.take(selected_positions(indice, cidades_selecionadas, estados_selecionados, anos_selecionados))
 
-    return df_filtrado
+    mascara = np.ones(len(df), dtype=bool)
+    for col, selecionados in selecoes:
+        mascara &= df[col].isin(selecionados).to_numpy()
+    return df[mascara]
@@ -0,0 +1,160 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import data_processor as data_proc
+import cube
+import instrumentation
+
+# Estrutura da pasta do repositório particionado:
+#   <pasta>/Year=2016/Month=01/dados.parquet  -> linhas já tratadas do mês
+#   <pasta>/Year=2016/Month=01/cubo.parquet   -> cubo pré-agregado só do mês
+#   <pasta>/cubo.parquet                      -> cubo de todo o histórico
+#   <pasta>/manifesto.json                    -> versão, partições e listas de opções dos filtros
+MANIFEST_FILE = "manifesto.json"
+CUBE_FILE = "cubo.parquet"
+PARTITION_DATA_FILE = "dados.parquet"
+PARTITION_CUBE_FILE = "cubo.parquet"
+OPTION_COLUMNS = ('City_State', 'State', 'Year')
+
+
+def _partition_dir(pasta, ano, mes):
+    return os.path.join(pasta, f"Year={int(ano)}", f"Month={int(mes):02d}")
+
+
+def _write_parquet(df, caminho):
+    """
+    Grava o DataFrame em Parquet de forma atômica (arquivo temporário + os.replace).
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp" # Um por processo (ver data_loader._salvar_cache)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), caminho_tmp)
+    os.replace(caminho_tmp, caminho)
+
+
+def _read_parquet(caminho):
+    return pq.read_table(caminho, memory_map=True, partitioning=None).to_pandas() # Sem inferir "Year=..." do caminho
+
+
+def read_manifest(pasta):
+    """
+    Lê o manifesto do repositório. Um repositório ainda vazio tem versão 0 e nenhuma partição.
+    """
+    caminho = os.path.join(pasta, MANIFEST_FILE)
+    if not os.path.exists(caminho):
+        return {'versao': 0, 'particoes': [], 'opcoes': {col: [] for col in OPTION_COLUMNS}}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _write_manifest(pasta, manifesto):
+    caminho = os.path.join(pasta, MANIFEST_FILE)
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho)
+
+
+def store_version(pasta):
+    """
+    Versão atual do repositório (incrementada a cada append). Serve de chave para os caches do Streamlit.
+    """
+    return read_manifest(pasta)['versao']
+
+
+def append_partitions(pasta, df_novo: pd.DataFrame):
+    """
+    Acrescenta ao repositório as linhas de df_novo (já tratadas com data_processor.prepare_dataset), uma partição por (Year, Month).
+    Se um mês já existir, a partição é substituída. Retorna a lista de partições (ano, mês) gravadas.
+
+    O cubo geral é atualizado só nos anos recebidos: cada um é reagregado a partir dos seus cubos mensais (até 12)
+    e os demais anos são mantidos como estão. O arquivo do cubo geral ainda é lido e regravado inteiro, e a nova
+    versão do manifesto faz o app recarregar o repositório todo (ver data_loader.dataset_version).
+    Tudo é calculado antes da primeira gravação, e o manifesto é gravado por último: um erro no meio deixa
+    valendo a versão anterior (partições novas ainda fora do manifesto são ignoradas).
+    """
+    if df_novo.empty: # Ex.: um mês só com linhas da Europa, removidas pelo clean_dataset
+        return []
+    manifesto = read_manifest(pasta)
+    particoes = {tuple(p) for p in manifesto['particoes']}
+    novas = {}
+    for (ano, mes), df_mes in df_novo.groupby(['Year', 'Month'], observed=True, sort=True):
+        novas[(int(ano), int(mes))] = (df_mes.reset_index(drop=True), cube.build_cube(df_mes))
+    if not novas:
+        return []
+
+    # Cubo de cada ano recebido: cubos mensais novos (em memória) e os dos outros meses do ano (já gravados)
+    fatias = []
+    for ano in sorted({ano for ano, _ in novas}):
+        cubos = [novas[p][1] if p in novas else _read_parquet(os.path.join(_partition_dir(pasta, *p), PARTITION_CUBE_FILE))
+                 for p in sorted(particoes | set(novas)) if p[0] == ano]
+        fatias.append(cube.merge_cubes(cubos))
+    caminho_cubo = os.path.join(pasta, CUBE_FILE)
+    cubo_geral = cube.replace_years(load_store_cube(pasta), pd.concat(fatias, ignore_index=True))
+
+    for col in OPTION_COLUMNS:
+        opcoes = manifesto['opcoes'].setdefault(col, [])
+        conhecidas = set(opcoes)
+        for valor in data_proc.list_options_by_dataframe(df_novo, col):
+            valor = valor.item() if hasattr(valor, 'item') else valor # np.int16 -> int, para o JSON
+            if valor not in conhecidas:
+                opcoes.append(valor)
+                conhecidas.add(valor)
+    manifesto['particoes'] = sorted([list(p) for p in particoes | set(novas)])
+    manifesto['versao'] += 1
+
+    for (ano, mes), (df_mes, cubo_mes) in novas.items():
+        pasta_mes = _partition_dir(pasta, ano, mes)
+        _write_parquet(df_mes, os.path.join(pasta_mes, PARTITION_DATA_FILE))
+        _write_parquet(cubo_mes, os.path.join(pasta_mes, PARTITION_CUBE_FILE))
+    _write_parquet(cubo_geral, caminho_cubo)
+    _write_manifest(pasta, manifesto)
+    return list(novas)
+
+
+def append_csv(pasta, caminho_arquivo):
+    """
+    Lê um CSV com os registros novos (ex.: o mês mais recente), prepara e acrescenta ao repositório (ver append_partitions).
+    """
+    bruto = pd.read_csv(caminho_arquivo)
+    if bruto.empty:
+        return []
+    return append_partitions(pasta, data_proc.prepare_dataset(bruto))
+
+
+@instrumentation.timed('load_store')
+def load_store(pasta):
+    """
+    Carrega todas as partições do repositório em um único DataFrame, com o esquema tipado.
+    """
+    partes = list(iter_store(pasta))
+    if not partes:
+        return pd.DataFrame()
+    return data_proc.apply_schema(pd.concat(partes, ignore_index=True))
+
+
+def iter_store(pasta):
+    """
+    Devolve (yield) as linhas de cada partição (mês), uma de cada vez, sem juntar o histórico em memória.
+    """
+    for ano, mes in read_manifest(pasta)['particoes']:
+        yield _read_parquet(os.path.join(_partition_dir(pasta, ano, mes), PARTITION_DATA_FILE))
+
+
+def load_store_cube(pasta):
+    """
+    Lê o cubo geral já mantido pelo append (não reagrega as linhas).
+    """
+    caminho_cubo = os.path.join(pasta, CUBE_FILE)
+    if not os.path.exists(caminho_cubo):
+        return cube.build_cube(pd.DataFrame())
+    return _read_parquet(caminho_cubo)
+
+
+def load_store_options(pasta, col):
+    """
+    Lista de opções de um filtro, mantida no manifesto pelo append. Retorna uma tupla (como list_options_by_dataframe).
+    """
+    return tuple(read_manifest(pasta)['opcoes'].get(col, []))
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+# Quantidade padrão de pontos enviados ao navegador no gráfico de dispersão
+POINT_BUDGET_DEFAULT = 5000
+# Quantidade de faixas (em escala log) por eixo na grade de densidade
+DENSITY_BINS_DEFAULT = 60
+
+
+def _positive(df: pd.DataFrame, x: str, y: str):
+    """
+    Mantém apenas as linhas com x e y positivos (as únicas que aparecem em um gráfico com eixos log).
+    """
+    return df[(df[x] > 0) & (df[y] > 0)]
+
+
+def plotted_count(df: pd.DataFrame, x: str, y: str):
+    """
+    Quantidade de linhas que aparecem em um gráfico com eixos log (x e y positivos).
+    """
+    return int(((df[x] > 0) & (df[y] > 0)).sum())
+
+
+def _log_cells(x_log: np.ndarray, y_log: np.ndarray, bins: int):
+    """
+    Retorna, para cada ponto, o número da célula (faixa de x, faixa de y) em uma grade bins x bins no espaço log10.
+    Também retorna as bordas das faixas de cada eixo.
+    """
+    bordas_x = np.linspace(x_log.min(), x_log.max(), bins + 1)
+    bordas_y = np.linspace(y_log.min(), y_log.max(), bins + 1)
+    faixa_x = np.clip(np.searchsorted(bordas_x, x_log, side='right') - 1, 0, bins - 1)
+    faixa_y = np.clip(np.searchsorted(bordas_y, y_log, side='right') - 1, 0, bins - 1)
+    return faixa_x * bins + faixa_y, bordas_x, bordas_y
+
+
+def log_density_grid(df: pd.DataFrame, x: str, y: str, bins: int = DENSITY_BINS_DEFAULT):
+    """
+    Agrega os pontos em uma grade bins x bins no espaço log10 de x e y.
+    Retorna um pd.DataFrame() com uma linha por célula não vazia: o centro geométrico da célula em x e y
+    (na escala original) e a quantidade de pontos ('Quantidade').
+    """
+    df = _positive(df, x, y)
+    if df.empty:
+        return pd.DataFrame(columns=[x, y, 'Quantidade'])
+
+    celulas, bordas_x, bordas_y = _log_cells(np.log10(df[x].to_numpy(np.float64)), np.log10(df[y].to_numpy(np.float64)), bins)
+    contagens = np.bincount(celulas, minlength=bins * bins)
+    ocupadas = np.flatnonzero(contagens)
+    centros_x = (bordas_x[:-1] + bordas_x[1:]) / 2
+    centros_y = (bordas_y[:-1] + bordas_y[1:]) / 2
+    return pd.DataFrame({
+        x: 10 ** centros_x[ocupadas // bins],
+        y: 10 ** centros_y[ocupadas % bins],
+        'Quantidade': contagens[ocupadas],
+    })
+
+
+def sample_preserving_extremes(df: pd.DataFrame, x: str, y: str, orcamento: int = POINT_BUDGET_DEFAULT,
+                               bins: int = DENSITY_BINS_DEFAULT, seed: int = 0):
+    """
+    Reduz os pontos a no máximo 'orcamento' linhas com uma amostragem estratificada na grade log10:
+    cada célula contribui com até k pontos (k escolhido para caber no orçamento), então regiões esparsas e outliers
+    são mantidos, e os mínimos/máximos de x e y sempre entram. Se já couber no orçamento, retorna o DataFrame sem mudanças.
+    """
+    df = _positive(df, x, y)
+    if len(df) <= orcamento:
+        return df
+
+    valores_x = df[x].to_numpy(np.float64)
+    valores_y = df[y].to_numpy(np.float64)
+    extremos = np.unique([valores_x.argmin(), valores_x.argmax(), valores_y.argmin(), valores_y.argmax()])
+
+    celulas, _, _ = _log_cells(np.log10(valores_x), np.log10(valores_y), bins)
+    contagens = np.bincount(celulas)
+    restante = max(orcamento - len(extremos), 0)
+
+    # Maior k tal que sum(min(contagem, k)) <= restante
+    contagens_ordenadas = np.sort(contagens[contagens > 0])
+    acumulado = np.concatenate(([0], np.cumsum(contagens_ordenadas)))
+    k_candidatos = np.arange(1, min(contagens_ordenadas[-1], restante) + 1)
+    posicao = np.searchsorted(contagens_ordenadas, k_candidatos, side='left')
+    totais = acumulado[posicao] + k_candidatos * (len(contagens_ordenadas) - posicao)
+    k = int(k_candidatos[totais <= restante].max(initial=0))
+
+    # Ordem aleatória dentro de cada célula: o rank do ponto na célula decide se ele entra
+    rng = np.random.default_rng(seed)
+    ordem = np.lexsort((rng.random(len(df)), celulas))
+    inicio_celula = np.concatenate(([0], np.cumsum(contagens)))[celulas[ordem]]
+    rank = np.empty(len(df), dtype=np.int64)
+    rank[ordem] = np.arange(len(df)) - inicio_celula
+
+    escolhidos = np.union1d(np.flatnonzero(rank < k), extremos)
+    return df.iloc[escolhidos]
@@ -0,0 +1,95 @@
+import charts
+import query
+import timeseries
+
+# Figuras do dashboard montadas a partir da camada de consultas (query.py): usadas pelo app.py e pela
+# exportação do relatório estático (report.py), que assim geram exatamente as mesmas figuras.
+# Cada função recebe a fonte e os filtros e retorna um go.Figure(), ou None quando não há dados.
+
+SCATTER_MODES = ("Pontos exatos", "Densidade agregada")
+SERIES_DIMENSION_LABELS = {'State': "Estado", 'City': "Cidade", 'SH4 Description': "Produto (SH4)"}
+
+
+def year_chart(fonte, filtros):
+    exportacoes_ano = query.yearly_totals(fonte, filtros) # Rollup do cubo, com 'Year' como coluna
+    # Verifica se há dados para plotar após o groupby
+    if exportacoes_ano.empty:
+        return None
+    return charts.bar_chart(exportacoes_ano,
+                            x='Year',
+                            y='US$ FOB',
+                            titulo='Exportações realizadas para França em US$ ao longo dos anos',
+                            cor='#1f77b4', # Cor das barras (um azul padrão do Plotly)
+                            titulo_x="Ano",
+                            tamanho_rotulo=18,
+                            todos_os_ticks=True) # Garantir que todos os anos apareçam
+
+
+def state_chart(fonte, filtros, top_n):
+    # Rollup do cubo por 'State' somando 'US$ FOB', mantendo os top N (o restante vai para 'Outros')
+    exportacoes_estado = query.state_ranking(fonte, filtros, top_n)
+    if exportacoes_estado.empty:
+        return None
+    return charts.bar_chart(exportacoes_estado,
+                            x='State',
+                            y='US$ FOB',
+                            titulo='Total em US$ de Exportações por Estado para França',
+                            cor='#374b4a', # Uma cor diferente para este gráfico
+                            titulo_x="Estado")
+
+
+def city_chart(fonte, filtros, top_n):
+    # Rollup do cubo por 'City' somando 'US$ FOB', mantendo os top N (o restante vai para 'Outros')
+    exportacoes_cidade = query.city_ranking(fonte, filtros, top_n)
+    if exportacoes_cidade.empty:
+        return None
+    return charts.bar_chart(exportacoes_cidade,
+                            x='City',
+                            y='US$ FOB',
+                            titulo='Total em US$ para França',
+                            cor='#09bc8a', # Uma cor diferente para este gráfico
+                            titulo_x="Cidade")
+
+
+def heatmap(fonte, filtros, top_n):
+    # Matriz Cidade x SH2 limitada às top N cidades e top N descrições (demais em 'Outros')
+    cidade_itens_por_valor = query.city_sh2_matrix(fonte, filtros, top_n)
+    if cidade_itens_por_valor.empty:
+        return None
+    return charts.heatmap_chart(cidade_itens_por_valor)
+
+
+def scatter_chart(fonte, filtros, modo_dispersao, orcamento_pontos):
+    if query.scatter_totals(fonte, filtros).empty:
+        return None
+    if modo_dispersao == "Densidade agregada":
+        return charts.log_density_chart(query.scatter_density(fonte, filtros))
+    pontos, total = query.scatter_points(fonte, filtros, orcamento_pontos)
+    subtitulo = None
+    if len(pontos) < total:
+        subtitulo = f"Exibindo {len(pontos)} de {total} pontos (amostra que preserva os extremos)."
+    return charts.log_scatter_chart(pontos, subtitulo=subtitulo)
+
+
+def histogram(fonte, filtros, aproximado=False):
+    histograma = query.histogram(fonte, filtros, aproximado)
+    return charts.histogram_chart(histograma['contagens'], histograma['bordas'], histograma['media'], histograma['mediana'])
+
+
+def boxplot(fonte, filtros, aproximado=False):
+    box = query.box(fonte, filtros, aproximado)
+    return charts.boxplot_chart(box) if box is not None else None
+
+
+def time_series_chart(fonte, filtros, dimensao, metrica, granularidade, n):
+    serie = query.time_series(fonte, filtros, dimensao, metrica, granularidade, n)
+    if serie.empty:
+        return None
+    rotulo = SERIES_DIMENSION_LABELS[dimensao]
+    return charts.line_chart(serie,
+                             x='Período',
+                             y='Valor',
+                             serie=dimensao,
+                             titulo=f"{metrica} de US$ FOB por {rotulo.lower()} ({granularidade.lower()})",
+                             titulo_y="Variação" if metrica == timeseries.METRICS[2] else "Valor Exportado (US$)",
+                             percentual=metrica == timeseries.METRICS[2])
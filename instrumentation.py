@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger("dashboard.desempenho")
+
+# DASH_METRICS_FILE=/caminho/dashboard.prom: grava as métricas no formato texto do Prometheus (node_exporter textfile)
+METRICS_FILE_ENV = "DASH_METRICS_FILE"
+# DASH_LOG_LEVEL=INFO: configura o logger de desempenho (uma linha JSON por rerun)
+LOG_LEVEL_ENV = "DASH_LOG_LEVEL"
+# Limites (em segundos) das faixas do histograma de duração exportado para o Prometheus
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local() # Rerun atual de cada sessão (cada sessão do Streamlit roda em uma thread)
+_lock = threading.Lock()
+_metricas = {'spans': {}, 'payloads': {}, 'reruns': 0, 'rerun_segundos': 0.0}
+
+
+def configure_logging():
+    """
+    Liga a saída do logger de desempenho no nível de DASH_LOG_LEVEL (se definido e se ainda não houver handler).
+    """
+    nivel = os.environ.get(LOG_LEVEL_ENV)
+    if nivel and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(nivel.upper())
+
+
+def start_rerun():
+    """
+    Começa a coleta de um rerun na thread atual: os spans e payloads seguintes são atribuídos a ele.
+    """
+    _local.rerun = {'inicio': time.perf_counter(), 'spans': [], 'payloads': {}}
+    _local.pilha = []
+
+
+def _rerun_atual():
+    return getattr(_local, 'rerun', None)
+
+
+def rerun_active():
+    """
+    True se há um rerun sendo medido na thread atual (entre start_rerun e finish_rerun).
+    """
+    return _rerun_atual() is not None
+
+
+def current_context():
+    """
+    Rerun e spans abertos da thread atual, para repassar a outra thread (ver attach).
+    """
+    return _rerun_atual(), list(getattr(_local, 'pilha', []))
+
+
+@contextmanager
+def attach(contexto):
+    """
+    Associa a thread atual (ex.: uma thread de um pool) ao rerun de outra thread: os spans abertos aqui entram
+    no mesmo rerun, aninhados sob os spans que estavam abertos quando o contexto foi capturado.
+    """
+    anterior = (getattr(_local, 'rerun', None), getattr(_local, 'pilha', []))
+    _local.rerun, pilha = contexto
+    _local.pilha = list(pilha)
+    try:
+        yield
+    finally:
+        _local.rerun, _local.pilha = anterior
+
+
+@contextmanager
+def span(nome: str):
+    """
+    Mede a duração do bloco. Fica registrado no rerun atual (com a profundidade, para spans aninhados)
+    e nas métricas acumuladas do processo. Sem rerun ativo (ex.: benchmarks), só entra nas métricas acumuladas.
+    """
+    rerun = _rerun_atual()
+    pilha = getattr(_local, 'pilha', [])
+    registro = {'nome': nome, 'profundidade': len(pilha), 'ms': None}
+    if rerun is not None:
+        rerun['spans'].append(registro) # Entra na ordem de início, antes dos spans aninhados
+    pilha.append(nome)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        pilha.pop()
+        registro['ms'] = duracao * 1000
+        _acumular_span(nome, duracao)
+
+
+def timed(nome: str):
+    """
+    Decorador: mede cada chamada da função como um span com o nome informado.
+    """
+    def decorador(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with span(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def _acumular_span(nome, duracao):
+    with _lock:
+        metrica = _metricas['spans'].setdefault(nome, {'quantidade': 0, 'soma': 0.0, 'faixas': [0] * len(SPAN_BUCKETS)})
+        metrica['quantidade'] += 1
+        metrica['soma'] += duracao
+        for i, limite in enumerate(SPAN_BUCKETS):
+            if duracao <= limite:
+                metrica['faixas'][i] += 1
+
+
+def record_payload(nome: str, tamanho_bytes: int):
+    """
+    Registra o tamanho (em bytes) de uma figura enviada ao navegador.
+    """
+    rerun = _rerun_atual()
+    if rerun is not None:
+        rerun['payloads'][nome] = tamanho_bytes
+    with _lock:
+        _metricas['payloads'][nome] = tamanho_bytes
+
+
+def finish_rerun():
+    """
+    Fecha o rerun atual: grava uma linha JSON no logger, atualiza o arquivo do Prometheus (se configurado)
+    e retorna o resumo do rerun (duração total, spans e payloads), ou None se não houver rerun ativo.
+    """
+    rerun = _rerun_atual()
+    if rerun is None:
+        return None
+    _local.rerun = None
+    resumo = {
+        'ms': (time.perf_counter() - rerun['inicio']) * 1000,
+        'spans': [s for s in rerun['spans'] if s['ms'] is not None],
+        'payloads': rerun['payloads'],
+    }
+    with _lock:
+        _metricas['reruns'] += 1
+        _metricas['rerun_segundos'] += resumo['ms'] / 1000
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({'evento': 'rerun', **resumo}, ensure_ascii=False))
+    write_configured_metrics()
+    return resumo
+
+
+def drain_metrics():
+    """
+    Retorna as métricas acumuladas do processo e zera o acumulador. Usado pelos processos de um pool para repassar
+    as suas métricas ao processo pai (ver merge_metrics), que é o único a gravar o arquivo do Prometheus.
+    """
+    with _lock:
+        metricas = dict(_metricas)
+        _metricas.update(spans={}, payloads={}, reruns=0, rerun_segundos=0.0)
+    return metricas
+
+
+def merge_metrics(metricas: dict):
+    """
+    Soma às métricas do processo as métricas de outro processo (ver drain_metrics).
+    """
+    with _lock:
+        for nome, metrica in metricas['spans'].items():
+            atual = _metricas['spans'].setdefault(nome, {'quantidade': 0, 'soma': 0.0, 'faixas': [0] * len(SPAN_BUCKETS)})
+            atual['quantidade'] += metrica['quantidade']
+            atual['soma'] += metrica['soma']
+            atual['faixas'] = [a + b for a, b in zip(atual['faixas'], metrica['faixas'])]
+        _metricas['payloads'].update(metricas['payloads'])
+        _metricas['reruns'] += metricas['reruns']
+        _metricas['rerun_segundos'] += metricas['rerun_segundos']
+
+
+def write_configured_metrics():
+    """
+    Grava as métricas no arquivo de DASH_METRICS_FILE, se definido.
+    """
+    caminho_metricas = os.environ.get(METRICS_FILE_ENV)
+    if caminho_metricas:
+        write_prometheus(caminho_metricas)
+
+
+def prometheus_text():
+    """
+    Métricas acumuladas do processo no formato texto do Prometheus.
+    """
+    with _lock:
+        linhas = [
+            "# HELP dashboard_span_seconds Duração dos trechos instrumentados do dashboard.",
+            "# TYPE dashboard_span_seconds histogram",
+        ]
+        for nome, metrica in sorted(_metricas['spans'].items()):
+            for limite, quantidade in zip(SPAN_BUCKETS, metrica['faixas']):
+                linhas.append(f'dashboard_span_seconds_bucket{{span="{nome}",le="{limite}"}} {quantidade}')
+            linhas.append(f'dashboard_span_seconds_bucket{{span="{nome}",le="+Inf"}} {metrica["quantidade"]}')
+            linhas.append(f'dashboard_span_seconds_sum{{span="{nome}"}} {metrica["soma"]:.6f}')
+            linhas.append(f'dashboard_span_seconds_count{{span="{nome}"}} {metrica["quantidade"]}')
+        linhas += [
+            "# HELP dashboard_figure_payload_bytes Tamanho da última figura enviada ao navegador.",
+            "# TYPE dashboard_figure_payload_bytes gauge",
+        ]
+        linhas += [f'dashboard_figure_payload_bytes{{figura="{nome}"}} {tamanho}' for nome, tamanho in sorted(_metricas['payloads'].items())]
+        linhas += [
+            "# HELP dashboard_rerun_seconds Duração total dos reruns do script.",
+            "# TYPE dashboard_rerun_seconds summary",
+            f"dashboard_rerun_seconds_sum {_metricas['rerun_segundos']:.6f}",
+            f"dashboard_rerun_seconds_count {_metricas['reruns']}",
+        ]
+    return "\n".join(linhas) + "\n"
+
+
+def write_prometheus(caminho: str):
+    """
+    Grava as métricas de forma atômica (arquivo temporário + os.replace), como espera o textfile collector.
+    """
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(prometheus_text())
+    os.replace(caminho_tmp, caminho)
+
+
+def render_panel(resumo: dict):
+    """
+    Painel de depuração na barra lateral com a quebra de tempo do rerun e o tamanho das figuras.
+    O streamlit só é importado aqui, então o módulo pode ser usado fora do app (ex.: benchmarks).
+    """
+    import streamlit as st
+
+    if resumo is None:
+        return
+    with st.sidebar.expander("Desempenho do rerun", expanded=True):
+        st.caption(f"Total: {resumo['ms']:.0f} ms")
+        st.dataframe(
+            [{'Trecho': " " * s['profundidade'] + s['nome'], 'ms': round(s['ms'], 1)} for s in resumo['spans']],
+            hide_index=True,
+            use_container_width=True,
+        )
+        if resumo['payloads']:
+            st.dataframe(
+                [{'Figura': nome, 'KB': round(tamanho / 1024, 1)} for nome, tamanho in resumo['payloads'].items()],
+                hide_index=True,
+                use_container_width=True,
+            )
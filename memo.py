@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+FIGURE_CACHE_SIZE = 256 # Figuras (dict) são pequenas: cabem muitas
+
+
+class LRUCache:
+    """
+    Cache com limite de itens e descarte do item usado há mais tempo (LRU), seguro para várias threads
+    (cada sessão do Streamlit roda em uma thread). Conta acertos (hits), faltas (misses) e descartes.
+    Uma chave é calculada por uma thread de cada vez: quem pede a mesma chave durante o cálculo espera o resultado
+    (ex.: gráficos calculados em paralelo que dependem do mesmo filtro do cubo).
+    """
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self.hits = 0
+        self.misses = 0
+        self.descartes = 0
+        self._itens = OrderedDict()
+        self._em_calculo = {} # chave -> threading.Event sinalizado quando o cálculo termina
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, chave, calcular):
+        """
+        Retorna o valor guardado para 'chave' ou calcula com calcular() e guarda o resultado.
+        """
+        while True:
+            with self._lock:
+                if chave in self._itens:
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    return self._itens[chave]
+                pronto = self._em_calculo.get(chave)
+                if pronto is None:
+                    self.misses += 1
+                    pronto = self._em_calculo[chave] = threading.Event()
+                    break
+            pronto.wait() # Outra thread está calculando a chave; se ela falhar, tenta de novo
+
+        try:
+            valor = calcular() # Fora do lock: um cálculo lento não bloqueia as outras sessões
+            with self._lock:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+                    self.descartes += 1
+        finally:
+            with self._lock:
+                del self._em_calculo[chave]
+            pronto.set()
+        return valor
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def stats(self):
+        """
+        Retorna um dict com itens, limite, hits, misses, descartes e a taxa de acerto.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'itens': len(self._itens),
+                'limite': self.max_itens,
+                'hits': self.hits,
+                'misses': self.misses,
+                'descartes': self.descartes,
+                'taxa_acerto': self.hits / total if total else 0.0,
+            }
+
+
+def filter_key(cidades_selecionadas, estados_selecionados, anos_selecionados):
+    """
+    Normaliza a seleção da barra lateral em uma tupla (cidades, estados, anos) ordenada, usada como chave de cache:
+    a mesma seleção em outra ordem gera a mesma chave.
+    """
+    return (
+        tuple(sorted(str(cidade) for cidade in cidades_selecionadas or ())),
+        tuple(sorted(str(estado) for estado in estados_selecionados or ())),
+        tuple(sorted(int(ano) for ano in anos_selecionados or ())),
+    )
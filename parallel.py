@@ -0,0 +1,105 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import cube
+import instrumentation
+
+# Camada de execução paralela: gráficos independentes calculados ao mesmo tempo (um pool de threads por processo,
+# compartilhado entre as sessões) e rollups grandes divididos por ano, com as somas parciais juntadas no final.
+# Threads, e não processos: o pandas/numpy liberam o GIL nos laços de agregação e os resultados não precisam
+# ser copiados (pickle) entre processos.
+
+# Com DASH_WORKERS=1 (ou uma única CPU) tudo roda em série, sem pool
+WORKERS_DEFAULT = min(8, os.cpu_count() or 1)
+# Abaixo dessa quantidade de linhas do cubo, o rollup dividido por ano custa mais do que economiza
+PARTITIONED_ROLLUP_MIN_ROWS = 500_000
+PARTITION_COLUMN = 'Year'
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def workers():
+    return int(os.environ.get("DASH_WORKERS", WORKERS_DEFAULT))
+
+
+def _pool(nome):
+    """
+    Pool de threads 'nome', criado na primeira chamada. Os gráficos e as partições usam pools separados: uma tarefa
+    de gráfico que espera as suas partições nunca ocupa a vaga de que elas precisam (sem deadlock).
+    """
+    with _lock:
+        if nome not in _pools:
+            _pools[nome] = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix=f"dash-{nome}")
+        return _pools[nome]
+
+
+def _with_context(funcao, contexto):
+    """
+    Executa funcao() em uma thread do pool com o rerun de quem a chamou (spans entram no mesmo painel).
+    """
+    def executar():
+        with instrumentation.attach(contexto):
+            return funcao()
+    return executar
+
+
+def run_all(tarefas: dict):
+    """
+    Executa as funções de 'tarefas' ({nome: função sem argumentos}) ao mesmo tempo no pool de gráficos.
+    Retorna {nome: resultado} na mesma ordem; a exceção de uma tarefa é repassada a quem chamou.
+    """
+    if len(tarefas) <= 1 or workers() <= 1:
+        return {nome: funcao() for nome, funcao in tarefas.items()}
+    contexto = instrumentation.current_context()
+    futuros = {nome: _pool('graficos').submit(_with_context(funcao, contexto)) for nome, funcao in tarefas.items()}
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
+
+
+def _partitions(cubo: pd.DataFrame, quantidade: int):
+    """
+    Divide as linhas do cubo em até 'quantidade' fatias contíguas (sem cópia). Com o cubo ordenado por ano
+    (ver cube.build_cube), os cortes caem nas trocas de ano: cada fatia tem anos inteiros.
+    """
+    alvos = np.linspace(0, len(cubo), quantidade + 1)[1:-1].astype(np.int64)
+    anos = cubo[PARTITION_COLUMN].to_numpy()
+    if len(anos) and (np.diff(anos) >= 0).all():
+        trocas = np.flatnonzero(np.diff(anos)) + 1 # Primeira linha de cada ano
+        if len(trocas) == 0:
+            return [cubo]
+        alvos = trocas[np.clip(np.searchsorted(trocas, alvos), 0, len(trocas) - 1)]
+    cortes = np.unique(np.concatenate(([0], alvos, [len(cubo)])))
+    return [cubo.iloc[inicio:fim] for inicio, fim in zip(cortes[:-1], cortes[1:])]
+
+
+def rollup(cubo: pd.DataFrame, por, medidas='US$ FOB', ordenar: bool = False,
+           min_linhas: int = PARTITIONED_ROLLUP_MIN_ROWS):
+    """
+    Mesmo resultado de cube.rollup, mas com cubos grandes (min_linhas ou mais) agregados por partição de ano
+    em paralelo: cada thread soma as linhas de alguns anos e as somas parciais são juntadas com um groupby final.
+    """
+    if len(cubo) < min_linhas or workers() <= 1 or PARTITION_COLUMN not in cubo.columns:
+        return cube.rollup(cubo, por, medidas, ordenar)
+
+    particoes = _partitions(cubo, workers())
+    if len(particoes) < 2:
+        return cube.rollup(cubo, por, medidas, ordenar)
+    chaves = [por] if isinstance(por, str) else list(por)
+
+    def parcial(particao):
+        return particao.groupby(chaves, observed=True)[medidas].sum()
+
+    contexto = instrumentation.current_context()
+    with instrumentation.span('rollup_particionado'):
+        futuros = [_pool('particoes').submit(_with_context(lambda p=p: parcial(p), contexto)) for p in particoes]
+        parciais = [futuro.result() for futuro in futuros]
+        resultado = pd.concat(parciais).groupby(level=list(range(len(chaves))), observed=True).sum()
+    if ordenar:
+        if isinstance(resultado, pd.Series):
+            resultado = resultado.sort_values(ascending=False)
+        else:
+            resultado = resultado.sort_values(medidas[0], ascending=False)
+    return resultado.reset_index()
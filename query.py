@@ -0,0 +1,315 @@
+import threading
+
+import cube
+import data_loader as dl
+import data_processor as data_proc
+import downsampling
+import instrumentation
+import memo
+import parallel
+import stats
+import timeseries
+
+# Camada de consultas sem Streamlit: filtros da barra lateral entram, DataFrames agregados saem.
+# Usada pelo app.py (que só monta os gráficos) e pelo server.py (endpoint HTTP/JSON).
+# 'filtros' é sempre a tupla (cidades, estados, anos) da barra lateral; listas vazias não filtram.
+
+RESULT_CACHE_SIZE = 128 # Resultados (filtros e agregações) guardados por fonte de dados
+ROWS_CACHE_SIZE = 4 # Linhas filtradas guardadas por fonte, à parte: cada item tem o tamanho da seleção
+SKETCH_COLUMNS = ('US$ FOB', 'Net Weight') # Colunas do resumo, histograma e boxplot aproximados
+
+
+class DataSource:
+    """
+    Fonte de dados carregada uma vez por processo: o dataset tratado e, sob demanda, o cubo, o índice dos filtros,
+    as tabelas de sketches/momentos e as listas de opções. Os resultados das consultas ficam em um cache LRU
+    indexado pela seleção normalizada (ver memo.filter_key), e as linhas filtradas em outro, bem menor.
+    Pode ser usada por várias threads ao mesmo tempo.
+    """
+
+    def __init__(self, caminho_arquivo, compartilhado: bool = False, max_resultados: int = RESULT_CACHE_SIZE,
+                 max_linhas: int = ROWS_CACHE_SIZE):
+        self.caminho_arquivo = caminho_arquivo
+        self.compartilhado = compartilhado
+        self.versao = dl.dataset_version(caminho_arquivo)
+        self.dataset = dl.load_shared_dataset(caminho_arquivo) if compartilhado else dl.load_dataset(caminho_arquivo)
+        self.resultados = memo.LRUCache(max_resultados)
+        self.linhas = memo.LRUCache(max_linhas)
+        self._derivados = {}
+        self._lock = threading.Lock()
+
+    def _derivado(self, chave, construir):
+        """
+        Estrutura derivada do dataset, construída uma única vez (mesmo com várias threads pedindo ao mesmo tempo).
+        """
+        with self._lock:
+            if chave not in self._derivados:
+                self._derivados[chave] = construir()
+            return self._derivados[chave]
+
+    @property
+    def cubo(self):
+        if self.compartilhado:
+            return self._derivado('cubo', lambda: dl.load_shared_cube(self.caminho_arquivo, self.dataset))
+        return self._derivado('cubo', lambda: dl.load_cube(self.caminho_arquivo, self.dataset))
+
+    @property
+    def indice(self):
+        return self._derivado('indice', lambda: data_proc.build_filter_index(self.dataset))
+
+    def sketch_table(self, coluna):
+        return self._derivado(('sketch', coluna), lambda: stats.build_sketch_table(self.dataset, coluna))
+
+    def moments_table(self, coluna):
+        return self._derivado(('momentos', coluna), lambda: stats.build_moments_table(self.dataset, coluna))
+
+    def options(self, col):
+        return self._derivado(('opcoes', col), lambda: dl.load_options(self.caminho_arquivo, col, self.dataset))
+
+    def rows(self, filtros):
+        """
+        Linhas do dataset que atendem aos filtros (pelo índice invertido).
+        """
+        return data_proc.columns_selected_by_options(self.dataset, *filtros, indice=self.indice)
+
+    def count(self, filtros):
+        """
+        Quantidade de linhas que atendem aos filtros, pelas posições do índice (sem extrair nem guardar as linhas).
+        """
+        posicoes = data_proc.selected_positions(self.indice, *filtros)
+        return len(self.dataset) if posicoes is None else len(posicoes)
+
+    def describe(self, filtros):
+        """
+        Resumo estatístico exato (formato do describe(), ver stats.summary_stats) das colunas numéricas das linhas filtradas.
+        """
+        return stats.summary_stats(filtered_rows(self, filtros))
+
+    def histogram_bins(self, filtros, coluna):
+        """
+        (contagens, bordas) do histograma exato de 'coluna' nas linhas filtradas (ver stats.histogram_bins).
+        """
+        return stats.histogram_bins(filtered_rows(self, filtros)[coluna])
+
+    def box_stats(self, filtros, coluna):
+        """
+        Estatísticas exatas do boxplot de 'coluna' nas linhas filtradas (ver stats.box_stats), ou None sem dados.
+        """
+        return stats.box_stats(filtered_rows(self, filtros)[coluna])
+
+    def rollup(self, filtros, por, medidas='US$ FOB'):
+        """
+        Rollup do cubo filtrado (ver cube.rollup), dividido por ano em paralelo nos cubos grandes (ver parallel.rollup).
+        """
+        return parallel.rollup(filtered_cube(self, filtros), por, medidas)
+
+    def monthly_totals(self):
+        """
+        US$ FOB por mês, cidade/UF e produto SH4 (ver timeseries.MONTHLY_KEYS), base das séries temporais.
+        """
+        return self.dataset.groupby(list(timeseries.MONTHLY_KEYS), observed=True)[timeseries.MEASURE].sum().reset_index()
+
+    @property
+    def series_index(self):
+        return self._derivado('series', lambda: timeseries.TimeSeriesIndex(self.monthly_totals()))
+
+    def is_stale(self):
+        """
+        True se a fonte mudou no disco depois da carga (ex.: um append no repositório particionado).
+        """
+        return dl.dataset_version(self.caminho_arquivo) != self.versao
+
+    def cached(self, filtros, nome, calcular, *parametros, cache: memo.LRUCache = None):
+        """
+        Resultado memorizado de calcular() para a seleção 'filtros', a consulta 'nome' e seus parâmetros,
+        no cache de resultados (ou em 'cache', ex.: o de linhas filtradas).
+        """
+        def medido():
+            with instrumentation.span(f"query.{nome}"):
+                return calcular()
+        return (cache or self.resultados).get_or_compute(memo.filter_key(*filtros) + (nome,) + parametros, medido)
+
+    def clear(self):
+        """
+        Esvazia os caches de resultados e de linhas filtradas.
+        """
+        self.resultados.clear()
+        self.linhas.clear()
+
+
+def open_source(caminho_arquivo, motor: str = None, compartilhado: bool = False):
+    """
+    Fonte de dados das consultas: o dataset em memória (DataSource) ou, com motor 'duckdb', 'sqlite' ou 'auto',
+    um banco SQL embarcado em que os filtros e as agregações rodam no banco (ver sql_backend.SQLSource).
+    """
+    if not motor:
+        return DataSource(caminho_arquivo, compartilhado)
+    import sql_backend # Só carregado quando um motor SQL é pedido
+    return sql_backend.SQLSource(caminho_arquivo, motor)
+
+
+def filtered_rows(fonte: DataSource, filtros):
+    """
+    Linhas do dataset que atendem aos filtros (com um motor SQL, só as colunas numéricas).
+    """
+    return fonte.cached(filtros, 'linhas', lambda: fonte.rows(filtros), cache=fonte.linhas)
+
+
+def row_count(fonte: DataSource, filtros):
+    """
+    Quantidade de linhas que atendem aos filtros.
+    """
+    return fonte.cached(filtros, 'contagem', lambda: fonte.count(filtros))
+
+
+def filtered_cube(fonte: DataSource, filtros):
+    """
+    Linhas do cubo pré-agregado que atendem aos filtros.
+    """
+    return fonte.cached(filtros, 'cubo', lambda: cube.filter_cube(fonte.cubo, *filtros))
+
+
+def yearly_totals(fonte: DataSource, filtros):
+    """
+    Total de US$ FOB por ano, com 'Year' como coluna.
+    """
+    return fonte.cached(filtros, 'anual', lambda: fonte.rollup(filtros, 'Year'))
+
+
+def state_ranking(fonte: DataSource, filtros, n: int = data_proc.TOP_N_DEFAULT):
+    """
+    Total de US$ FOB por estado, com os top n e o restante somado em 'Outros'.
+    """
+    return fonte.cached(filtros, 'estados', lambda: data_proc.top_n_with_others(
+        fonte.rollup(filtros, 'State'), 'State', n=n), n)
+
+
+def city_ranking(fonte: DataSource, filtros, n: int = data_proc.TOP_N_DEFAULT):
+    """
+    Total de US$ FOB por cidade, com as top n e o restante somado em 'Outros'.
+    """
+    return fonte.cached(filtros, 'cidades', lambda: data_proc.top_n_with_others(
+        fonte.rollup(filtros, 'City'), 'City', n=n), n)
+
+
+def city_sh2_matrix(fonte: DataSource, filtros, n: int = data_proc.TOP_N_DEFAULT):
+    """
+    Matriz Cidade x Descrição SH2 (formato longo) limitada às top n cidades e top n descrições (demais em 'Outros').
+    """
+    return fonte.cached(filtros, 'matriz', lambda: data_proc.top_n_grid(
+        fonte.rollup(filtros, ['City', 'SH2 Description']), 'City', 'SH2 Description', n_x=n, n_y=n), n)
+
+
+def scatter_totals(fonte: DataSource, filtros):
+    """
+    US$ FOB e Net Weight por cidade/estado/produto SH4: os pontos do gráfico de dispersão.
+    """
+    return fonte.cached(filtros, 'dispersao', lambda: fonte.rollup(
+        filtros, ['City', 'State', 'SH4 Description'], ['US$ FOB', 'Net Weight']))
+
+
+def scatter_points(fonte: DataSource, filtros, orcamento: int = downsampling.POINT_BUDGET_DEFAULT):
+    """
+    Amostra (no máximo 'orcamento' pontos, preservando extremos) dos pontos da dispersão.
+    Retorna (pontos, total de pontos antes da amostragem). Os dois contam só os pontos com valor e peso positivos,
+    os únicos que aparecem nos eixos log.
+    """
+    totais = scatter_totals(fonte, filtros)
+    pontos = fonte.cached(filtros, 'dispersao_amostra', lambda: downsampling.sample_preserving_extremes(
+        totais, 'Net Weight', 'US$ FOB', orcamento), orcamento)
+    return pontos, downsampling.plotted_count(totais, 'Net Weight', 'US$ FOB')
+
+
+def scatter_density(fonte: DataSource, filtros, bins: int = downsampling.DENSITY_BINS_DEFAULT):
+    """
+    Grade de densidade (escala log) dos pontos da dispersão.
+    """
+    return fonte.cached(filtros, 'dispersao_densidade', lambda: downsampling.log_density_grid(
+        scatter_totals(fonte, filtros), 'Net Weight', 'US$ FOB', bins), bins)
+
+
+def sh4_ranking(fonte: DataSource, filtros):
+    """
+    Total de US$ FOB por produto SH4, em ordem decrescente de valor. Uma única entrada de cache por seleção:
+    o slider da tabela (de 0 até o tamanho do ranking) só fatia esse resultado (ver top_sh4).
+    """
+    def calcular():
+        ranking = fonte.rollup(filtros, 'SH4 Description')
+        return ranking.sort_values('US$ FOB', ascending=False, ignore_index=True)
+    return fonte.cached(filtros, 'sh4', calcular)
+
+
+def top_sh4(fonte: DataSource, filtros, k: int):
+    """
+    Os k produtos SH4 com maior US$ FOB, em ordem decrescente (valores numéricos, sem formatação).
+    """
+    return sh4_ranking(fonte, filtros).head(k)
+
+
+def _approximable(filtros):
+    """
+    As tabelas de sketches/momentos são particionadas por stats.SKETCH_KEYS (estado e ano): um filtro de cidade
+    não é respondido por elas, e aí o cálculo é exato (uma seleção de cidades tem poucas linhas).
+    """
+    cidades, _, _ = filtros
+    return not cidades
+
+
+def _sketch(fonte: DataSource, filtros, coluna):
+    return fonte.cached(filtros, 'sketch', lambda: stats.sketch_from_table(
+        data_proc.columns_selected_by_options(fonte.sketch_table(coluna), *filtros)), coluna)
+
+
+def summary(fonte: DataSource, filtros, aproximado: bool = False):
+    """
+    Resumo estatístico (formato do describe()) das linhas filtradas. Com aproximado=True (e sem filtro de cidade),
+    o resumo de US$ FOB e Net Weight sai só das partições: contagem, média, desvio, mínimo e máximo dos momentos
+    (exatos) e quartis dos sketches (ver stats.LogSketch), sem ler as linhas.
+    """
+    def calcular():
+        if aproximado and _approximable(filtros):
+            momentos = {col: data_proc.columns_selected_by_options(fonte.moments_table(col), *filtros) for col in SKETCH_COLUMNS}
+            return stats.summary_from_sketches(momentos, {col: _sketch(fonte, filtros, col) for col in SKETCH_COLUMNS})
+        return fonte.describe(filtros)
+    return fonte.cached(filtros, 'resumo', calcular, aproximado)
+
+
+def histogram(fonte: DataSource, filtros, aproximado: bool = False):
+    """
+    Histograma de US$ FOB calculado no servidor. Retorna um dict com 'contagens', 'bordas', 'media' e 'mediana'.
+    Com aproximado=True, as contagens saem do sketch (cada faixa contada no seu valor representante).
+    """
+    def calcular():
+        resumo = summary(fonte, filtros, aproximado)
+        if aproximado and _approximable(filtros):
+            contagens, bordas = _sketch(fonte, filtros, 'US$ FOB').histogram_bins(resumo.at['min', 'US$ FOB'], resumo.at['max', 'US$ FOB'])
+        else:
+            contagens, bordas = fonte.histogram_bins(filtros, 'US$ FOB')
+        return {'contagens': contagens, 'bordas': bordas,
+                'media': resumo.at['mean', 'US$ FOB'], 'mediana': resumo.at['50%', 'US$ FOB']}
+    return fonte.cached(filtros, 'histograma', calcular, aproximado)
+
+
+def box(fonte: DataSource, filtros, aproximado: bool = False):
+    """
+    Estatísticas do boxplot de Net Weight (ver stats.box_stats), ou None se não houver dados.
+    Com aproximado=True, saem do sketch (ver stats.LogSketch.box_stats).
+    """
+    def calcular():
+        if aproximado and _approximable(filtros):
+            return _sketch(fonte, filtros, 'Net Weight').box_stats()
+        return fonte.box_stats(filtros, 'Net Weight')
+    return fonte.cached(filtros, 'boxplot', calcular, aproximado)
+
+
+def time_series(fonte: DataSource, filtros, dimensao: str = 'State', metrica: str = timeseries.METRICS[0],
+                granularidade: str = timeseries.GRANULARITIES[0], n: int = timeseries.SERIES_N_DEFAULT):
+    """
+    Série temporal (mensal ou anual) de 'metrica' para os n maiores membros de 'dimensao' (ver timeseries.TimeSeriesIndex).
+    Os filtros de cidade/estado restringem as linhas; o de ano, só os períodos exibidos.
+    """
+    if dimensao not in timeseries.DIMENSIONS or metrica not in timeseries.METRICS or granularidade not in timeseries.GRANULARITIES:
+        raise ValueError(f"Série inválida: {dimensao}, {metrica}, {granularidade}")
+    cidades, estados, anos = memo.filter_key(*filtros)
+    return fonte.cached(filtros, 'serie', lambda: fonte.series_index.series(
+        dimensao, cidades, estados, anos, metrica, granularidade, n), dimensao, metrica, granularidade, n)
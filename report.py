@@ -0,0 +1,251 @@
+"""
+Exportação do relatório estático: pré-calcula, em lote e em vários processos, as figuras (JSON do Plotly, como
+heatmap_cidade_itens_por_valor_refactored.json) e as tabelas de ranking/resumo das seleções mais vistas
+(Brasil inteiro, cada estado, cada ano, cada estado × ano). O app.py serve esses arquivos direto quando a seleção
+da barra lateral coincide com uma seleção exportada, em vez de recalcular.
+
+Uso: python report.py [--fonte data/exportacoes_franca.csv] [--saida data/relatorio] [--combinacoes nacional estados anos estado_ano]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+import data_processor as data_proc
+import downsampling
+import figures
+import instrumentation
+import memo
+import query
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR_DEFAULT = os.path.join("data", "relatorio")
+MANIFEST_FILE = "manifesto.json"
+COMBINATIONS = ('nacional', 'estados', 'anos', 'estado_ano')
+FILTER_OPTION_COLUMNS = ('City_State', 'State', 'Year') # Mesma ordem da tupla de filtros (cidades, estados, anos)
+
+_fonte = None # Fonte de dados de cada processo do pool (herdada do processo pai com fork)
+
+
+def canonical_filters(filtros, opcoes: dict):
+    """
+    Chave normalizada da seleção (ver memo.filter_key) em que selecionar todas as opções de um filtro equivale a
+    não filtrar por ele (ex.: a barra lateral começa com todos os anos selecionados).
+    'opcoes' é {coluna: opções} para as colunas de FILTER_OPTION_COLUMNS (ver filter_options).
+    """
+    chave = memo.filter_key(*filtros)
+    todas = memo.filter_key(*(opcoes[col] for col in FILTER_OPTION_COLUMNS))
+    return tuple(() if selecao and set(selecao) >= set(completa) else selecao for selecao, completa in zip(chave, todas))
+
+
+def filter_options(fonte: query.DataSource):
+    return {col: fonte.options(col) for col in FILTER_OPTION_COLUMNS}
+
+
+def selection_id(chave):
+    """
+    Nome da pasta de uma seleção: hash curto da chave normalizada.
+    """
+    return hashlib.blake2b(json.dumps(chave, ensure_ascii=False).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def artifact_name(nome, *parametros):
+    """
+    Nome do arquivo de uma figura: o nome usado no app.py mais os parâmetros do gráfico (ex.: 'estado-30').
+    """
+    partes = [nome] + [str(p).replace(' ', '_').lower() for p in parametros]
+    return "-".join(partes)
+
+
+def selections(fonte: query.DataSource, combinacoes=COMBINATIONS):
+    """
+    Lista de filtros (cidades, estados, anos) das combinações pedidas.
+    """
+    estados = list(fonte.options('State'))
+    anos = [int(ano) for ano in fonte.options('Year')]
+    filtros = []
+    if 'nacional' in combinacoes:
+        filtros.append(([], [], []))
+    if 'estados' in combinacoes:
+        filtros += [([], [estado], []) for estado in estados]
+    if 'anos' in combinacoes:
+        filtros += [([], [], [ano]) for ano in anos]
+    if 'estado_ano' in combinacoes:
+        filtros += [([], [estado], [ano]) for estado in estados for ano in anos]
+    return filtros
+
+
+def _write_atomic(caminho, escrever):
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+    escrever(caminho_tmp)
+    os.replace(caminho_tmp, caminho)
+
+
+def _write_text(caminho, texto):
+    def escrever(caminho_tmp):
+        with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+    _write_atomic(caminho, escrever)
+
+
+def render_selection(fonte: query.DataSource, filtros, pasta, top_n: int = data_proc.TOP_N_DEFAULT):
+    """
+    Calcula e grava as figuras e tabelas de uma seleção em pasta/<id da seleção>/.
+    Retorna (id da seleção, entrada do manifesto). Figuras sem dados não são gravadas.
+    """
+    chave = canonical_filters(filtros, filter_options(fonte))
+    pasta_selecao = os.path.join(pasta, selection_id(chave))
+    os.makedirs(pasta_selecao, exist_ok=True)
+
+    construtores = {
+        artifact_name('ano'): lambda: figures.year_chart(fonte, filtros),
+        artifact_name('estado', top_n): lambda: figures.state_chart(fonte, filtros, top_n),
+        artifact_name('cidade', top_n): lambda: figures.city_chart(fonte, filtros, top_n),
+        artifact_name('heatmap', top_n): lambda: figures.heatmap(fonte, filtros, top_n),
+        artifact_name('dispersao', figures.SCATTER_MODES[0], downsampling.POINT_BUDGET_DEFAULT):
+            lambda: figures.scatter_chart(fonte, filtros, figures.SCATTER_MODES[0], downsampling.POINT_BUDGET_DEFAULT),
+        artifact_name('histograma', False): lambda: figures.histogram(fonte, filtros),
+        artifact_name('boxplot', False): lambda: figures.boxplot(fonte, filtros),
+    }
+    gravadas = []
+    if query.row_count(fonte, filtros) > 0:
+        for nome, construir in construtores.items():
+            fig = construir()
+            if fig is not None:
+                _write_text(os.path.join(pasta_selecao, f"{nome}.json"), fig.to_json())
+                gravadas.append(nome)
+
+    tabelas = {
+        'sh4': query.sh4_ranking(fonte, filtros), # Ranking completo já em ordem decrescente
+        'resumo': query.summary(fonte, filtros),
+    }
+    for nome, tabela in tabelas.items():
+        _write_atomic(os.path.join(pasta_selecao, f"{nome}.parquet"), tabela.to_parquet)
+
+    # Libera os resultados desta seleção: cada seleção é calculada uma única vez
+    fonte.clear()
+    return selection_id(chave), {'filtros': [list(parte) for parte in chave], 'figuras': gravadas, 'tabelas': sorted(tabelas)}
+
+
+def _start_worker(caminho_fonte, compartilhado):
+    global _fonte
+    instrumentation.drain_metrics() # Descarta as métricas herdadas do processo pai (fork): elas já estão no pai
+    if _fonte is None: # Com 'spawn'/'forkserver' o processo não herda a fonte do pai
+        _fonte = query.DataSource(caminho_fonte, compartilhado)
+
+
+def _render_worker(argumentos):
+    filtros, pasta, top_n = argumentos
+    return render_selection(_fonte, filtros, pasta, top_n) + (instrumentation.drain_metrics(),)
+
+
+def export_report(caminho_fonte, pasta=REPORT_DIR_DEFAULT, combinacoes=COMBINATIONS, top_n: int = data_proc.TOP_N_DEFAULT,
+                  processos: int = None, compartilhado: bool = False):
+    """
+    Exporta o relatório das combinações pedidas usando um pool de processos (ProcessPoolExecutor) e grava o
+    manifesto por último, então o app só passa a usar o relatório quando ele está completo. Retorna o manifesto.
+    As métricas de cada processo voltam junto com as seleções e o arquivo do Prometheus (DASH_METRICS_FILE) é gravado
+    só pelo processo pai, depois do pool, com a soma de todos.
+    """
+    global _fonte
+    _fonte = query.DataSource(caminho_fonte, compartilhado) # Carrega (e grava o cache Parquet/Arrow) uma vez, antes do pool
+    lista = selections(_fonte, combinacoes)
+    os.makedirs(pasta, exist_ok=True)
+
+    itens = {}
+    with ProcessPoolExecutor(max_workers=processos, initializer=_start_worker, initargs=(caminho_fonte, compartilhado)) as pool:
+        tarefas = [(filtros, pasta, top_n) for filtros in lista]
+        for id_selecao, entrada, metricas in pool.map(_render_worker, tarefas, chunksize=max(1, len(tarefas) // (4 * (processos or os.cpu_count() or 1)))):
+            itens[id_selecao] = entrada
+            instrumentation.merge_metrics(metricas)
+    instrumentation.write_configured_metrics()
+
+    manifesto = {
+        'fonte': caminho_fonte,
+        'versao': _fonte.versao,
+        'top_n': top_n,
+        'combinacoes': list(combinacoes),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'selecoes': itens,
+    }
+    _write_text(os.path.join(pasta, MANIFEST_FILE), json.dumps(manifesto, ensure_ascii=False, indent=2))
+    return manifesto
+
+
+def load_manifest(pasta, versao):
+    """
+    Manifesto do relatório exportado, ou None se não existir ou se foi gerado para outra versão dos dados.
+    """
+    caminho = os.path.join(pasta, MANIFEST_FILE)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        manifesto = json.load(arquivo)
+    if manifesto.get('versao') != versao:
+        logger.info("Relatório em '%s' é de outra versão dos dados; ignorado", pasta)
+        return None
+    return manifesto
+
+
+def selection_entry(manifesto, chave):
+    """
+    Entrada do manifesto da seleção 'chave' (ver canonical_filters), ou None se ela não foi exportada.
+    """
+    if manifesto is None:
+        return None
+    return manifesto['selecoes'].get(selection_id(chave))
+
+
+def load_figure(pasta, manifesto, chave, nome, *parametros):
+    """
+    Figura exportada (dict do Plotly) da seleção 'chave' (ver canonical_filters) e seu tamanho em bytes,
+    ou None se o relatório não tiver essa figura.
+    """
+    arquivo = artifact_name(nome, *parametros)
+    if arquivo not in (selection_entry(manifesto, chave) or {}).get('figuras', ()):
+        return None
+    with open(os.path.join(pasta, selection_id(chave), f"{arquivo}.json"), encoding='utf-8') as entrada:
+        texto = entrada.read()
+    return json.loads(texto), len(texto)
+
+
+@lru_cache(maxsize=256)
+def _read_table(caminho, mtime):
+    return pd.read_parquet(caminho)
+
+
+def load_table(pasta, manifesto, chave, nome):
+    """
+    Tabela exportada ('sh4' ou 'resumo') da seleção 'chave', ou None se o relatório não tiver essa tabela.
+    Fica em memória (LRU) enquanto o arquivo não mudar.
+    """
+    if nome not in (selection_entry(manifesto, chave) or {}).get('tabelas', ()):
+        return None
+    caminho = os.path.join(pasta, selection_id(chave), f"{nome}.parquet")
+    return _read_table(caminho, os.path.getmtime(caminho))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta figuras e tabelas pré-calculadas das seleções mais vistas.")
+    parser.add_argument('--fonte', default="data/store" if os.path.isdir("data/store") else "data/exportacoes_franca.csv",
+                        help="CSV ou pasta do repositório particionado")
+    parser.add_argument('--saida', default=REPORT_DIR_DEFAULT)
+    parser.add_argument('--combinacoes', nargs='+', choices=COMBINATIONS, default=list(COMBINATIONS))
+    parser.add_argument('--top-n', type=int, default=data_proc.TOP_N_DEFAULT)
+    parser.add_argument('--processos', type=int, default=None, help="Processos do pool (padrão: um por CPU)")
+    parser.add_argument('--compartilhado', action='store_true', help="Mapeia o dataset em memória (Arrow) nos processos")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    manifesto = export_report(args.fonte, args.saida, args.combinacoes, args.top_n, args.processos, args.compartilhado)
+    logger.info("%d seleções exportadas em %s", len(manifesto['selecoes']), args.saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Endpoint HTTP/JSON local sobre a camada de consultas (query.py), sem Streamlit: os mesmos agregados do dashboard
+para outros consumidores (scripts, outros painéis, pré-cálculo).
+
+Uso: python server.py [--fonte data/exportacoes_franca.csv] [--porta 8502] [--compartilhado] [--motor duckdb|sqlite|auto]
+
+    GET /api/versao
+    GET /api/opcoes/<City_State|State|Year>
+    GET /api/<consulta>?cidade=Alfenas%20-%20MG&estado=SP&ano=2020&ano=2021&n=30
+        consultas: anual, estados, cidades, matriz, dispersao, densidade, sh4, resumo, histograma, boxplot, serie
+        parâmetros opcionais: n (top N dos rankings), k (itens do ranking SH4), orcamento (pontos da dispersão),
+        aproximado=1 (resumo, histograma e boxplot pelos sketches por estado/ano); na série: dimensao (State, City, SH4 Description), metrica e granularidade
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import data_processor as data_proc
+import downsampling
+import instrumentation
+import query
+import timeseries
+
+logger = logging.getLogger(__name__)
+
+PORT_DEFAULT = 8502
+OPTION_COLUMNS = ('City_State', 'State', 'Year')
+
+# Consulta -> função que recebe (fonte, filtros, parâmetros da URL) e retorna o resultado
+QUERIES = {
+    'anual': lambda fonte, filtros, p: query.yearly_totals(fonte, filtros),
+    'estados': lambda fonte, filtros, p: query.state_ranking(fonte, filtros, _int(p, 'n', data_proc.TOP_N_DEFAULT)),
+    'cidades': lambda fonte, filtros, p: query.city_ranking(fonte, filtros, _int(p, 'n', data_proc.TOP_N_DEFAULT)),
+    'matriz': lambda fonte, filtros, p: query.city_sh2_matrix(fonte, filtros, _int(p, 'n', data_proc.TOP_N_DEFAULT)),
+    'dispersao': lambda fonte, filtros, p: dict(zip(('pontos', 'total'), query.scatter_points(
+        fonte, filtros, _int(p, 'orcamento', downsampling.POINT_BUDGET_DEFAULT)))),
+    'densidade': lambda fonte, filtros, p: query.scatter_density(fonte, filtros),
+    'sh4': lambda fonte, filtros, p: query.top_sh4(fonte, filtros, _int(p, 'k', data_proc.TOP_N_DEFAULT)),
+    'resumo': lambda fonte, filtros, p: query.summary(fonte, filtros, _bool(p, 'aproximado')),
+    'histograma': lambda fonte, filtros, p: query.histogram(fonte, filtros, _bool(p, 'aproximado')),
+    'boxplot': lambda fonte, filtros, p: query.box(fonte, filtros, _bool(p, 'aproximado')),
+    'serie': lambda fonte, filtros, p: query.time_series(
+        fonte, filtros, p.get('dimensao', ['State'])[0], p.get('metrica', [timeseries.METRICS[0]])[0],
+        p.get('granularidade', [timeseries.GRANULARITIES[0]])[0], _int(p, 'n', timeseries.SERIES_N_DEFAULT)),
+}
+
+
+def _int(parametros, nome, padrao):
+    return int(parametros.get(nome, [padrao])[0])
+
+
+def _bool(parametros, nome):
+    return parametros.get(nome, ['0'])[0].lower() in ('1', 'true', 'sim')
+
+
+def to_jsonable(valor):
+    """
+    Converte os resultados das consultas em tipos do JSON: DataFrame -> lista de registros
+    (o resumo, no formato do describe(), vira {coluna: {estatística: valor}}), tipos numpy -> Python, NaN -> null.
+    """
+    if isinstance(valor, pd.DataFrame):
+        orient = 'columns' if valor.index.dtype == object else 'records'
+        return json.loads(valor.to_json(orient=orient, force_ascii=False, date_format='iso'))
+    if isinstance(valor, dict):
+        return {chave: to_jsonable(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [to_jsonable(item) for item in valor]
+    if isinstance(valor, np.ndarray):
+        return to_jsonable(valor.tolist())
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+class SourceHolder:
+    """
+    Mantém a fonte de dados do servidor e a recarrega quando ela muda no disco (ex.: append de um novo mês).
+    """
+
+    def __init__(self, caminho_arquivo, compartilhado=False, motor=None):
+        self.caminho_arquivo = caminho_arquivo
+        self.compartilhado = compartilhado
+        self.motor = motor
+        self._lock = threading.Lock()
+        self._fonte = query.open_source(caminho_arquivo, motor, compartilhado)
+
+    def get(self):
+        if self._fonte.is_stale():
+            with self._lock:
+                if self._fonte.is_stale():
+                    logger.info("Fonte '%s' mudou; recarregando", self.caminho_arquivo)
+                    self._fonte = query.open_source(self.caminho_arquivo, self.motor, self.compartilhado)
+        return self._fonte
+
+
+def make_handler(fontes: SourceHolder):
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            partes = [parte for parte in url.path.split('/') if parte]
+            parametros = parse_qs(url.query)
+            if len(partes) < 2 or partes[0] != 'api':
+                return self._responder(404, {'erro': "Use /api/<consulta>"})
+
+            try:
+                fonte = fontes.get()
+                if partes[1] == 'versao':
+                    return self._responder(200, {'caminho': fonte.caminho_arquivo, 'versao': to_jsonable(fonte.versao)})
+                if partes[1] == 'opcoes' and len(partes) == 3 and partes[2] in OPTION_COLUMNS:
+                    return self._responder(200, to_jsonable(list(fonte.options(partes[2]))))
+                if partes[1] not in QUERIES:
+                    return self._responder(404, {'erro': f"Consulta desconhecida: {partes[1]}", 'consultas': sorted(QUERIES)})
+
+                filtros = (parametros.get('cidade', []), parametros.get('estado', []),
+                           [int(ano) for ano in parametros.get('ano', [])])
+                with instrumentation.span(f"api.{partes[1]}"):
+                    resultado = QUERIES[partes[1]](fonte, filtros, parametros)
+                return self._responder(200, to_jsonable(resultado))
+            except ValueError as e:
+                return self._responder(400, {'erro': str(e)})
+            except Exception as e:
+                logger.exception("Erro na consulta %s", self.path)
+                return self._responder(500, {'erro': str(e)})
+
+        def log_message(self, formato, *args):
+            logger.info("%s - %s", self.address_string(), formato % args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint HTTP/JSON com os agregados do dashboard.")
+    parser.add_argument('--fonte', default="data/store" if os.path.isdir("data/store") else "data/exportacoes_franca.csv",
+                        help="CSV ou pasta do repositório particionado")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=PORT_DEFAULT)
+    parser.add_argument('--compartilhado', action='store_true', help="Mapeia o dataset em memória (Arrow), como DASH_SHARED_DATASET=1")
+    parser.add_argument('--motor', choices=('duckdb', 'sqlite', 'auto'), default=None,
+                        help="Consultas em um banco SQL embarcado (ver sql_backend), como DASH_SQL_ENGINE")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    servidor = ThreadingHTTPServer((args.host, args.porta), make_handler(SourceHolder(args.fonte, args.compartilhado, args.motor)))
+    logger.info("Servindo %s em http://%s:%d/api/", args.fonte, args.host, args.porta)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
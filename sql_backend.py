@@ -0,0 +1,327 @@
+"""
+Backend SQL embarcado para as consultas do dashboard: o dataset tratado é gravado uma vez em um arquivo de banco
+de dados colunar (DuckDB) ou, sem o duckdb instalado, em SQLite (biblioteca padrão), na pasta .cache ao lado da fonte.
+Cada consulta roda como uma agregação SQL com os filtros da barra lateral (City_State, State, Year) no WHERE
+e traz para o Python só o resultado pequeno, então o dataset não precisa caber em memória.
+
+Uso: query.open_source(caminho, motor='duckdb' | 'sqlite' | 'auto'), ou DASH_SQL_ENGINE no app.py e --motor no server.py.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import data_loader as dl
+import data_processor as data_proc
+import instrumentation
+import memo
+import query
+import stats
+import timeseries
+
+try:
+    import duckdb
+except ImportError: # Opcional: sem o duckdb, o motor 'auto' usa o SQLite
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ('duckdb', 'sqlite')
+TABLE = 'exportacoes'
+# Índices do SQLite (o DuckDB varre as colunas em paralelo e usa os min/max de cada bloco, sem índices)
+SQLITE_INDEXES = ('City_State', 'State', 'Year')
+FETCH_CHUNK_ROWS = 500_000 # Linhas trazidas por vez nas leituras grandes (ex.: tabela de sketches)
+
+
+def resolve_engine(motor):
+    """
+    Motor efetivo: 'auto' escolhe o DuckDB se estiver instalado e o SQLite caso contrário.
+    """
+    if motor == 'auto':
+        return 'duckdb' if duckdb is not None else 'sqlite'
+    if motor not in ENGINES:
+        raise ValueError(f"Motor SQL desconhecido: {motor} (use {', '.join(ENGINES)} ou auto)")
+    if motor == 'duckdb' and duckdb is None:
+        raise ImportError("O motor 'duckdb' precisa do pacote duckdb (pip install duckdb)")
+    return motor
+
+
+def _quote(coluna):
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def _plain(bloco: pd.DataFrame):
+    """
+    Categorias viram texto: cada bloco tem as próprias categorias e o banco guarda VARCHAR/TEXT.
+    """
+    return bloco.astype({col: str for col in bloco.columns if isinstance(bloco[col].dtype, pd.CategoricalDtype)})
+
+
+def _gravar_duckdb(caminho_arquivo, caminho_banco):
+    conexao = duckdb.connect(caminho_banco)
+    try:
+        criada = False
+        for bloco in dl.iter_source_chunks(caminho_arquivo):
+            conexao.register('bloco', _plain(bloco))
+            conexao.execute(f"INSERT INTO {TABLE} SELECT * FROM bloco" if criada else f"CREATE TABLE {TABLE} AS SELECT * FROM bloco")
+            conexao.unregister('bloco')
+            criada = True
+    finally:
+        conexao.close()
+
+
+def _gravar_sqlite(caminho_arquivo, caminho_banco):
+    conexao = sqlite3.connect(caminho_banco)
+    try:
+        for bloco in dl.iter_source_chunks(caminho_arquivo):
+            _plain(bloco).to_sql(TABLE, conexao, if_exists='append', index=False)
+        for coluna in SQLITE_INDEXES:
+            conexao.execute(f"CREATE INDEX IF NOT EXISTS idx_{coluna.lower()} ON {TABLE} ({_quote(coluna)})")
+        conexao.commit()
+    finally:
+        conexao.close()
+
+
+@instrumentation.timed('build_database')
+def build_database(caminho_arquivo, motor):
+    """
+    Grava (uma vez por versão da fonte) o dataset tratado no banco do motor, lendo a fonte em blocos.
+    Retorna o caminho do arquivo do banco.
+    """
+    gravar = _gravar_duckdb if motor == 'duckdb' else _gravar_sqlite
+    return dl.derived_cache(caminho_arquivo, motor, lambda caminho_tmp: gravar(caminho_arquivo, caminho_tmp))
+
+
+def where_clause(filtros):
+    """
+    Cláusula WHERE (com parâmetros '?') equivalente a data_processor.columns_selected_by_options.
+    Retorna (texto, parâmetros); sem filtros, o texto é vazio.
+    """
+    condicoes, parametros = [], []
+    for coluna, selecao in zip(data_proc.FILTER_COLUMNS, memo.filter_key(*filtros)):
+        if selecao:
+            condicoes.append(f"{_quote(coluna)} IN ({', '.join('?' * len(selecao))})")
+            parametros += list(selecao)
+    return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+
+def _and(where, condicao):
+    return f"{where} AND {condicao}" if where else f" WHERE {condicao}"
+
+
+def _literal(valor):
+    """
+    Número (já calculado pelo banco) como literal SQL, para as condições e expressões das consultas seguintes.
+    """
+    return repr(float(valor))
+
+
+class SQLSource(query.DataSource):
+    """
+    Fonte de dados das consultas (mesma interface de query.DataSource) apoiada em um banco DuckDB ou SQLite.
+    Nada do dataset fica em memória: rollups, contagens, opções, resumos, histogramas e boxplots são calculados pelo banco.
+    Cada thread (e cada processo) abre a sua conexão somente leitura.
+    """
+
+    def __init__(self, caminho_arquivo, motor: str = 'auto', max_resultados: int = query.RESULT_CACHE_SIZE,
+                 max_linhas: int = query.ROWS_CACHE_SIZE):
+        self.caminho_arquivo = caminho_arquivo
+        self.compartilhado = False
+        self.motor = resolve_engine(motor)
+        self.versao = dl.dataset_version(caminho_arquivo)
+        self.caminho_banco = build_database(caminho_arquivo, self.motor)
+        self.resultados = memo.LRUCache(max_resultados)
+        self.linhas = memo.LRUCache(max_linhas)
+        self._derivados = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.colunas = list(self._consultar(f"SELECT * FROM {TABLE} LIMIT 0").columns)
+
+    @property
+    def dataset(self):
+        raise AttributeError("SQLSource não mantém o dataset em memória; use rows()")
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid(): # Conexões não atravessam um fork
+            if self.motor == 'duckdb':
+                conexao = duckdb.connect(self.caminho_banco, read_only=True)
+            else:
+                conexao = sqlite3.connect(f"file:{self.caminho_banco}?mode=ro", uri=True)
+            self._local.conexao, self._local.pid = conexao, os.getpid()
+        return conexao
+
+    def _consultar(self, sql, parametros=()):
+        with instrumentation.span(f"sql.{self.motor}"):
+            if self.motor == 'duckdb':
+                return self._conexao().execute(sql, list(parametros)).df()
+            return pd.read_sql_query(sql, self._conexao(), params=list(parametros))
+
+    def _consultar_em_blocos(self, sql, parametros=()):
+        if self.motor == 'duckdb':
+            resultado = self._conexao().execute(sql, list(parametros))
+            while True:
+                bloco = resultado.fetch_df_chunk(FETCH_CHUNK_ROWS // 2048) # Em vetores de 2048 linhas
+                if bloco.empty:
+                    return
+                yield bloco
+        else:
+            yield from pd.read_sql_query(sql, self._conexao(), params=list(parametros), chunksize=FETCH_CHUNK_ROWS)
+
+    def rollup(self, filtros, por, medidas='US$ FOB'):
+        """
+        Mesmo resultado de cube.rollup sobre o cubo filtrado: SUM das medidas agrupado por 'por', ordenado pelas chaves.
+        """
+        chaves = [por] if isinstance(por, str) else list(por)
+        somas = [medidas] if isinstance(medidas, str) else list(medidas)
+        where, parametros = where_clause(filtros)
+        grupo = ", ".join(_quote(col) for col in chaves)
+        colunas = ", ".join(f"SUM({_quote(col)}) AS {_quote(col)}" for col in somas)
+        return self._consultar(f"SELECT {grupo}, {colunas} FROM {TABLE}{where} GROUP BY {grupo} ORDER BY {grupo}", parametros)
+
+    def _numericas(self):
+        return [col for col, tipo in data_proc.DATASET_SCHEMA.items() if tipo != 'category' and col in self.colunas]
+
+    def rows(self, filtros):
+        """
+        Colunas numéricas das linhas filtradas. As estatísticas não passam por aqui (ver describe, histogram_bins e box_stats).
+        """
+        where, parametros = where_clause(filtros)
+        return self._consultar(f"SELECT {', '.join(_quote(col) for col in self._numericas())} FROM {TABLE}{where}", parametros)
+
+    def count(self, filtros):
+        where, parametros = where_clause(filtros)
+        return int(self._consultar(f"SELECT COUNT(*) AS n FROM {TABLE}{where}", parametros)['n'].iloc[0])
+
+    def _quantiles(self, coluna, where, parametros, qs, quantidade):
+        """
+        Quantis exatos (interpolação linear, como o np.quantile) de 'coluna' nas 'quantidade' linhas do WHERE,
+        que já deve excluir os nulos: quantile_cont no DuckDB; no SQLite, os valores vizinhos de cada posição
+        numerados com ROW_NUMBER() (uma única ordenação para todos os quantis).
+        """
+        if quantidade == 0:
+            return [np.nan] * len(qs)
+        col = _quote(coluna)
+        if self.motor == 'duckdb':
+            lista = ", ".join(_literal(q) for q in qs)
+            return list(self._consultar(f"SELECT quantile_cont({col}, [{lista}]) AS q FROM {TABLE}{where}", parametros)['q'].iloc[0])
+        posicoes = np.asarray(qs, dtype=np.float64) * (quantidade - 1)
+        abaixo = np.floor(posicoes).astype(np.int64)
+        acima = np.minimum(abaixo + 1, quantidade - 1)
+        vizinhas = ", ".join(str(p) for p in sorted(set(abaixo.tolist()) | set(acima.tolist())))
+        valores = self._consultar(f"SELECT posicao, v FROM (SELECT {col} AS v, ROW_NUMBER() OVER (ORDER BY {col}) - 1 AS posicao "
+                                  f"FROM {TABLE}{where}) WHERE posicao IN ({vizinhas})", parametros)
+        valores = dict(zip(valores['posicao'].tolist(), valores['v'].astype(np.float64).tolist()))
+        return [valores[b] + (p - b) * (valores[c] - valores[b]) for p, b, c in zip(posicoes, abaixo.tolist(), acima.tolist())]
+
+    def describe(self, filtros):
+        """
+        Mesmo resultado de stats.summary_stats sobre as linhas filtradas, com as agregações no banco: contagem,
+        média, mínimo e máximo em uma consulta, o desvio em uma segunda passada (soma dos quadrados dos desvios
+        em relação à média) e os quartis exatos (ver _quantiles).
+        """
+        where, parametros = where_clause(filtros)
+        colunas = self._numericas()
+        expressoes = [f"{funcao}({_quote(col)}) AS {_quote(f'{nome}_{i}')}" for i, col in enumerate(colunas)
+                      for funcao, nome in (('COUNT', 'n'), ('AVG', 'media'), ('MIN', 'minimo'), ('MAX', 'maximo'))]
+        linha = self._consultar(f"SELECT {', '.join(expressoes)} FROM {TABLE}{where}", parametros).iloc[0]
+        com_dados = [i for i in range(len(colunas)) if linha[f'n_{i}'] > 0]
+        m2 = {}
+        if com_dados:
+            desvios = ", ".join(f"SUM(({_quote(colunas[i])} - {_literal(linha[f'media_{i}'])}) * ({_quote(colunas[i])} - "
+                                f"{_literal(linha[f'media_{i}'])})) AS {_quote(f'm2_{i}')}" for i in com_dados)
+            m2 = self._consultar(f"SELECT {desvios} FROM {TABLE}{where}", parametros).iloc[0]
+        resumo = {}
+        for i, col in enumerate(colunas):
+            n = int(linha[f'n_{i}'])
+            if n == 0:
+                resumo[col] = [0] + [np.nan] * 7
+                continue
+            q1, mediana, q3 = self._quantiles(col, _and(where, f"{_quote(col)} IS NOT NULL"), parametros, [0.25, 0.5, 0.75], n)
+            desvio = np.sqrt(m2[f'm2_{i}'] / (n - 1)) if n > 1 else np.nan
+            resumo[col] = [n, float(linha[f'media_{i}']), desvio, float(linha[f'minimo_{i}']), q1, mediana, q3, float(linha[f'maximo_{i}'])]
+        return pd.DataFrame(resumo, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+    def histogram_bins(self, filtros, coluna, bins: int = stats.HISTOGRAM_BINS):
+        """
+        Mesmo resultado de stats.histogram_bins: mínimo e máximo no banco e uma contagem por faixa com GROUP BY,
+        com o índice da faixa calculado como no np.histogram.
+        """
+        col = _quote(coluna)
+        where, parametros = where_clause(filtros)
+        where = _and(where, f"{col} IS NOT NULL")
+        limites = self._consultar(f"SELECT MIN({col}) AS minimo, MAX({col}) AS maximo FROM {TABLE}{where}", parametros).iloc[0]
+        if pd.isna(limites['minimo']):
+            return np.histogram([], bins=bins)
+        minimo, maximo = float(limites['minimo']), float(limites['maximo'])
+        if minimo == maximo: # Como o np.histogram: faixa de largura 1 em torno do valor
+            minimo, maximo = minimo - 0.5, maximo + 0.5
+        bordas = np.linspace(minimo, maximo, bins + 1)
+        indice = f"({col} - {_literal(minimo)}) * {_literal(bins / (maximo - minimo))}"
+        indice = f"FLOOR({indice})" if self.motor == 'duckdb' else f"CAST({indice} AS INTEGER)" # Não negativo: CAST trunca
+        faixas = self._consultar(f"SELECT CASE WHEN {indice} >= {bins} THEN {bins - 1} ELSE {indice} END AS faixa, "
+                                 f"COUNT(*) AS n FROM {TABLE}{where} GROUP BY 1", parametros)
+        contagens = np.zeros(bins, dtype=np.int64)
+        contagens[faixas['faixa'].to_numpy(dtype=np.int64)] = faixas['n'].to_numpy(dtype=np.int64)
+        return contagens, bordas
+
+    def box_stats(self, filtros, coluna):
+        """
+        Mesmo resultado de stats.box_stats: quartis no banco (ver _quantiles), depois contagem, mínimo, máximo,
+        média e quartis só das linhas dentro de 1,5 x IQR.
+        """
+        col = _quote(coluna)
+        where, parametros = where_clause(filtros)
+        where = _and(where, f"{col} IS NOT NULL")
+        quantidade = int(self._consultar(f"SELECT COUNT(*) AS n FROM {TABLE}{where}", parametros)['n'].iloc[0])
+        if quantidade == 0:
+            return None
+        q1, q3 = self._quantiles(coluna, where, parametros, [0.25, 0.75], quantidade)
+        iqr = q3 - q1
+        dentro = _and(where, f"{col} BETWEEN {_literal(q1 - 1.5 * iqr)} AND {_literal(q3 + 1.5 * iqr)}")
+        linha = self._consultar(f"SELECT COUNT(*) AS n, MIN({col}) AS minimo, MAX({col}) AS maximo, AVG({col}) AS media "
+                                f"FROM {TABLE}{dentro}", parametros).iloc[0]
+        if linha['n'] == 0:
+            return None
+        box_q1, box_mediana, box_q3 = self._quantiles(coluna, dentro, parametros, [0.25, 0.5, 0.75], int(linha['n']))
+        return {
+            'q1': box_q1,
+            'mediana': box_mediana,
+            'q3': box_q3,
+            'minimo': float(linha['minimo']),
+            'maximo': float(linha['maximo']),
+            'media': float(linha['media']),
+            'quantidade': int(linha['n']),
+        }
+
+    def monthly_totals(self):
+        return self.rollup(((), (), ()), list(timeseries.MONTHLY_KEYS), timeseries.MEASURE)
+
+    def options(self, col):
+        def carregar():
+            opcoes = self._consultar(f"SELECT DISTINCT {_quote(col)} FROM {TABLE} ORDER BY 1")[col]
+            return tuple(opcoes.dropna().tolist())
+        return self._derivado(('opcoes', col), carregar)
+
+    def _por_blocos(self, coluna, construir, juntar):
+        chaves = list(stats.SKETCH_KEYS)
+        sql = f"SELECT {', '.join(_quote(col) for col in chaves + [coluna])} FROM {TABLE}"
+        partes = [construir(bloco, coluna, chaves) for bloco in self._consultar_em_blocos(sql)]
+        return juntar(pd.concat(partes, ignore_index=True) if partes else construir(pd.DataFrame(columns=chaves + [coluna]), coluna, chaves), chaves)
+
+    def sketch_table(self, coluna):
+        """
+        Tabela de sketches (ver stats.build_sketch_table) montada bloco a bloco: as contagens de cada bloco
+        são somadas por (partição, faixa), sem trazer a coluna inteira de uma vez.
+        """
+        def juntar(tabela, chaves):
+            return tabela.groupby(chaves + ['faixa'], observed=True)['contagem'].sum().reset_index()
+        return self._derivado(('sketch', coluna), lambda: self._por_blocos(coluna, stats.build_sketch_table, juntar))
+
+    def moments_table(self, coluna):
+        """
+        Tabela de momentos (ver stats.build_moments_table) montada bloco a bloco e juntada por partição (stats.merge_moments).
+        """
+        return self._derivado(('momentos', coluna), lambda: self._por_blocos(coluna, stats.build_moments_table, stats.merge_moments))
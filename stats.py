@@ -0,0 +1,277 @@
+import numpy as np
+import pandas as pd
+
+# Erro relativo máximo dos quantis aproximados do LogSketch (1%)
+SKETCH_RELATIVE_ACCURACY = 0.01
+# Partições das tabelas de sketches e momentos: filtros de estado e ano são respondidos só com elas
+SKETCH_KEYS = ('State', 'Year')
+HISTOGRAM_BINS = 30
+
+
+class LogSketch:
+    """
+    Sketch de quantis com erro relativo garantido (mesma ideia do DDSketch): cada valor positivo cai em uma faixa
+    logarítmica de largura gamma = (1 + a) / (1 - a), e só a contagem por faixa é guardada.
+    Sketches de partições diferentes (ex.: um por mês) podem ser somados com merge() e consultados juntos.
+    Zeros são contados à parte; valores negativos não são esperados em 'US$ FOB' e 'Net Weight'.
+    """
+
+    def __init__(self, precisao_relativa: float = SKETCH_RELATIVE_ACCURACY):
+        self.precisao_relativa = precisao_relativa
+        self.gamma = (1 + precisao_relativa) / (1 - precisao_relativa)
+        self._log_gamma = np.log(self.gamma)
+        self.contagens = {}
+        self.zeros = 0
+
+    def buckets(self, valores):
+        """
+        Faixa logarítmica de cada valor positivo (np.ndarray de inteiros).
+        """
+        return np.ceil(np.log(valores) / self._log_gamma).astype(np.int64)
+
+    def add(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        self.zeros += int((valores <= 0).sum())
+        faixas, contagens = np.unique(self.buckets(valores[valores > 0]), return_counts=True)
+        return self.add_counts(faixas, contagens)
+
+    def add_counts(self, faixas, contagens, zeros: int = 0):
+        """
+        Soma contagens já agrupadas por faixa (ex.: lidas de uma tabela de sketches por partição).
+        """
+        for faixa, contagem in zip(np.asarray(faixas).tolist(), np.asarray(contagens).tolist()):
+            self.contagens[faixa] = self.contagens.get(faixa, 0) + contagem
+        self.zeros += int(zeros)
+        return self
+
+    def merge(self, outro: 'LogSketch'):
+        """
+        Soma outro sketch (com a mesma precisão) a este.
+        """
+        if outro.gamma != self.gamma:
+            raise ValueError("Só é possível juntar sketches com a mesma precisão relativa.")
+        for faixa, contagem in outro.contagens.items():
+            self.contagens[faixa] = self.contagens.get(faixa, 0) + contagem
+        self.zeros += outro.zeros
+        return self
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.contagens.values())
+
+    def _faixas(self):
+        """
+        Faixas em ordem crescente, o valor representante de cada uma (ponto com erro relativo mínimo) e as contagens.
+        """
+        faixas = np.array(sorted(self.contagens), dtype=np.int64)
+        contagens = np.array([self.contagens[f] for f in faixas.tolist()], dtype=np.int64)
+        return faixas, 2 * self.gamma ** faixas.astype(np.float64) / (self.gamma + 1), contagens
+
+    def quantiles(self, qs):
+        """
+        Quantis aproximados para cada q em qs, interpolados entre as posições vizinhas como o np.quantile (linear).
+        Cada posição é estimada com erro relativo <= precisao_relativa, então o quantil interpolado também.
+        Retorna um np.ndarray.
+        """
+        total = self.count
+        if total == 0:
+            return np.full(len(qs), np.nan)
+        _, valores, contagens = self._faixas()
+        valores = np.concatenate(([0.0], valores))
+        acumulado = np.cumsum(np.concatenate(([self.zeros], contagens)))
+
+        def na_posicao(posicao):
+            return valores[np.searchsorted(acumulado, posicao, side='right')]
+
+        posicoes = np.asarray(qs, dtype=np.float64) * (total - 1)
+        abaixo = np.floor(posicoes)
+        return na_posicao(abaixo) + (posicoes - abaixo) * (na_posicao(np.ceil(posicoes)) - na_posicao(abaixo))
+
+    def histogram_bins(self, minimo, maximo, bins: int = HISTOGRAM_BINS):
+        """
+        Versão aproximada de histogram_bins com o mínimo e o máximo exatos (ex.: de merge_moments): cada faixa do
+        sketch é contada no seu valor representante. Retorna (contagens, bordas), como np.histogram.
+        """
+        if self.count == 0:
+            return np.histogram([], bins=bins)
+        _, valores, contagens = self._faixas()
+        valores = np.clip(np.concatenate(([0.0], valores)), minimo, maximo)
+        contagens = np.concatenate(([self.zeros], contagens))
+        contagens, bordas = np.histogram(valores, bins=bins, range=(minimo, maximo), weights=contagens)
+        return contagens.astype(np.int64), bordas
+
+    def box_stats(self):
+        """
+        Versão aproximada de box_stats: remove as faixas fora de 1,5 x IQR e calcula os quartis, os extremos e a média
+        das que sobraram, sem os valores brutos. Retorna o mesmo dict de box_stats, ou None se o sketch estiver vazio.
+        """
+        if self.count == 0:
+            return None
+        q1, q3 = self.quantiles([0.25, 0.75])
+        iqr = q3 - q1
+        faixas, valores, contagens = self._faixas()
+        dentro = LogSketch(self.precisao_relativa)
+        manter = (valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)
+        dentro.add_counts(faixas[manter], contagens[manter], self.zeros if q1 - 1.5 * iqr <= 0 else 0)
+        if dentro.count == 0:
+            return None
+        _, valores_dentro, contagens_dentro = dentro._faixas()
+        box_q1, box_mediana, box_q3 = dentro.quantiles([0.25, 0.5, 0.75])
+        return {
+            'q1': box_q1,
+            'mediana': box_mediana,
+            'q3': box_q3,
+            'minimo': 0.0 if dentro.zeros else valores_dentro[0],
+            'maximo': valores_dentro[-1] if len(valores_dentro) else 0.0,
+            'media': (valores_dentro * contagens_dentro).sum() / dentro.count,
+            'quantidade': dentro.count,
+        }
+
+
+ZERO_BUCKET = np.iinfo(np.int64).min # Faixa usada na tabela de sketches para valores <= 0
+
+
+def build_sketch_table(df: pd.DataFrame, coluna: str, chaves=SKETCH_KEYS,
+                       precisao_relativa: float = SKETCH_RELATIVE_ACCURACY):
+    """
+    Pré-calcula, uma vez por carga, o sketch de 'coluna' de cada partição (combinação de 'chaves'), em formato de tabela:
+    uma linha por (chaves, faixa) com a contagem. Filtrar essa tabela e somar as contagens equivale a juntar os sketches.
+    """
+    sketch = LogSketch(precisao_relativa)
+    valores = df[coluna].to_numpy(dtype=np.float64)
+    faixas = np.full(len(valores), ZERO_BUCKET, dtype=np.int64)
+    positivos = valores > 0
+    faixas[positivos] = sketch.buckets(valores[positivos])
+    tabela = df[list(chaves)].assign(faixa=faixas)[~np.isnan(valores)]
+    return tabela.groupby(list(chaves) + ['faixa'], observed=True).size().rename('contagem').reset_index()
+
+
+def sketch_from_table(tabela: pd.DataFrame, precisao_relativa: float = SKETCH_RELATIVE_ACCURACY):
+    """
+    Junta as linhas (já filtradas) de uma tabela de build_sketch_table em um único LogSketch.
+    """
+    por_faixa = tabela.groupby('faixa')['contagem'].sum()
+    zeros = por_faixa.pop(ZERO_BUCKET) if ZERO_BUCKET in por_faixa.index else 0
+    return LogSketch(precisao_relativa).add_counts(por_faixa.index.to_numpy(), por_faixa.to_numpy(), zeros)
+
+
+def build_moments_table(df: pd.DataFrame, coluna: str, chaves=SKETCH_KEYS):
+    """
+    Momentos de 'coluna' por partição (combinação de 'chaves'): quantidade, média, m2 (soma dos quadrados dos desvios),
+    mínimo e máximo. Junto com a tabela de sketches, dá o resumo de uma seleção sem ler as linhas (ver summary_from_sketches).
+    """
+    valores = df[coluna].astype(np.float64)
+    grupos = df[list(chaves)].assign(valor=valores)[valores.notna().to_numpy()].groupby(list(chaves), observed=True)['valor']
+    tabela = grupos.agg(quantidade='count', media='mean', minimo='min', maximo='max')
+    tabela.insert(2, 'm2', grupos.var(ddof=0) * tabela['quantidade'])
+    return tabela.reset_index()
+
+
+def merge_moments(tabela: pd.DataFrame, chaves):
+    """
+    Junta as linhas de tabelas de build_moments_table com as mesmas 'chaves' (ex.: montadas bloco a bloco):
+    algoritmo paralelo de Chan, com a média ponderada e o m2 somado com a correção pela distância de cada média
+    parcial à média do grupo. Retorna um pd.DataFrame() com as mesmas colunas.
+    """
+    chaves = list(chaves)
+    tabela = tabela[tabela['quantidade'] > 0]
+    grupos = tabela.groupby(chaves, observed=True)
+    quantidade = grupos['quantidade'].transform('sum')
+    media = (tabela['media'] * tabela['quantidade']).groupby([tabela[col] for col in chaves], observed=True).transform('sum') / quantidade
+    tabela = tabela.assign(
+        soma=tabela['media'] * tabela['quantidade'],
+        m2=tabela['m2'] + tabela['quantidade'] * (tabela['media'] - media) ** 2,
+    )
+    juntos = tabela.groupby(chaves, observed=True).agg(quantidade=('quantidade', 'sum'), soma=('soma', 'sum'), m2=('m2', 'sum'),
+                                                       minimo=('minimo', 'min'), maximo=('maximo', 'max'))
+    juntos.insert(1, 'media', juntos.pop('soma') / juntos['quantidade'])
+    return juntos.reset_index()
+
+
+def _total_moments(tabela: pd.DataFrame):
+    """
+    (quantidade, média, m2, mínimo, máximo) de todas as linhas de uma tabela de momentos juntas (ver merge_moments).
+    """
+    quantidade = tabela['quantidade'].to_numpy(dtype=np.float64)
+    if quantidade.sum() == 0:
+        return 0, np.nan, np.nan, np.nan, np.nan
+    medias = tabela['media'].to_numpy(dtype=np.float64)
+    n = quantidade.sum()
+    media = (medias * quantidade).sum() / n
+    cheias = quantidade > 0
+    m2 = tabela['m2'].to_numpy(dtype=np.float64)[cheias].sum() + (quantidade[cheias] * (medias[cheias] - media) ** 2).sum()
+    return int(n), media, m2, tabela['minimo'].min(), tabela['maximo'].max()
+
+
+def summary_from_sketches(momentos: dict, sketches: dict):
+    """
+    Resumo no formato do describe() só a partir das partições: count/mean/std/min/max dos momentos juntados
+    (exatos) e quartis dos sketches (aproximados). 'momentos' e 'sketches' são {coluna: ...}.
+    """
+    resumo = {}
+    for col, tabela in momentos.items():
+        n, media, m2, minimo, maximo = _total_moments(tabela)
+        if n == 0:
+            resumo[col] = [0] + [np.nan] * 7
+            continue
+        q1, mediana, q3 = sketches[col].quantiles([0.25, 0.5, 0.75])
+        resumo[col] = [n, media, np.sqrt(m2 / (n - 1)) if n > 1 else np.nan, minimo, q1, mediana, q3, maximo]
+    return pd.DataFrame(resumo, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+
+def summary_stats(df: pd.DataFrame, colunas=None):
+    """
+    Equivalente ao df.describe() (count, mean, std, min, 25%, 50%, 75%, max) calculado coluna a coluna direto
+    nos arrays numpy, com um único np.quantile (seleção parcial) para os três quartis.
+    Retorna um pd.DataFrame() no mesmo formato do describe().
+    """
+    if colunas is None:
+        colunas = df.select_dtypes('number').columns
+    resumo = {}
+    for col in colunas:
+        valores = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        valores = valores[~np.isnan(valores)]
+        n = len(valores)
+        if n == 0:
+            resumo[col] = [0] + [np.nan] * 7
+            continue
+        media = valores.mean()
+        desvio = valores.std(ddof=1) if n > 1 else np.nan
+        q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+        resumo[col] = [n, media, desvio, valores.min(), q1, mediana, q3, valores.max()]
+    return pd.DataFrame(resumo, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+
+def histogram_bins(valores, bins: int = HISTOGRAM_BINS):
+    """
+    Histograma calculado no servidor: retorna (contagens, bordas) de np.histogram com 'bins' faixas iguais.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    return np.histogram(valores[~np.isnan(valores)], bins=bins)
+
+
+def box_stats(valores):
+    """
+    Estatísticas do boxplot sem enviar os valores brutos ao navegador: remove os outliers (fora de 1,5 x IQR)
+    e retorna um dict com quartis, mínimo, máximo e média dos valores que sobraram.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return None
+    q1, q3 = np.quantile(valores, [0.25, 0.75])
+    iqr = q3 - q1
+    dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+    if len(dentro) == 0:
+        return None
+    box_q1, box_mediana, box_q3 = np.quantile(dentro, [0.25, 0.5, 0.75])
+    return {
+        'q1': box_q1,
+        'mediana': box_mediana,
+        'q3': box_q3,
+        'minimo': dentro.min(),
+        'maximo': dentro.max(),
+        'media': dentro.mean(),
+        'quantidade': len(dentro),
+    }
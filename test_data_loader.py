@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+
+import data_loader as dl
+
+CSV_COLUMNS = ['Year', 'Month', 'Country', 'City', 'SH4 Code', 'SH4 Description', 'SH2 Code', 'SH2 Description',
+               'Economic Block', 'US$ FOB', 'Net Weight']
+
+
+def _csv(pasta, linhas):
+    caminho = pasta / 'exportacoes.csv'
+    pd.DataFrame(linhas, columns=CSV_COLUMNS).to_csv(caminho, index=False)
+    return str(caminho)
+
+
+def test_chunked_load_skips_chunk_emptied_by_cleaning(tmp_path):
+    # Com chunksize=2, o primeiro bloco só tem linhas da Europa e fica vazio depois do clean_dataset
+    caminho = _csv(tmp_path, [
+        [2020, 1, 'France', 'Paris', 101, 'A', 1, 'X', 'Europe', 10.0, 1.0],
+        [2020, 1, 'France', 'Lyon', 101, 'A', 1, 'X', 'Europe', 20.0, 2.0],
+        [2020, 2, 'France', 'Franca - SP', 101, 'A', 1, 'X', 'Asia', 30.0, 3.0],
+        [2020, 2, 'France', 'Alfenas - MG', 102, 'B', 1, 'X', 'Asia', 40.0, 4.0],
+    ])
+    df = dl.load_dataset_chunked(caminho, chunksize=2)
+    assert df['City_State'].tolist() == ['Franca - SP', 'Alfenas - MG']
+    assert df['State'].tolist() == ['SP', 'MG']
+    assert df['City'].tolist() == ['Franca', 'Alfenas']
+    assert dl.build_cube_chunked(caminho, chunksize=2)['US$ FOB'].sum() == 70.0
+
+
+def test_chunked_load_all_europe(tmp_path):
+    caminho = _csv(tmp_path, [[2020, 1, 'France', 'Paris', 101, 'A', 1, 'X', 'Europe', 10.0, 1.0]] * 3)
+    assert dl.load_dataset_chunked(caminho, chunksize=2).empty
+
+
+def test_city_without_separator_has_no_state(tmp_path):
+    caminho = _csv(tmp_path, [
+        [2020, 1, 'France', 'Semhifen', 101, 'A', 1, 'X', 'Asia', 10.0, 1.0],
+        [2020, 1, 'France', 'Outra', 101, 'A', 1, 'X', 'Asia', 20.0, 2.0],
+    ])
+    df = dl.load_dataset_chunked(caminho, chunksize=2)
+    assert df['City'].tolist() == ['Semhifen', 'Outra']
+    assert df['State'].isna().all()
+
+
+def test_version_follows_content_not_mtime(tmp_path):
+    caminho = _csv(tmp_path, [[2020, 1, 'France', 'Franca - SP', 101, 'A', 1, 'X', 'Asia', 30.0, 3.0]])
+    versao = dl.dataset_version(caminho)
+    estado = os.stat(caminho)
+    os.utime(caminho, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9)) # touch
+    assert dl.dataset_version(caminho) == versao
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write("2021,1,France,Alfenas - MG,101,A,1,X,Asia,1.0,1.0\n")
+    assert dl.dataset_version(caminho) != versao
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processor as data_proc
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    rng = np.random.default_rng(4)
+    tamanho = 2000
+    estados = rng.choice(['SP', 'MG', 'RJ', 'PR', None], tamanho)
+    cidades = [f"Cidade {i} - {estado}" if estado else f"Cidade {i}" for i, estado in zip(rng.integers(0, 40, tamanho), estados)]
+    return data_proc.apply_schema(pd.DataFrame({
+        'City_State': cidades,
+        'State': estados,
+        'Year': rng.integers(2016, 2021, tamanho),
+        'US$ FOB': rng.lognormal(8, 2, tamanho),
+        'Net Weight': rng.lognormal(6, 2, tamanho),
+    }))
+
+
+SELECOES = [
+    ((), (), ()),
+    ((), ('SP',), ()),
+    ((), ('SP', 'MG'), (2017, 2019)),
+    (('Cidade 3 - SP', 'Cidade 7 - MG', 'Cidade 5'), (), ()),
+    (('Cidade 3 - SP',), ('MG',), ()),
+    ((), ('XX',), ()),
+    ((), (), (1999, 2020)),
+]
+
+
+@pytest.mark.parametrize('filtros', SELECOES)
+def test_selected_positions_match_boolean_mask(dataset, filtros):
+    indice = data_proc.build_filter_index(dataset)
+    mascara = np.ones(len(dataset), dtype=bool)
+    for col, selecionados in zip(data_proc.FILTER_COLUMNS, filtros):
+        if selecionados:
+            mascara &= dataset[col].isin(selecionados).to_numpy()
+
+    posicoes = data_proc.selected_positions(indice, *filtros)
+    if not any(filtros):
+        assert posicoes is None
+    else:
+        np.testing.assert_array_equal(posicoes, np.flatnonzero(mascara))
+    pd.testing.assert_frame_equal(data_proc.columns_selected_by_options(dataset, *filtros, indice=indice),
+                                  data_proc.columns_selected_by_options(dataset, *filtros))
+
+
+@pytest.mark.parametrize('n', [0, 1, 5, 39, 40, 100])
+def test_top_n_with_others_preserves_total(dataset, n):
+    ranking = dataset.groupby('City_State', observed=True)['US$ FOB'].sum().reset_index()
+    resultado = data_proc.top_n_with_others(ranking, 'City_State', n=n)
+    assert resultado['US$ FOB'].sum() == pytest.approx(ranking['US$ FOB'].sum(), rel=1e-12)
+    top = resultado[resultado['City_State'] != data_proc.OTHERS_LABEL]
+    assert len(top) == min(n, len(ranking))
+    assert top['US$ FOB'].tolist() == sorted(ranking['US$ FOB'], reverse=True)[:n]
+    assert (data_proc.OTHERS_LABEL in resultado['City_State'].tolist()) == (n < len(ranking))
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+import cube
+import data_processor as data_proc
+import data_store
+
+CSV_COLUMNS = ['Year', 'Month', 'Country', 'City', 'SH4 Code', 'SH4 Description', 'SH2 Code', 'SH2 Description',
+               'Economic Block', 'US$ FOB', 'Net Weight']
+
+
+def _mes(ano, mes, valores, bloco='Asia'):
+    linhas = [[ano, mes, 'France', cidade, 101, 'A', 1, 'X', bloco, valor, 1.0]
+              for cidade, valor in zip(['Franca - SP', 'Alfenas - MG'] * len(valores), valores)]
+    return pd.DataFrame(linhas, columns=CSV_COLUMNS)
+
+
+def _append(pasta, bruto):
+    return data_store.append_partitions(str(pasta), data_proc.prepare_dataset(bruto))
+
+
+def _assert_cube_matches_rows(pasta):
+    esperado = cube.build_cube(data_store.load_store(str(pasta)))
+    obtido = data_store.load_store_cube(str(pasta))
+    chaves = cube.CUBE_DIMENSIONS
+    esperado = esperado.astype({col: str for col in chaves}).sort_values(chaves, ignore_index=True)
+    obtido = obtido.astype({col: str for col in chaves}).sort_values(chaves, ignore_index=True)
+    pd.testing.assert_series_equal(obtido['US$ FOB'], esperado['US$ FOB'])
+    assert obtido['Year'].is_monotonic_increasing
+
+
+def test_append_updates_only_received_years(tmp_path):
+    assert _append(tmp_path, pd.concat([_mes(2020, 1, [1, 2]), _mes(2021, 1, [3])])) == [(2020, 1), (2021, 1)]
+    assert _append(tmp_path, _mes(2020, 2, [10, 20])) == [(2020, 2)]
+    _assert_cube_matches_rows(tmp_path)
+    assert data_store.store_version(str(tmp_path)) == 2
+
+
+def test_append_replaces_existing_month(tmp_path):
+    _append(tmp_path, pd.concat([_mes(2020, 1, [1, 2]), _mes(2020, 2, [3])]))
+    _append(tmp_path, _mes(2020, 1, [100]))
+    _assert_cube_matches_rows(tmp_path)
+    assert data_store.load_store_cube(str(tmp_path))['US$ FOB'].sum() == 103
+
+
+def test_append_only_europe_leaves_store_unchanged(tmp_path):
+    _append(tmp_path, _mes(2020, 1, [1, 2]))
+    caminho = tmp_path / 'europa.csv'
+    _mes(2020, 2, [5, 6], bloco='Europe').to_csv(caminho, index=False)
+    assert data_store.append_csv(str(tmp_path), str(caminho)) == []
+    assert data_store.read_manifest(str(tmp_path))['particoes'] == [[2020, 1]]
+    assert data_store.store_version(str(tmp_path)) == 1
+
+
+def test_failed_write_keeps_previous_manifest(tmp_path, monkeypatch):
+    _append(tmp_path, _mes(2020, 1, [1, 2]))
+
+    def falhar(df, caminho):
+        raise OSError("disco cheio")
+    monkeypatch.setattr(data_store, '_write_parquet', falhar)
+    with pytest.raises(OSError):
+        _append(tmp_path, _mes(2020, 2, [3]))
+    assert data_store.read_manifest(str(tmp_path))['particoes'] == [[2020, 1]]
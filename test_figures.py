@@ -0,0 +1,24 @@
+import figures
+import query
+from test_data_loader import _csv
+
+
+def _linha(cidade, sh4, fob, peso):
+    return [2020, 1, 'France', cidade, sh4, f'Produto {sh4}', 1, 'X', 'Asia', fob, peso]
+
+
+def test_scatter_subtitle_only_when_points_are_dropped(tmp_path):
+    # O ponto de peso zero não aparece nos eixos log: sem amostragem, não há subtítulo
+    caminho = _csv(tmp_path, [_linha('Franca - SP', 101, 10.0, 1.0), _linha('Franca - SP', 102, 20.0, 0.0),
+                              _linha('Alfenas - MG', 101, 30.0, 3.0), _linha('Alfenas - MG', 103, 40.0, 4.0)])
+    fonte = query.DataSource(caminho)
+    filtros = ((), (), ())
+    pontos, total = query.scatter_points(fonte, filtros, orcamento=10)
+    assert len(pontos) == total == 3
+    fig = figures.scatter_chart(fonte, filtros, figures.SCATTER_MODES[0], 10)
+    assert not fig.layout.title.subtitle.text
+
+    pontos, total = query.scatter_points(fonte, filtros, orcamento=2)
+    assert total == 3 and len(pontos) < total
+    fig = figures.scatter_chart(fonte, filtros, figures.SCATTER_MODES[0], 2)
+    assert fig.layout.title.subtitle.text == f"Exibindo {len(pontos)} de 3 pontos (amostra que preserva os extremos)."
@@ -0,0 +1,56 @@
+import threading
+
+import memo
+
+
+def test_evicts_least_recently_used():
+    cache = memo.LRUCache(2)
+    calculados = []
+
+    def valor(chave):
+        return cache.get_or_compute(chave, lambda: calculados.append(chave) or chave.upper())
+
+    assert valor('a') == 'A'
+    valor('b')
+    valor('a') # 'a' passa a ser o mais recente: 'b' é o próximo a sair
+    valor('c')
+    assert list(cache._itens) == ['a', 'c']
+    valor('b')
+    assert list(cache._itens) == ['c', 'b']
+    assert calculados == ['a', 'b', 'c', 'b']
+    assert cache.stats() == {'itens': 2, 'limite': 2, 'hits': 1, 'misses': 4, 'descartes': 2, 'taxa_acerto': 0.2}
+
+
+def test_failed_computation_is_not_cached():
+    cache = memo.LRUCache(2)
+
+    def falha():
+        raise ValueError
+
+    try:
+        cache.get_or_compute('a', falha)
+    except ValueError:
+        pass
+    assert cache.get_or_compute('a', lambda: 1) == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_same_key_is_computed_once_across_threads():
+    cache = memo.LRUCache(4)
+    liberar = threading.Event()
+    chamadas = []
+
+    def lento():
+        chamadas.append(1)
+        liberar.wait(5)
+        return 'valor'
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(cache.get_or_compute('k', lento))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    liberar.set()
+    for thread in threads:
+        thread.join()
+    assert resultados == ['valor'] * 4
+    assert len(chamadas) == 1
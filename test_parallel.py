@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cube
+import parallel
+import query
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope='module')
+def cubo(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp('dados') / 'exportacoes.csv')
+    synthetic.generate_csv(caminho, 3000, seed=5)
+    return query.DataSource(caminho).cubo
+
+
+@pytest.mark.parametrize('por', ['State', ['State', 'Year'], 'SH4 Description'])
+@pytest.mark.parametrize('medidas', ['US$ FOB', ['US$ FOB', 'Net Weight']])
+@pytest.mark.parametrize('ordenar', [False, True])
+@pytest.mark.parametrize('embaralhar', [False, True])
+def test_partitioned_rollup_matches_serial(cubo, monkeypatch, por, medidas, ordenar, embaralhar):
+    monkeypatch.setenv('DASH_WORKERS', '4')
+    if embaralhar: # Cubo fora da ordem por ano: as fatias deixam de ter anos inteiros
+        cubo = cubo.sample(frac=1, random_state=0)
+    esperado = cube.rollup(cubo, por, medidas, ordenar)
+    obtido = parallel.rollup(cubo, por, medidas, ordenar, min_linhas=0)
+    assert list(obtido.columns) == list(esperado.columns)
+    assert len(obtido) == len(esperado)
+    primeira = medidas if isinstance(medidas, str) else medidas[0]
+    if ordenar:
+        assert (np.diff(obtido[primeira].to_numpy()) <= 0).all()
+    chaves = [por] if isinstance(por, str) else por
+    esperado, obtido = (df.sort_values(chaves, ignore_index=True) for df in (esperado, obtido))
+    pd.testing.assert_frame_equal(obtido, esperado, check_exact=False, rtol=1e-9)
@@ -0,0 +1,31 @@
+import re
+
+import instrumentation
+import report
+from benchmarks import synthetic
+
+
+def test_worker_metrics_are_merged_in_parent(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'exportacoes.csv')
+    synthetic.generate_csv(caminho, 500, seed=2)
+    metricas = tmp_path / 'dashboard.prom'
+    monkeypatch.setenv(instrumentation.METRICS_FILE_ENV, str(metricas))
+    instrumentation.drain_metrics()
+
+    manifesto = report.export_report(caminho, str(tmp_path / 'relatorio'), ['nacional', 'estados'], processos=2)
+    # Cada seleção calcula o ranking SH4 uma vez, em algum dos processos: o arquivo tem a soma de todos
+    contagem = re.search(r'^dashboard_span_seconds_count\{span="query.sh4"\} (\d+)$', metricas.read_text(encoding='utf-8'), re.M)
+    assert int(contagem.group(1)) == len(manifesto['selecoes'])
+    assert not list(tmp_path.glob('dashboard.prom.*'))
+
+
+def test_merge_metrics_adds_spans():
+    instrumentation.drain_metrics()
+    with instrumentation.span('teste'):
+        pass
+    parcial = instrumentation.drain_metrics()
+    instrumentation.merge_metrics(parcial)
+    instrumentation.merge_metrics(parcial)
+    metrica = instrumentation.drain_metrics()['spans']['teste']
+    assert metrica['quantidade'] == 2
+    assert metrica['faixas'][-1] == 2
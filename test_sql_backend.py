@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import query
+import sql_backend
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope='module')
+def fontes(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp('dados') / 'exportacoes.csv')
+    synthetic.generate_csv(caminho, 3000, seed=1)
+    return query.DataSource(caminho), sql_backend.SQLSource(caminho, 'sqlite')
+
+
+def _selecoes(fonte):
+    estados, anos = fonte.options('State'), fonte.options('Year')
+    cidade = fonte.dataset['City_State'].value_counts().index[0]
+    return [((), (), ()), ((), estados[:2], ()), ((cidade,), (), anos[-5:]), (('Cidade inexistente - XX',), (), ())]
+
+
+@pytest.mark.parametrize('aproximado', [False, True])
+def test_summary_matches(fontes, aproximado):
+    memoria, sql = fontes
+    for filtros in _selecoes(memoria):
+        esperado = query.summary(memoria, filtros, aproximado)
+        obtido = query.summary(sql, filtros, aproximado)
+        assert list(obtido.columns) == list(esperado.columns)
+        np.testing.assert_allclose(obtido.to_numpy(float), esperado.to_numpy(float), rtol=1e-9, equal_nan=True)
+
+
+def test_histogram_and_box_match(fontes):
+    memoria, sql = fontes
+    for filtros in _selecoes(memoria):
+        esperado, obtido = query.histogram(memoria, filtros), query.histogram(sql, filtros)
+        np.testing.assert_array_equal(obtido['contagens'], esperado['contagens'])
+        np.testing.assert_allclose(obtido['bordas'], esperado['bordas'])
+        esperado, obtido = query.box(memoria, filtros), query.box(sql, filtros)
+        assert (esperado is None) == (obtido is None)
+        if esperado is not None:
+            assert obtido == pytest.approx(esperado, rel=1e-9)
+
+
+def test_empty_selection_has_all_columns(fontes):
+    memoria, sql = fontes
+    vazia = (('Cidade inexistente - XX',), (), ())
+    for fonte in (memoria, sql):
+        resumo = query.summary(fonte, vazia)
+        assert len(resumo.columns) == 6
+        assert (resumo.loc['count'] == 0).all()
+        assert query.box(fonte, vazia) is None
+
+
+def test_statistics_do_not_pull_rows(fontes, monkeypatch):
+    _, sql = fontes
+    sql.clear()
+    monkeypatch.setattr(sql, 'rows', lambda filtros: pytest.fail("rows() chamado"))
+    query.summary(sql, ((), (), ()))
+    query.histogram(sql, ((), (), ()))
+    query.box(sql, ((), (), ()))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import stats
+
+QS = np.linspace(0, 1, 41)
+
+
+def _valores(seed, tamanho=5000):
+    rng = np.random.default_rng(seed)
+    valores = rng.lognormal(8, 3, tamanho)
+    valores[rng.random(tamanho) < 0.05] = 0.0
+    return valores
+
+
+@pytest.mark.parametrize('precisao', [0.01, 0.05])
+def test_sketch_quantiles_within_relative_error(precisao):
+    valores = _valores(0)
+    obtido = stats.LogSketch(precisao).add(valores).quantiles(QS)
+    esperado = np.quantile(valores, QS)
+    assert np.all(np.abs(obtido - esperado) <= precisao * esperado * (1 + 1e-9))
+
+
+def test_merged_partitions_equal_single_sketch():
+    partes = [_valores(seed, 1000) for seed in range(4)]
+    juntos = stats.LogSketch()
+    for parte in partes:
+        juntos.merge(stats.LogSketch().add(parte))
+    unico = stats.LogSketch().add(np.concatenate(partes))
+    assert juntos.count == unico.count
+    np.testing.assert_array_equal(juntos.quantiles(QS), unico.quantiles(QS))
+
+
+def test_sketch_table_selection_within_relative_error():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({'State': rng.choice(['SP', 'MG', 'RJ'], 6000), 'Year': rng.integers(2016, 2021, 6000),
+                       'US$ FOB': _valores(2, 6000)})
+    tabela = stats.build_sketch_table(df, 'US$ FOB')
+    selecao = tabela[tabela['State'].isin(['SP', 'RJ']) & (tabela['Year'] >= 2018)]
+    obtido = stats.sketch_from_table(selecao).quantiles(QS)
+    esperado = np.quantile(df.loc[df['State'].isin(['SP', 'RJ']) & (df['Year'] >= 2018), 'US$ FOB'], QS)
+    assert np.all(np.abs(obtido - esperado) <= stats.SKETCH_RELATIVE_ACCURACY * esperado * (1 + 1e-9))
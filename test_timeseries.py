@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import timeseries
+
+
+@pytest.fixture
+def matriz():
+    rng = np.random.default_rng(3)
+    valores = rng.lognormal(10, 2, (30, 4))
+    valores[rng.random(valores.shape) < 0.2] = 0.0
+    return valores
+
+
+@pytest.mark.parametrize('janela', [1, 3, 12, 30, 31, 40])
+def test_rolling_sum_matches_pandas_rolling(matriz, janela):
+    esperado = pd.DataFrame(matriz).rolling(janela).sum().to_numpy()
+    np.testing.assert_allclose(timeseries.rolling_sum(matriz, janela), esperado, rtol=1e-9, atol=1e-6, equal_nan=True)
+
+
+def test_year_over_year_matches_shift(matriz):
+    df = pd.DataFrame(matriz)
+    anterior = df.shift(12)
+    esperado = (df / anterior.where(anterior > 0) - 1).to_numpy()
+    np.testing.assert_allclose(timeseries.year_over_year(matriz, 12), esperado, rtol=1e-12, equal_nan=True)
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import instrumentation
+
+# Séries temporais mensais por estado, cidade ou produto SH4. Os totais mensais são agregados uma vez por fonte
+# (TimeSeriesIndex) e cada consulta monta uma matriz densa (período x membro da dimensão) com um único np.bincount;
+# janelas móveis e variações anuais são diferenças e razões vetorizadas sobre essa matriz, sem novos groupbys.
+
+MONTHLY_KEYS = ('Year', 'Month', 'City_State', 'State', 'City', 'SH4 Description')
+MEASURE = 'US$ FOB'
+DIMENSIONS = ('State', 'City', 'SH4 Description')
+METRICS = ("Valor", "Acumulado 12 meses", "Variação anual (YoY)")
+GRANULARITIES = ("Mensal", "Anual")
+ROLLING_MONTHS = 12
+SERIES_N_DEFAULT = 10 # Membros da dimensão exibidos (os de maior total no período exibido)
+
+
+def rolling_sum(matriz: np.ndarray, janela: int):
+    """
+    Soma móvel de 'janela' períodos em cada coluna, como diferença de somas acumuladas (cumsum[t] - cumsum[t - janela]).
+    Os primeiros janela - 1 períodos (janela incompleta) ficam NaN.
+    """
+    acumulado = np.cumsum(np.vstack([np.zeros((1, matriz.shape[1])), matriz]), axis=0)
+    resultado = np.full(matriz.shape, np.nan)
+    resultado[janela - 1:] = acumulado[janela:] - acumulado[:-janela]
+    return resultado
+
+
+def year_over_year(matriz: np.ndarray, defasagem: int):
+    """
+    Variação em relação ao mesmo período do ano anterior ('defasagem' períodos antes): valor / anterior - 1.
+    Fica NaN sem período anterior ou com o valor anterior zerado.
+    """
+    resultado = np.full(matriz.shape, np.nan)
+    anterior = matriz[:-defasagem]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultado[defasagem:] = np.where(anterior > 0, matriz[defasagem:] / anterior - 1, np.nan)
+    return resultado
+
+
+def to_annual(matriz: np.ndarray):
+    """
+    Soma os meses de cada ano (a matriz começa em janeiro; o último ano pode estar incompleto).
+    """
+    meses = matriz.shape[0]
+    completa = np.vstack([matriz, np.zeros((-meses % 12, matriz.shape[1]))])
+    return completa.reshape(-1, 12, matriz.shape[1]).sum(axis=1)
+
+
+class TimeSeriesIndex:
+    """
+    Totais mensais da fonte em arrays: o período (meses desde janeiro do primeiro ano) e o código de cada
+    coluna de filtro e de dimensão por linha. As matrizes sem filtro de cidade/estado são pré-calculadas.
+    """
+
+    @instrumentation.timed('build_timeseries_index')
+    def __init__(self, mensal: pd.DataFrame):
+        anos = mensal['Year'].to_numpy(dtype=np.int64)
+        self.ano_inicial = int(anos.min()) if len(anos) else 0
+        self.periodo = (anos - self.ano_inicial) * 12 + mensal['Month'].to_numpy(dtype=np.int64) - 1
+        self.periodos = int(self.periodo.max()) + 1 if len(anos) else 0
+        self.valores = mensal[MEASURE].to_numpy(dtype=np.float64)
+        self.codigos, self.membros = {}, {}
+        for col in ('City_State',) + DIMENSIONS:
+            codigos, membros = pd.factorize(mensal[col])
+            self.codigos[col], self.membros[col] = codigos, np.asarray(membros, dtype=object)
+        self._completas = {dimensao: self._bincount(dimensao, None) for dimensao in DIMENSIONS}
+
+    def _bincount(self, dimensao, mascara):
+        codigos, periodo, valores = self.codigos[dimensao], self.periodo, self.valores
+        if mascara is not None:
+            codigos, periodo, valores = codigos[mascara], periodo[mascara], valores[mascara]
+        tamanho = len(self.membros[dimensao])
+        return np.bincount(periodo * tamanho + codigos, weights=valores, minlength=self.periodos * tamanho).reshape(self.periodos, tamanho)
+
+    def _mask(self, cidades, estados):
+        mascara = None
+        for col, selecao in (('City_State', cidades), ('State', estados)):
+            if selecao:
+                selecionados = np.isin(self.membros[col], list(selecao))
+                mascara_col = selecionados[self.codigos[col]]
+                mascara = mascara_col if mascara is None else mascara & mascara_col
+        return mascara
+
+    def matrix(self, dimensao, cidades=(), estados=()):
+        """
+        Matriz (período mensal x membro de 'dimensao') de US$ FOB das linhas das cidades/estados selecionados.
+        O filtro de ano não entra aqui: as janelas móveis precisam do histórico anterior (ver series).
+        """
+        mascara = self._mask(cidades, estados)
+        if mascara is None:
+            return self._completas[dimensao]
+        return self._bincount(dimensao, mascara)
+
+    def series(self, dimensao, cidades=(), estados=(), anos=(), metrica: str = METRICS[0],
+               granularidade: str = GRANULARITIES[0], n: int = SERIES_N_DEFAULT):
+        """
+        Série de 'metrica' por período para os n membros de 'dimensao' com maior total nos períodos exibidos
+        (os anos selecionados, ou todo o histórico). Retorna um pd.DataFrame() longo com as colunas
+        ['Período', dimensao, 'Valor'], em que 'Período' é o 1º dia do mês (Mensal) ou o ano (Anual).
+        """
+        matriz = self.matrix(dimensao, cidades, estados)
+        if granularidade == "Anual":
+            matriz = to_annual(matriz)
+            janela, defasagem = 1, 1
+            periodos = pd.Index(np.arange(self.ano_inicial, self.ano_inicial + len(matriz)), name='Período')
+            anos_periodo = periodos.to_numpy()
+        else:
+            janela, defasagem = ROLLING_MONTHS, 12
+            meses = np.arange(len(matriz))
+            anos_periodo = self.ano_inicial + meses // 12
+            periodos = pd.Index(pd.to_datetime({'year': anos_periodo, 'month': meses % 12 + 1, 'day': 1}), name='Período')
+
+        if metrica == "Acumulado 12 meses":
+            valores = rolling_sum(matriz, janela)
+        elif metrica == "Variação anual (YoY)":
+            valores = year_over_year(matriz, defasagem)
+        else:
+            valores = matriz
+
+        exibidos = np.isin(anos_periodo, list(anos)) if anos else np.ones(len(matriz), dtype=bool)
+        totais = matriz[exibidos].sum(axis=0)
+        positivos = np.flatnonzero(totais > 0)
+        escolhidos = positivos[np.argsort(-totais[positivos], kind='stable')[:n]]
+
+        if len(escolhidos) == 0:
+            return pd.DataFrame(columns=['Período', dimensao, 'Valor'])
+        tabela = pd.DataFrame(valores[np.ix_(exibidos, escolhidos)], index=periodos[exibidos],
+                              columns=self.membros[dimensao][escolhidos])
+        return tabela.reset_index().melt(id_vars='Período', var_name=dimensao, value_name='Valor')